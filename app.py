@@ -1,28 +1,55 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, BackgroundTasks, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import os
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Literal, Optional
 from dotenv import load_dotenv
 import requests
 
 from src.classification.util import generate_dirname
 from src.agent.tasks import get_task_prompt
-from src.agent.agent import VidisAgent, AGENT_OUTPUT_DIR
+from src.agent.agent import VidisAgent, AGENT_OUTPUT_DIR, get_blob_files
+from src.agent.browser_pool import get_browser_pool
+from src.agent.capture import CapturePolicy
+from src.agent.personas import run_personas
+from src.agent.login_replay import LoginFlowStore
+from src.agent.session_cache import SessionCache
+from src.files.blob_store import load_blob_refs
+from src.files.zip import stream_zip_archive
 from run_classification import run_classification
 from generate_report import generate_report
 
 
 load_dotenv()
 
-app = FastAPI()
-security = HTTPBearer()
-
 JOBS_FILE = "jobs.json"
 API_KEY = os.getenv("API_KEY")
 
+# Warm Chromium instances shared by all jobs of this process
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_POOL_MAX_JOBS = int(os.getenv("BROWSER_POOL_MAX_JOBS", "20"))
+BROWSER_POOL_MAX_MEMORY_MB = float(os.getenv("BROWSER_POOL_MAX_MEMORY_MB", "2048"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    browser_pool = get_browser_pool(
+        size=BROWSER_POOL_SIZE,
+        max_jobs_per_browser=BROWSER_POOL_MAX_JOBS,
+        max_memory_mb=BROWSER_POOL_MAX_MEMORY_MB,
+        headless=True,
+    )
+    await browser_pool.start()
+    yield
+    await browser_pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
+security = HTTPBearer()
+
 
 class JobPayload(BaseModel):
     url: str
@@ -30,6 +57,29 @@ class JobPayload(BaseModel):
     password: str
     task_type: str = "legal"
     max_steps: int = 25
+    capture_policy: CapturePolicy = CapturePolicy()
+    step_log_format: Literal["jsonl", "zstd"] = "jsonl"
+    snapshot_mode: Literal["full", "delta"] = "full"
+    # With task_type "all", run the legal, student and teacher exploration concurrently
+    parallel_personas: bool = False
+    # Reuse the logged in session of an earlier job for the same site and account
+    use_session_cache: bool = False
+    # Replay the recorded login of the site without the LLM, falling back to the agent
+    use_login_replay: bool = False
+    # Reuse the agent's actions of earlier jobs when the page state matches
+    use_decision_cache: bool = False
+    # Save the legal pages found in footer links and the sitemap before the agent starts
+    legal_prepass: bool = False
+    # Save all open tabs into the legal page PDFs instead of only the active tab
+    pdf_all_tabs: bool = False
+    # Replay outputs of the run: gif, webp, mp4 and contact_sheet
+    animation_formats: List[Literal["gif", "webp", "mp4", "contact_sheet"]] = ["gif"]
+    # Factor the animation frames are downsampled by
+    animation_scale: float = Field(default=1.0, gt=0, le=1)
+    # Worker processes that annotate the screenshots, 0 annotates them in the job's process
+    annotation_processes: Optional[int] = Field(default=None, ge=0)
+    # Wait for quiet network and DOM with per-host learned deadlines instead of fixed times
+    adaptive_wait: bool = False
 
 
 def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -75,17 +125,59 @@ async def run_automation_job(job_id: str, payload: JobPayload):
     update_job_status(job_id, {"status": "running"})
     try:
         output_name = job_id  # job_id is already the output_name
+        session_cache = SessionCache() if payload.use_session_cache else None
+        login_flow_store = LoginFlowStore() if payload.use_login_replay else None
 
         # Step 1: Run the agent
-        vidis_agent = VidisAgent(
-            task_prompt=get_task_prompt(payload.task_type),
-            initial_url=payload.url,
-            output_name=output_name,
-            username=payload.username,
-            password=payload.password,
-            headless=True,
-        )
-        await vidis_agent.run_task(max_steps=payload.max_steps)
+        if payload.task_type == "all" and payload.parallel_personas:
+            await run_personas(
+                initial_url=payload.url,
+                output_name=output_name,
+                username=payload.username,
+                password=payload.password,
+                max_steps=payload.max_steps,
+                headless=True,
+                browser_pool=get_browser_pool(),
+                session_cache=session_cache,
+                login_flow_store=login_flow_store,
+                use_decision_cache=payload.use_decision_cache,
+                legal_prepass=payload.legal_prepass,
+                pdf_all_tabs=payload.pdf_all_tabs,
+                animation_formats=payload.animation_formats,
+                animation_scale=payload.animation_scale,
+                annotation_processes=payload.annotation_processes,
+                adaptive_wait=payload.adaptive_wait,
+                capture_policy=payload.capture_policy,
+                step_log_format=payload.step_log_format,
+                snapshot_mode=payload.snapshot_mode,
+            )
+        else:
+            vidis_agent = VidisAgent(
+                task_prompt=get_task_prompt(payload.task_type),
+                initial_url=payload.url,
+                output_name=output_name,
+                username=payload.username,
+                password=payload.password,
+                headless=True,
+                capture_policy=payload.capture_policy,
+                step_log_format=payload.step_log_format,
+                snapshot_mode=payload.snapshot_mode,
+                browser_pool=get_browser_pool(),
+                session_cache=session_cache,
+                login_flow_store=login_flow_store,
+                use_decision_cache=payload.use_decision_cache,
+                legal_prepass=payload.legal_prepass
+                and payload.task_type in ("legal", "all"),
+                pdf_all_tabs=payload.pdf_all_tabs,
+                animation_formats=payload.animation_formats,
+                animation_scale=payload.animation_scale,
+                annotation_processes=payload.annotation_processes,
+                adaptive_wait=payload.adaptive_wait,
+                logged_in_task_prompt=get_task_prompt(
+                    payload.task_type, logged_in=True
+                ),
+            )
+            await vidis_agent.run_task(max_steps=payload.max_steps)
 
         # Step 2: Run classification
         run_classification(output_name, output_name)
@@ -202,13 +294,24 @@ def download_zip(job_id: str, api_key: str = Depends(verify_api_key)):
     output_name = job_id  # job_id is the output_name
     zip_path = os.path.join(AGENT_OUTPUT_DIR, f"{output_name}.zip")
 
-    if not os.path.exists(zip_path):
+    filename = f"{output_name}_results.zip"
+    if os.path.exists(zip_path):
+        return FileResponse(
+            path=zip_path,
+            filename=filename,
+            media_type="application/zip",
+        )
+
+    # The archive could not be staged, zip the run directory while sending it
+    output_dir = os.path.join(AGENT_OUTPUT_DIR, output_name)
+    if not os.path.isdir(output_dir):
         raise HTTPException(404, "Zip file not found")
 
-    return FileResponse(
-        path=zip_path,
-        filename=f"{output_name}_results.zip",
+    blob_files = get_blob_files(load_blob_refs(output_dir))
+    return StreamingResponse(
+        stream_zip_archive(output_dir, extra_files=blob_files),
         media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
@@ -36,6 +36,11 @@ def add_rds_cuc_371_to_report(report: Report, cookie_results: CookieCheckResult)
             report.add_failure(
                 f"Nicht essentieller Cookie: {cookie_result.cookie_name}"
             )
+        if cookie_result.first_seen_step is not None:
+            # The first step result is recorded at the end of the first agent step
+            report.add_paragraph(
+                f"Zuerst gesetzt in Schritt {cookie_result.first_seen_step + 1}"
+            )
 
         if isinstance(cookie_result, CookieLLMCheckResult):
             report.add_paragraph("Cookie wurde von KI überprüft:")
@@ -2,6 +2,11 @@ import argparse
 import asyncio
 
 from src.agent.agent import VidisAgent
+from src.agent.animation import ANIMATION_FORMATS
+from src.agent.capture import CapturePolicy
+from src.agent.personas import run_personas
+from src.agent.login_replay import LoginFlowStore
+from src.agent.session_cache import SessionCache
 from src.agent.tasks import get_task_prompt
 from src.classification.util import generate_dirname
 
@@ -32,7 +37,7 @@ async def main():
         "--task-type",
         type=str,
         default="legal",
-        help="Type of task to run. Can be 'login', 'legal', 'student', or 'teacher'.",
+        help="Type of task to run. Can be 'login', 'legal', 'student', 'teacher', or 'all'.",
     )
     parser.add_argument(
         "--output",
@@ -52,9 +57,141 @@ async def main():
         help="Run the agent in headless mode.",
     )
 
+    parser.add_argument(
+        "--max-body-bytes",
+        type=int,
+        default=256 * 1024,
+        help="Maximum number of bytes captured per response body. Larger bodies are truncated.",
+    )
+
+    parser.add_argument(
+        "--block-media",
+        action="store_true",
+        help="Record video, audio, font and first-party photo requests without downloading them. Scripts, XHR and third-party images still load.",
+    )
+
+    parser.add_argument(
+        "--block-action",
+        type=str,
+        choices=["abort", "stub"],
+        default="abort",
+        help="With --block-media: fail the blocked requests ('abort') or answer them with an empty response ('stub').",
+    )
+
+    parser.add_argument(
+        "--step-log-format",
+        type=str,
+        choices=["jsonl", "zstd"],
+        default="jsonl",
+        help="Format of the step log. 'zstd' writes a compressed, indexed step_result.steplog instead of step_result.jsonl.",
+    )
+
+    parser.add_argument(
+        "--snapshot-mode",
+        type=str,
+        choices=["full", "delta"],
+        default="full",
+        help="'delta' only records changed cookies, storage entries and resources per step instead of full snapshots.",
+    )
+
+    parser.add_argument(
+        "--legal-prepass",
+        action="store_true",
+        help="With task type 'legal' or 'all': save the legal pages found in footer links and the sitemap before the agent starts.",
+    )
+
+    parser.add_argument(
+        "--pdf-all-tabs",
+        action="store_true",
+        help="Save all open tabs into the legal page PDFs instead of only the active tab.",
+    )
+
+    parser.add_argument(
+        "--animation-formats",
+        type=str,
+        nargs="+",
+        choices=ANIMATION_FORMATS,
+        default=["gif"],
+        help="Replay outputs of the run. Encoding time and size of each are written to animation_stats.json.",
+    )
+
+    parser.add_argument(
+        "--animation-scale",
+        type=float,
+        default=1.0,
+        help="Factor the animation frames are downsampled by, e.g. 0.5. The step images keep their full size.",
+    )
+
+    parser.add_argument(
+        "--annotation-processes",
+        type=int,
+        default=None,
+        help="Number of worker processes that annotate the screenshots after the run (default: up to 4). 0 annotates them in the agent's process.",
+    )
+
+    parser.add_argument(
+        "--adaptive-wait",
+        action="store_true",
+        help="Wait until network and DOM are quiet after a page load instead of fixed times, with deadlines learned per host. The waits are written to page_waits.jsonl.",
+    )
+
+    parser.add_argument(
+        "--parallel-personas",
+        action="store_true",
+        help="With task type 'all': log in once and run the legal, student and teacher exploration concurrently in separate browser contexts.",
+    )
+
+    parser.add_argument(
+        "--session-cache",
+        action="store_true",
+        help="Reuse the logged in session of an earlier run and skip the login while it is valid.",
+    )
+
+    parser.add_argument(
+        "--login-replay",
+        action="store_true",
+        help="Record the login of the website and replay it without the LLM in later runs.",
+    )
+
+    parser.add_argument(
+        "--decision-cache",
+        action="store_true",
+        help="Reuse the agent's actions of earlier runs when the page state matches. Hit/miss statistics are written to decision_cache_stats.json.",
+    )
+
     args = parser.parse_args()
+    session_cache = SessionCache() if args.session_cache else None
+    login_flow_store = LoginFlowStore() if args.login_replay else None
+    capture_policy = CapturePolicy(max_body_bytes=args.max_body_bytes)
+    if args.block_media:
+        capture_policy.blocked_resource_types = ["media", "font"]
+        capture_policy.block_first_party_images = True
+        capture_policy.block_action = args.block_action
 
     output_name = generate_dirname(args.url)
+    if args.task_type == "all" and args.parallel_personas:
+        await run_personas(
+            initial_url=args.url,
+            output_name=output_name,
+            username=args.username,
+            password=args.password,
+            max_steps=args.max_steps,
+            headless=args.headless,
+            session_cache=session_cache,
+            login_flow_store=login_flow_store,
+            use_decision_cache=args.decision_cache,
+            legal_prepass=args.legal_prepass,
+            pdf_all_tabs=args.pdf_all_tabs,
+            animation_formats=args.animation_formats,
+            animation_scale=args.animation_scale,
+            annotation_processes=args.annotation_processes,
+            adaptive_wait=args.adaptive_wait,
+            capture_policy=capture_policy,
+            step_log_format=args.step_log_format,
+            snapshot_mode=args.snapshot_mode,
+        )
+        return
+
     vidis_agent = VidisAgent(
         task_prompt=get_task_prompt(args.task_type),
         initial_url=args.url,
@@ -62,6 +199,19 @@ async def main():
         username=args.username,
         password=args.password,
         headless=args.headless,
+        capture_policy=capture_policy,
+        step_log_format=args.step_log_format,
+        snapshot_mode=args.snapshot_mode,
+        session_cache=session_cache,
+        login_flow_store=login_flow_store,
+        use_decision_cache=args.decision_cache,
+        legal_prepass=args.legal_prepass and args.task_type in ("legal", "all"),
+        pdf_all_tabs=args.pdf_all_tabs,
+        animation_formats=args.animation_formats,
+        animation_scale=args.animation_scale,
+        annotation_processes=args.annotation_processes,
+        adaptive_wait=args.adaptive_wait,
+        logged_in_task_prompt=get_task_prompt(args.task_type, logged_in=True),
     )
     await vidis_agent.run_task(max_steps=args.max_steps)
 
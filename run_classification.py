@@ -2,7 +2,11 @@ import os
 import argparse
 import random
 from src.classification.images import check_page_content
-from src.classification.util import read_step_result_file
+from src.classification.util import (
+    find_step_result_file,
+    read_first_seen_steps,
+    read_step_result,
+)
 from src.classification.encryption import check_encryption
 from src.classification.imprint import check_imprint
 from src.classification.privacy_policy import check_privacy_policy
@@ -23,17 +27,20 @@ def run_classification(input_name: str, output_name: str):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
 
-    step_results = read_step_result_file(f"{input_dir}/step_result.jsonl")
+    step_result_path = find_step_result_file(input_dir)
     terms_of_use_path = f"{input_dir}/terms_of_use.pdf"
     imprint_path = f"{input_dir}/imprint.pdf"
     privacy_policy_path = f"{input_dir}/privacy_policy.pdf"
     image_directory_path = f"{input_dir}/images"
 
     # TODO: We currently only use the last step result, but we should use all step results
-    last_step_result = step_results[-1]
+    last_step_result = read_step_result(step_result_path, -1)
 
     def process_cookies():
-        results = get_cookie_check_results(last_step_result.cookies)
+        first_seen_steps = read_first_seen_steps(step_result_path)
+        results = get_cookie_check_results(
+            last_step_result.cookies, first_seen_steps.cookies
+        )
 
         # Save base model to json file
         with open(f"{output_dir}/cookie_results.json", "w") as f:
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+
+from src.agent.browser_pool import BrowserPool
+from src.agent.scheduler import CrawlJob, CrawlScheduler, load_jobs_file
+from src.agent.login_replay import LoginFlowStore
+from src.agent.session_cache import SessionCache
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Run the Vidis checker agent for many websites concurrently."
+    )
+    parser.add_argument(
+        "--urls",
+        type=str,
+        nargs="*",
+        default=[],
+        help="URLs of the websites to check.",
+    )
+    parser.add_argument(
+        "--jobs-file",
+        type=str,
+        default=None,
+        help="File with one URL per line or a JSON list of jobs (url, task_type, username, password, max_steps).",
+    )
+    parser.add_argument(
+        "--task-types",
+        type=str,
+        nargs="+",
+        default=["legal"],
+        help="Task types to run for every URL. Can be 'login', 'legal', 'student', 'teacher' or 'all'.",
+    )
+    parser.add_argument(
+        "--username",
+        type=str,
+        required=True,
+        help="Username for the website login.",
+    )
+    parser.add_argument(
+        "--password",
+        type=str,
+        required=True,
+        help="Password for the website login.",
+    )
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=25,
+        help="Maximum number of steps per job.",
+    )
+    parser.add_argument(
+        "--max-concurrent-jobs",
+        type=int,
+        default=4,
+        help="Maximum number of agents running at the same time.",
+    )
+    parser.add_argument(
+        "--max-jobs-per-host",
+        type=int,
+        default=1,
+        help="Maximum number of agents running at the same time against one host.",
+    )
+    parser.add_argument(
+        "--llm-requests-per-minute",
+        type=float,
+        default=60,
+        help="Maximum number of LLM requests per minute of all agents together.",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Run the agents in headless mode.",
+    )
+    parser.add_argument(
+        "--session-cache",
+        action="store_true",
+        help="Reuse logged in sessions of earlier runs and skip the login while they are valid.",
+    )
+    parser.add_argument(
+        "--login-replay",
+        action="store_true",
+        help="Record the login of each site and replay it without the LLM in later runs.",
+    )
+    parser.add_argument(
+        "--decision-cache",
+        action="store_true",
+        help="Reuse the agent's actions of earlier runs when the page state matches.",
+    )
+
+    args = parser.parse_args()
+
+    jobs = [
+        CrawlJob(
+            url=url,
+            task_type=task_type,
+            username=args.username,
+            password=args.password,
+            max_steps=args.max_steps,
+        )
+        for url in args.urls
+        for task_type in args.task_types
+    ]
+    if args.jobs_file:
+        jobs += load_jobs_file(
+            args.jobs_file, args.username, args.password, args.task_types
+        )
+    if not jobs:
+        parser.error("No jobs given, use --urls or --jobs-file.")
+
+    browser_pool = BrowserPool(
+        size=min(args.max_concurrent_jobs, 4), headless=args.headless
+    )
+    await browser_pool.start()
+    try:
+        scheduler = CrawlScheduler(
+            max_concurrent_jobs=args.max_concurrent_jobs,
+            max_jobs_per_host=args.max_jobs_per_host,
+            llm_requests_per_minute=args.llm_requests_per_minute,
+            browser_pool=browser_pool,
+            headless=args.headless,
+            session_cache=SessionCache() if args.session_cache else None,
+            login_flow_store=LoginFlowStore() if args.login_replay else None,
+            use_decision_cache=args.decision_cache,
+        )
+        manifest = await scheduler.run(jobs)
+    finally:
+        await browser_pool.close()
+
+    for outcome in manifest.outcomes:
+        print(
+            f"{outcome.status:8} {outcome.task_type:8} {outcome.url} -> {outcome.output_name}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,41 +1,88 @@
-import base64
+import asyncio
 import json
 import os
 import sys
 import time
+import weakref
+from collections import deque
 from io import BytesIO
-from typing import Dict, List, Optional, Callable
+from typing import Any, Dict, Iterable, List, Optional, Callable, Set
 
+from src.files.blob_store import (
+    DEFAULT_BLOB_STORE_MAX_BYTES,
+    BlobStore,
+    parse_blob_ref,
+    save_blob_refs,
+)
+from src.files.canonical_url import (
+    DEFAULT_URL_POLICY,
+    UrlNormalizationPolicy,
+    VisitedIndex,
+)
+from src.files.snapshot_delta import SnapshotEncoder, resource_key
+from src.files.step_writer import StepResultWriter
 from src.files.zip import create_zip_archive
-import imageio.v2 as imageio
-import numpy as np
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from dotenv import load_dotenv
 from langchain_openai import AzureChatOpenAI
-from PyPDF2 import PdfMerger
 
+from .animation import (
+    ANIMATION_STATS_FILENAME,
+    AnimationWriter,
+    FrameAnnotator,
+    FrameJob,
+    create_animation_writer,
+    get_overlay_text,
+)
+from .browser_context import VidisBrowserContext
+from .browser_pool import BrowserPool, PooledBrowser
+from .capture import (
+    CapturePolicy,
+    capture_response,
+    get_block_route_pattern,
+    get_initiator,
+    should_block_request,
+)
+from .decision_cache import CachingAgent, DecisionCache
+from .legal_discovery import discover_legal_pages
+from .page_wait import PAGE_WAITS_FILENAME, VidisBrowserContextConfig
+from .profiling import LLMTimingCallback, StepProfiler
+from .login_replay import LoginFlowStore, LoginReplayer, extract_login_flow
+from .rate_limit import LLMRateLimitCallback, RateLimiter
+from .session_cache import (
+    PASSWORD_SECRET,
+    SessionCache,
+    get_site_cookie_names,
+    is_login_url,
+    is_password_input,
+    is_site_url,
+    restore_session,
+)
 from .js_code import (
+    CAPTURE_PROBE_CODE,
+    FLUSH_PROBE_CODE,
+    PROBE_BINDING,
+    LEGAL_PAGE_CONTENT_CODE,
     LOCAL_STORAGE_CODE,
     SESSION_STORAGE_CODE,
+    SET_SESSION_STORAGE_CODE,
     RESOURCES_CODE,
     SCROLL_TO_BOTTOM_CODE,
 )
 from .util import (
     get_browser_context,
+    get_host,
+    get_origin,
     get_page,
     get_pages,
     merge_pdfs,
-    save_to_gif,
-    save_to_png,
-    screenshot_to_numpy_array,
-    remove_files,
-    save_pages,
+    render_pdfs,
+    save_history,
 )
 from browser_use import Agent, Controller, ActionResult  # type: ignore
 from browser_use.browser.browser import (  # type: ignore
     Browser,
     BrowserConfig,
-    BrowserContextConfig,
 )
 from browser_use.browser.context import (  # type: ignore
     BrowserContextWindowSize,
@@ -50,6 +97,7 @@ from src.models.models import (
     NetworkRequestResponsePair,
     NetworkResponse,
     PageTypes,
+    ProbeEvent,
     Resource,
     SessionStorage,
     StepResult,
@@ -65,6 +113,10 @@ load_dotenv()
 WINDOW_SIZE = BrowserContextWindowSize(width=1280, height=1100)
 AGENT_OUTPUT_DIR = "./agent_results"
 GIF_DURATION = 2500.0
+BLOB_STORE_DIR = os.path.join(AGENT_OUTPUT_DIR, "blobs")
+BLOB_STORE_MAX_BYTES = int(
+    os.getenv("BLOB_STORE_MAX_BYTES", DEFAULT_BLOB_STORE_MAX_BYTES)
+)
 
 
 AZURE_MODEL = os.getenv("AZURE_MODEL", "fwuBMI_gpt-4.1")
@@ -75,6 +127,23 @@ AZURE_API_KEY = os.getenv("OPENAI_API_KEY")
 COOKIE_BANNER_JPG_FILENAME = "cookie_banner.jpg"
 COOKIE_BANNER_JSON_FILENAME = "cookie_banner.json"
 
+# The state summary added at every step start replaces the one of the previous step
+STATE_MESSAGE_TYPE = "vidis_state"
+STATE_RECENT_PAGES = 5
+STATE_PATH_PREFIXES = 10
+
+
+def get_blob_files(
+    blob_digests: Iterable[str], blob_store: Optional[BlobStore] = None
+) -> Dict[str, str]:
+    """Archive names of the blobs, relative to AGENT_OUTPUT_DIR, and their paths."""
+    blob_store = blob_store or BlobStore(BLOB_STORE_DIR)
+    blob_files = {}
+    for digest in blob_digests:
+        blob_path = blob_store.path(digest)
+        blob_files[os.path.relpath(blob_path, AGENT_OUTPUT_DIR)] = blob_path
+    return blob_files
+
 
 class VidisAgent:
     def __init__(
@@ -88,38 +157,136 @@ class VidisAgent:
         disable_security: bool = True,
         minimum_wait_page_load_time: int = 2,
         maximum_wait_page_load_time: int = 15,
+        capture_policy: Optional[CapturePolicy] = None,
+        step_log_format: str = "jsonl",
+        snapshot_mode: str = "full",
+        browser_pool: Optional[BrowserPool] = None,
+        llm_rate_limiter: Optional[RateLimiter] = None,
+        storage_state: Optional[Dict[str, Any]] = None,
+        session_storage: Optional[Dict[str, Dict[str, str]]] = None,
+        persona: Optional[str] = None,
+        session_cache: Optional[SessionCache] = None,
+        logged_in_task_prompt: Optional[str] = None,
+        login_flow_store: Optional[LoginFlowStore] = None,
+        use_decision_cache: bool = False,
+        legal_prepass: bool = False,
+        pdf_all_tabs: bool = False,
+        animation_formats: Optional[List[str]] = None,
+        animation_scale: float = 1.0,
+        annotation_processes: Optional[int] = None,
+        adaptive_wait: bool = False,
+        url_policy: UrlNormalizationPolicy = DEFAULT_URL_POLICY,
     ):
         self.username = username
         self.password = password
+        # With adaptive_wait, pages settle when network and DOM are quiet instead of
+        # after the fixed minimum and maximum load times
+        self.context_config = VidisBrowserContextConfig(
+            disable_security=disable_security,
+            minimum_wait_page_load_time=minimum_wait_page_load_time,
+            maximum_wait_page_load_time=maximum_wait_page_load_time,
+            browser_window_size=WINDOW_SIZE,
+            adaptive_wait=adaptive_wait,
+        )
+        # With a pool, browser and context are replaced by a pooled browser in run_task
+        self.browser_pool = browser_pool
+        # Shared with other agents running concurrently in this process
+        self.llm_rate_limiter = llm_rate_limiter
+        self.pooled_browser: Optional[PooledBrowser] = None
         self.browser = Browser(
             config=BrowserConfig(
                 headless=headless,
                 disable_security=disable_security,
-                new_context_config=BrowserContextConfig(
-                    disable_security=disable_security,
-                    minimum_wait_page_load_time=minimum_wait_page_load_time,
-                    maximum_wait_page_load_time=maximum_wait_page_load_time,
-                    browser_window_size=WINDOW_SIZE,
-                ),
+                new_context_config=self.context_config,
             )
         )
+        # Cookies and localStorage to start with, e.g. from a previous login
+        self.storage_state = storage_state
+        self.browser_context = VidisBrowserContext(
+            browser=self.browser,
+            config=self.context_config,
+            storage_state=storage_state,
+        )
+        # sessionStorage per origin to start with, storage_state has none. SPA and
+        # OIDC logins often keep their tokens there
+        self.session_storage = session_storage or {}
+        # Tag of the step results when several personas explore the site in parallel
+        self.persona = persona
+        # Session at the end of the run, set by run_task
+        self.final_storage_state: Optional[Dict[str, Any]] = None
+        self.final_session_storage: Dict[str, Dict[str, str]] = {}
+        self.final_url: Optional[str] = None
+        # A valid cached session replaces the login, the agent then runs logged_in_task_prompt
+        self.session_cache = session_cache
+        self.logged_in_task_prompt = logged_in_task_prompt
+        self.session_restored = False
+        # Otherwise a recorded login flow of the site is replayed without the LLM
+        self.login_flow_store = login_flow_store
+        self.login_replayed = False
+        # Actions of earlier runs are reused when the page state matches
+        self.decision_cache = DecisionCache(initial_url) if use_decision_cache else None
+        # Save legal pages found in footer links and the sitemap before the agent starts
+        self.legal_prepass = legal_prepass
+        # save_page_as_pdf captures only the active tab unless all tabs are requested
+        self.pdf_all_tabs = pdf_all_tabs
+        # Replay outputs of the run, see ANIMATION_FORMATS
+        self.animation_formats = animation_formats or ["gif"]
+        # Factor the animation frames are downsampled by, the step images keep full size
+        self.animation_scale = animation_scale
+        # Worker processes that annotate the screenshots, 0 annotates them in this process
+        self.annotation_processes = annotation_processes
+        # A login is detected by the password being typed, then new cookies of the
+        # site on one of its pages that is not a login page
+        self.site_host = get_host(initial_url)
+        self.password_submitted = False
+        self.pre_login_cookie_names: Set[str] = set()
+        self.login_cookies: List[str] = []
+        self.post_login_url: Optional[str] = None
         self.controller = Controller(exclude_actions=["search_google"])
+        # Timings of every step, written to timings.jsonl and trace.json
+        self.profiler = StepProfiler(
+            os.path.join(AGENT_OUTPUT_DIR, output_name), persona=persona
+        )
         self.llm = AzureChatOpenAI(
             model=AZURE_MODEL,
             azure_endpoint=AZURE_ENDPOINT,
             api_version=AZURE_API_VERSION,
             api_key=AZURE_API_KEY,
+            callbacks=(
+                [LLMRateLimitCallback(llm_rate_limiter, self.profiler)]
+                if llm_rate_limiter is not None
+                else []
+            )
+            + [LLMTimingCallback(self.profiler)],
         )
-        self.visited_pages: List[str] = []
+        # URLs differing only in fragment, tracking parameters etc. are one page
+        self.visited_pages = VisitedIndex(url_policy)
         self.register_actions()
         self.request_response_pairs: List[NetworkRequestResponsePair] = []
+        # Sent by the capture probe since the last step, see on_probe_batch
+        self.probe_events: List[Dict[str, Any]] = []
+        self.probe_resources: List[Dict[str, Any]] = []
         self.request_listener: Optional[Callable] = None
+        # Requests blocked by the capture policy, recorded by the route handler
+        self.blocked_requests: weakref.WeakSet = weakref.WeakSet()
+        self.capture_policy = capture_policy or CapturePolicy()
+        self.blob_store = BlobStore(BLOB_STORE_DIR)
+        # Digests of all blobs referenced by this run, added to the zip archive
+        self.blob_digests: Set[str] = set()
         self.task_prompt = task_prompt
         self.output_name = output_name
         self.seen_legal_pages: List[str] = []
         self.initial_url = initial_url
         os.makedirs(AGENT_OUTPUT_DIR, exist_ok=True)
         os.makedirs(os.path.join(AGENT_OUTPUT_DIR, output_name), exist_ok=True)
+        self.step_writer = StepResultWriter(
+            os.path.join(AGENT_OUTPUT_DIR, output_name), step_log_format
+        )
+        # In "delta" mode only changes to the previous step are written
+        self.snapshot_mode = snapshot_mode
+        self.snapshot_encoder = SnapshotEncoder()
+        # step_writer.write_seconds at the end of the last step
+        self.step_write_seconds = 0.0
 
     def register_actions(self):
         """Register custom actions with the controller."""
@@ -131,22 +298,11 @@ class VidisAgent:
         async def save_page_as_pdf(page_type: PageTypes) -> ActionResult:
             try:
                 if page_type.page_type not in self.seen_legal_pages:
-                    pages = get_pages(self.browser)
-                    output_dir = os.path.join(AGENT_OUTPUT_DIR, self.output_name)
-                    os.makedirs(output_dir, exist_ok=True)
-
-                    pdf_filename = f"{page_type.page_type}.pdf"
-                    pdf_path = os.path.join(output_dir, pdf_filename)
-
-                    # Save each page as a separate PDF temporarily
-                    temp_pdfs = await save_pages(pages, output_dir)
-
-                    merge_pdfs(temp_pdfs, pdf_path)
-
-                    # Clean up temporary PDFs
-                    remove_files(temp_pdfs)
-
-                    self.seen_legal_pages.append(page_type.page_type)
+                    if self.pdf_all_tabs:
+                        pages = get_pages(self.browser, self.browser_context)
+                    else:
+                        pages = [await self.browser_context.get_current_page()]
+                    pdf_path = await self.save_legal_page(page_type.page_type, pages)
 
                     return ActionResult(
                         extracted_content=f"{page_type.page_type} Pages saved as PDF: {pdf_path}",
@@ -166,7 +322,7 @@ class VidisAgent:
         @self.controller.action("Scroll to bottom of the page")
         async def scroll_to_bottom() -> ActionResult:
             try:
-                page = get_page(self.browser)
+                page = get_page(self.browser, self.browser_context)
                 await page.evaluate(SCROLL_TO_BOTTOM_CODE)
                 return ActionResult(extracted_content="Scrolled to bottom of the page.")
             except Exception as e:
@@ -175,7 +331,7 @@ class VidisAgent:
         @self.controller.action("cookie_handler: save the cookies as screenshots")
         async def cookie_handler() -> ActionResult:
             try:
-                page = get_page(self.browser)
+                page = get_page(self.browser, self.browser_context)
 
                 page_url = page.url
 
@@ -204,11 +360,71 @@ class VidisAgent:
             except Exception as e:
                 return ActionResult(error=f"Failed to save cookies: {str(e)}")
 
+    async def save_legal_page(self, page_type: str, pages: List) -> str:
+        """
+        Save the pages as one PDF of the given legal page type, with their text and
+        sanitized HTML as <page_type>.txt and <page_type>.html next to it.
+        """
+        output_dir = os.path.join(AGENT_OUTPUT_DIR, self.output_name)
+        os.makedirs(output_dir, exist_ok=True)
+
+        pdf_filename = f"{page_type}.pdf"
+        pdf_path = os.path.join(output_dir, pdf_filename)
+
+        pdfs = await render_pdfs(pages)
+        if len(pdfs) == 1:
+            with open(pdf_path, "wb") as f:
+                f.write(pdfs[0])
+        else:
+            # Merging is CPU-bound, keep it off the event loop
+            await asyncio.to_thread(merge_pdfs, pdfs, pdf_path)
+
+        try:
+            contents = await asyncio.gather(
+                *(page.evaluate(LEGAL_PAGE_CONTENT_CODE) for page in pages)
+            )
+            with open(
+                os.path.join(output_dir, f"{page_type}.txt"), "w", encoding="utf-8"
+            ) as f:
+                f.write("\n\n".join(content["text"] for content in contents))
+            with open(
+                os.path.join(output_dir, f"{page_type}.html"), "w", encoding="utf-8"
+            ) as f:
+                f.write("\n".join(content["html"] for content in contents))
+        except Exception as e:
+            print(f"Failed to save text of {page_type}: {e}")
+
+        self.seen_legal_pages.append(page_type)
+        return pdf_path
+
+    async def run_legal_prepass(self, start_url: str) -> None:
+        """
+        Find and save the legal pages from footer links and the sitemap, so the agent
+        only has to look for the ones that are still missing. The agent starts on
+        start_url again afterwards.
+        """
+        try:
+            page = await self.browser_context.get_current_page()
+            legal_pages = await discover_legal_pages(page, start_url)
+            for page_type, url in legal_pages.items():
+                if page_type in self.seen_legal_pages:
+                    continue
+                try:
+                    await page.goto(url, wait_until="load")
+                    await self.save_legal_page(page_type, [page])
+                    print(f"Saved {page_type} from {url} without the agent")
+                except Exception as e:
+                    print(f"Failed to save {page_type} from {url}: {e}")
+        except Exception as e:
+            print(f"Legal page discovery failed: {e}")
+
     def setup_network_tracking(self, context: BrowserContext):
         """Set up network request tracking for the browser context."""
 
         async def on_response(response) -> None:
             request = response.request
+            if request in self.blocked_requests:
+                return
 
             request_data = NetworkRequest(
                 url=request.url,
@@ -217,20 +433,20 @@ class VidisAgent:
                 resource_type=request.resource_type,
                 timestamp=time.time(),
                 post_data=request.post_data,
+                initiator=get_initiator(request),
             )
 
-            response_text = None
-            try:
-                response_text = await response.text()
-            except Exception as e:
-                print(f"Failed to get response text: {e}")
+            response_data = await capture_response(response, self.capture_policy)
 
-            response_data = NetworkResponse(
-                url=response.url,
-                headers=response.headers,
-                status=response.status,
-                text=response_text,
-            )
+            # Replace the body with a reference into the content-addressed blob store
+            if response_data.text is not None:
+                try:
+                    response_data.text = await asyncio.to_thread(
+                        self.blob_store.put_text, response_data.text
+                    )
+                    self.blob_digests.add(parse_blob_ref(response_data.text))
+                except Exception as e:
+                    print(f"Failed to store response body: {e}")
 
             request_response_pair = NetworkRequestResponsePair(
                 request=request_data,
@@ -241,95 +457,347 @@ class VidisAgent:
         context.on("response", on_response)
         return on_response
 
-    async def on_step_start(self, agent_obj: Agent) -> ActionResult:
-        agent_obj.message_manager._add_message_with_tokens(
-            HumanMessage(
-                content=f"Visited pages: {self.visited_pages}, Already saved legal pages: {self.seen_legal_pages}, Amount of unique pages: {len(self.visited_pages)}"
+    async def setup_request_blocking(self, context: BrowserContext) -> None:
+        """Record the requests the capture policy blocks, then abort or stub them."""
+
+        async def on_route(route) -> None:
+            request = route.request
+            initiator = get_initiator(request)
+            if not should_block_request(
+                self.capture_policy, request.resource_type, request.url, initiator
+            ):
+                await route.continue_()
+                return
+
+            self.blocked_requests.add(request)
+            stub = self.capture_policy.block_action == "stub"
+            try:
+                headers = await request.all_headers()
+            except Exception:
+                headers = request.headers
+            self.request_response_pairs.append(
+                NetworkRequestResponsePair(
+                    request=NetworkRequest(
+                        url=request.url,
+                        method=request.method,
+                        headers=headers,
+                        resource_type=request.resource_type,
+                        timestamp=time.time(),
+                        post_data=request.post_data,
+                        initiator=initiator,
+                        blocked=True,
+                    ),
+                    response=NetworkResponse(
+                        url=request.url,
+                        headers={},
+                        status=204 if stub else 0,
+                        metadata_only=True,
+                    ),
+                )
             )
+            if stub:
+                await route.fulfill(status=204, body=b"")
+            else:
+                await route.abort("blockedbyclient")
+
+        # Routing any request disables the HTTP cache of the context, the pattern
+        # keeps the other requests out of the Python handler
+        await context.route(get_block_route_pattern(self.capture_policy), on_route)
+
+    async def seed_session_storage(self) -> None:
+        """Copy self.session_storage into the first tab, opening each origin once."""
+        if not self.session_storage:
+            return
+        page = await self.browser_context.get_current_page()
+        for origin, entries in self.session_storage.items():
+            try:
+                await page.goto(origin, wait_until="domcontentloaded")
+                await page.evaluate(SET_SESSION_STORAGE_CODE, entries)
+            except Exception as e:
+                print(f"Failed to restore sessionStorage of {origin}: {e}")
+
+    def on_probe_batch(self, source: Dict[str, Any], batch: Dict[str, Any]) -> None:
+        """Collect the events and resources the probes of all pages and frames send."""
+        self.probe_events.extend(batch.get("events") or [])
+        self.probe_resources.extend(batch.get("resources") or [])
+
+    async def setup_capture_probe(self, context: BrowserContext) -> None:
+        """Install the in-page capture probe in all future documents and the open pages."""
+        await context.expose_binding(PROBE_BINDING, self.on_probe_batch)
+        await context.add_init_script(CAPTURE_PROBE_CODE)
+        for page in context.pages:
+            try:
+                await page.evaluate(CAPTURE_PROBE_CODE)
+            except Exception as e:
+                print(f"Failed to install capture probe: {e}")
+
+    async def on_step_start(self, agent_obj: Agent) -> ActionResult:
+        self.profiler.start_step()
+        state_summary = self.get_state_summary()
+        message_manager = agent_obj.message_manager
+        history = message_manager.state.history
+        for index, managed_message in enumerate(history.messages):
+            if managed_message.metadata.message_type == STATE_MESSAGE_TYPE:
+                history.current_tokens -= managed_message.metadata.tokens
+                history.messages.pop(index)
+                break
+        message_manager._add_message_with_tokens(
+            HumanMessage(content=state_summary), message_type=STATE_MESSAGE_TYPE
         )
-        return ActionResult(
-            extracted_content=f"Visited pages: {self.visited_pages}, Already saved legal pages: {self.seen_legal_pages}, Amount of unique pages: {len(self.visited_pages)}",
-            include_in_memory=True,
+
+        # Input tokens of the previous LLM call and of the messages so far
+        previous_tokens = (
+            agent_obj.state.history.history[-1].metadata.input_tokens
+            if agent_obj.state.history.history
+            and agent_obj.state.history.history[-1].metadata
+            else None
+        )
+        print(
+            f"Step {agent_obj.state.n_steps}: state message "
+            f"{history.messages[-1].metadata.tokens} tokens, message history "
+            f"{history.current_tokens} tokens, previous step input "
+            f"{previous_tokens} tokens"
+        )
+        return ActionResult(extracted_content=state_summary, include_in_memory=True)
+
+    def get_state_summary(self) -> str:
+        """
+        Describe the exploration so far in a message of bounded size.
+
+        Instead of all visited pages only the count, the most recent pages and the
+        path prefixes with the most pages are listed.
+        """
+        prefixes = self.visited_pages.get_path_prefixes(STATE_PATH_PREFIXES)
+        other_prefixes = len(self.visited_pages.prefix_counts) - len(prefixes)
+        sections = ", ".join(f"{prefix} ({count})" for prefix, count in prefixes)
+        if other_prefixes > 0:
+            sections += f", {other_prefixes} more"
+        return (
+            f"Amount of unique pages: {len(self.visited_pages)}, "
+            f"Last visited pages: {self.visited_pages.get_recent(STATE_RECENT_PAGES)}, "
+            f"Visited sections (pages): {sections or 'none'}, "
+            f"Already saved legal pages: {self.seen_legal_pages}"
         )
 
     async def on_step_end(self, agent_obj) -> None:
+        history = agent_obj.state.history.history
+        if history and not self.password_submitted:
+            self.password_submitted = self.typed_password(history[-1])
+
+        with self.profiler.span("on_step_end"):
+            self.save_page_waits(agent_obj.state.n_steps)
+            url = await self.collect_browser_data()
+
+        metadata = history[-1].metadata if history else None
+        write_seconds = self.step_writer.write_seconds
+        self.profiler.finish_step(
+            agent_obj.state.n_steps,
+            url=url,
+            estimated_input_tokens=metadata.input_tokens if metadata else None,
+            background_write_seconds=write_seconds - self.step_write_seconds,
+        )
+        self.step_write_seconds = write_seconds
+
+    async def collect_browser_data(self) -> Optional[str]:
         """Collect current browser data including cookies, local storage, and session storage."""
+        url = None
         try:
-            context = get_browser_context(self.browser)
+            context = get_browser_context(self.browser, self.browser_context)
 
-            # Set up network tracking on first call
+            # Set up network tracking on first call, the capture probe is set up by run_task
             if not hasattr(self, "request_listener") or self.request_listener is None:
                 print("First step: setting up network tracking...")
                 self.request_listener = self.setup_network_tracking(context)
 
             page = context.pages[0]
             url = page.url
-            if url not in self.visited_pages:
-                self.visited_pages.append(url)
-
-            cookies = await context.cookies()
+            self.visited_pages.add(url)
 
-            local_storage = await page.evaluate(LOCAL_STORAGE_CODE)
-            session_storage = await page.evaluate(SESSION_STORAGE_CODE)
-            resources_raw = await page.evaluate(RESOURCES_CODE)
+            with self.profiler.span("on_step_end.cookies"):
+                cookies = await context.cookies()
+            self.track_login(url, cookies)
 
-            resources = [Resource.model_validate(item) for item in resources_raw]
+            with self.profiler.span("on_step_end.evaluate"):
+                # One round trip that drains everything the probe recorded during the step
+                probe_data = await page.evaluate(FLUSH_PROBE_CODE)
+                if probe_data is None:
+                    # Probe not installed in this document, fall back to polling
+                    probe_data = {
+                        "local_storage": await page.evaluate(LOCAL_STORAGE_CODE),
+                        "session_storage": await page.evaluate(SESSION_STORAGE_CODE),
+                        "resources": await page.evaluate(RESOURCES_CODE),
+                        "events": [],
+                    }
+                # Recorded in documents that were left during the step or in other
+                # frames and pages
+                events = self.probe_events + probe_data["events"]
+                resources = {}
+                for item in self.probe_resources + probe_data["resources"]:
+                    resource = Resource.model_validate(item)
+                    resources.setdefault(resource_key(resource), resource)
+                self.probe_events = []
+                self.probe_resources = []
 
-            step_result = StepResult(
-                url=url,
-                cookies=[Cookie.model_validate(cookie) for cookie in cookies],
-                local_storage=LocalStorage(entries=local_storage),
-                session_storage=SessionStorage(entries=session_storage),
-                resources=resources,
-                request_response_pairs=self.request_response_pairs,
-            )
+            with self.profiler.span("on_step_end.serialize"):
+                step_result = StepResult(
+                    url=url,
+                    cookies=[Cookie.model_validate(cookie) for cookie in cookies],
+                    local_storage=LocalStorage(entries=probe_data["local_storage"]),
+                    session_storage=SessionStorage(
+                        entries=probe_data["session_storage"]
+                    ),
+                    resources=list(resources.values()),
+                    request_response_pairs=self.request_response_pairs,
+                    probe_events=sorted(
+                        (ProbeEvent.model_validate(event) for event in events),
+                        key=lambda event: event.timestamp,
+                    ),
+                    persona=self.persona,
+                )
+                if self.snapshot_mode == "delta":
+                    record = self.snapshot_encoder.encode(step_result)
+                else:
+                    record = step_result
 
             # Clear network request response pairs after each step
+            self.profiler.add_captured(self.request_response_pairs)
             self.request_response_pairs = []
 
-            output_dir = os.path.join(AGENT_OUTPUT_DIR, self.output_name)
+            # Full snapshots are serialized and written in the background
+            with self.profiler.span("on_step_end.write"):
+                self.step_writer.write(record)
+            return url
+        except Exception as e:
+            print(f"Failed to retrieve browser data: {str(e)}")
+            return url
+
+    def save_page_waits(self, step: int) -> None:
+        """Append the adaptive page waits of the step to page_waits.jsonl."""
+        page_waiter = getattr(self.browser_context, "page_waiter", None)
+        if page_waiter is None:
+            return
+
+        page_waits = page_waiter.drain()
+        if not page_waits:
+            return
+        try:
             with open(
-                os.path.join(output_dir, "step_result.jsonl"), "a", encoding="utf-8"
+                os.path.join(AGENT_OUTPUT_DIR, self.output_name, PAGE_WAITS_FILENAME),
+                "a",
+                encoding="utf-8",
             ) as f:
-                f.write(json.dumps(step_result.model_dump()) + "\n")
-            return
+                for page_wait in page_waits:
+                    page_wait.step = step
+                    f.write(page_wait.model_dump_json() + "\n")
         except Exception as e:
-            print(f"Failed to retrieve browser data: {str(e)}")
+            print(f"Failed to save page waits: {e}")
+
+    def typed_password(self, history_item) -> bool:
+        """Whether an action of the step typed the password without an error."""
+        if history_item.model_output is None:
+            return False
+        sensitive_data = {PASSWORD_SECRET: self.password}
+        for action, result in zip(
+            history_item.model_output.action, history_item.result
+        ):
+            if result.error:
+                break
+            if is_password_input(action.model_dump(exclude_unset=True), sensitive_data):
+                return True
+        return False
+
+    def track_login(self, url: str, cookies: List[Dict[str, Any]]) -> None:
+        """
+        Remember the first page of the site after the login and the cookies it set.
+
+        Leaving the site and coming back is not enough, e.g. for external legal pages.
+        """
+        if self.post_login_url is not None or self.session_restored:
             return
 
-    def create_gif_from_history(self, history_data: List[Dict], output_name: str):
-        """Create an animated GIF from the agent's history with text in a dedicated bottom area."""
-        screenshots_np = []
+        cookie_names = get_site_cookie_names(cookies, self.site_host)
+        if not self.password_submitted:
+            self.pre_login_cookie_names = cookie_names
+            return
+        login_cookies = cookie_names - self.pre_login_cookie_names
+        if is_site_url(url, self.site_host) and not is_login_url(url) and login_cookies:
+            self.post_login_url = url
+            self.login_cookies = sorted(login_cookies)
+
+    def create_gif_from_history(self, history_data: Iterable[Dict], output_name: str):
+        """Create the animations of the agent's history with text in a dedicated bottom area."""
         output_dir = os.path.join(AGENT_OUTPUT_DIR, output_name)
-        gif_path = os.path.join(output_dir, f"animation.gif")
 
         images_dir = os.path.join(output_dir, "images")
         os.makedirs(images_dir, exist_ok=True)
 
-        text_area_height = 150
-
-        for i, entry in enumerate(history_data):
-            screenshot_base64 = entry.get("state", {}).get("screenshot", "")
-            if not screenshot_base64:
-                continue
+        def frame_jobs():
+            for i, entry in enumerate(history_data):
+                screenshot_base64 = entry.get("state", {}).get("screenshot", "")
+                if not screenshot_base64:
+                    continue
 
-            try:
-                screenshot_np = screenshot_to_numpy_array(
-                    screenshot_base64, text_area_height, entry
+                image_name = f"step_{i:03d}.png"
+                yield FrameJob(
+                    screenshot_base64=screenshot_base64,
+                    text_lines=get_overlay_text(entry),
+                    image_path=os.path.join(images_dir, image_name),
                 )
-                screenshots_np.append(screenshot_np)
 
-                image_name = f"step_{i:03d}.png"
-                image_path = os.path.join(images_dir, image_name)
-                save_to_png(screenshot_np, image_path)
+        # Frames are written as they are created instead of collected for the whole run
+        writers: List[AnimationWriter] = [
+            create_animation_writer(
+                animation_format, output_dir, GIF_DURATION, self.animation_scale
+            )
+            for animation_format in self.animation_formats
+        ]
+        failed: List[AnimationWriter] = []
+        frame_count = 0
+        try:
+            with FrameAnnotator(self.annotation_processes) as annotator:
+                for frame in annotator.annotate(frame_jobs()):
+                    if frame is None:
+                        continue
+                    frame_count += 1
+                    for writer in writers:
+                        if writer in failed:
+                            continue
+                        try:
+                            writer.append(frame)
+                        except Exception as e:
+                            print(f"Failed to add frame to {writer.format}: {e}")
+                            failed.append(writer)
+        finally:
+            for writer in writers:
+                try:
+                    writer.close()
+                except Exception as e:
+                    print(f"Failed to save {writer.format}: {e}")
+                    failed.append(writer)
 
-            except Exception as e:
-                print(f"Failed to process screenshot: {e}")
-                continue
+        if not frame_count:
+            print("No frames were created.")
+            return
 
-        save_to_gif(screenshots_np, gif_path, images_dir, GIF_DURATION)
+        stats = [writer.get_stats() for writer in writers if writer not in failed]
+        for writer_stats in stats:
+            print(
+                f"{writer_stats.format} saved to {writer_stats.path} "
+                f"({writer_stats.frame_count} frames, "
+                f"{writer_stats.dropped_frame_count} identical frames dropped, "
+                f"{writer_stats.size_bytes / 1024 / 1024:.1f} MB, "
+                f"encoded in {writer_stats.encode_seconds:.1f}s)"
+            )
+        print(f"Individual images saved to {images_dir}")
+
+        with open(
+            os.path.join(output_dir, ANIMATION_STATS_FILENAME), "w", encoding="utf-8"
+        ) as f:
+            json.dump(
+                [writer_stats.model_dump() for writer_stats in stats], f, indent=4
+            )
 
-    async def run_task(self, max_steps: int = 25):
+    async def run_task(self, max_steps: int = 25, create_zip: bool = True):
         """Run the task."""
         output_dir = os.path.join(AGENT_OUTPUT_DIR, self.output_name)
         os.makedirs(output_dir, exist_ok=True)
@@ -341,38 +809,246 @@ class VidisAgent:
             "VIDIS_PASSWORD": self.password,
         }
 
-        agent = Agent(
+        if self.browser_pool is not None:
+            self.pooled_browser, self.browser_context = await self.browser_pool.acquire(
+                self.context_config, storage_state=self.storage_state
+            )
+            self.browser = self.pooled_browser.browser
+        self.browser_context.profiler = self.profiler
+
+        if self.session_cache is not None and self.logged_in_task_prompt is not None:
+            session = await restore_session(
+                self.session_cache, self.browser, self.initial_url, self.username
+            )
+            if session is not None:
+                self.session_restored = True
+                self.post_login_url = session.post_login_url
+                self.browser_context.storage_state = session.storage_state
+                self.session_storage = session.session_storage
+                self.task_prompt = self.logged_in_task_prompt
+                initial_actions = [{"go_to_url": {"url": session.post_login_url}}]
+
+        session = await self.browser_context.get_session()
+        await self.seed_session_storage()
+        # Before the first action, so that step 1 is recorded by the probe as well
+        await self.setup_capture_probe(session.context)
+        if (
+            self.capture_policy.blocked_resource_types
+            or self.capture_policy.block_first_party_images
+        ):
+            await self.setup_request_blocking(session.context)
+
+        if (
+            not self.session_restored
+            and self.login_flow_store is not None
+            and self.logged_in_task_prompt is not None
+            and await self.replay_login(sensitive_data)
+        ):
+            self.task_prompt = self.logged_in_task_prompt
+            # The replay already ends on the post-login page
+            initial_actions = None
+
+        if self.legal_prepass:
+            start_url = self.post_login_url or self.initial_url
+            await self.run_legal_prepass(start_url)
+            initial_actions = [{"go_to_url": {"url": start_url}}]
+
+        agent_kwargs = dict(
             task=self.task_prompt,
             llm=self.llm,
             browser=self.browser,
+            browser_context=self.browser_context,
             validate_output=True,
             controller=self.controller,
             initial_actions=initial_actions,
             enable_memory=True,
             sensitive_data=sensitive_data,
         )
+        if self.decision_cache is not None:
+            agent = CachingAgent(
+                decision_cache=self.decision_cache,
+                # The same page needs other actions once legal pages have been saved
+                cache_context=lambda: ",".join(sorted(self.seen_legal_pages)),
+                **agent_kwargs,
+            )
+        else:
+            agent = Agent(**agent_kwargs)
+        self.profiler.instrument(agent)
 
-        history = await agent.run(
-            on_step_start=self.on_step_start,
-            on_step_end=self.on_step_end,
-            max_steps=max_steps,
+        self.step_writer.start()
+        try:
+            history = await agent.run(
+                on_step_start=self.on_step_start,
+                on_step_end=self.on_step_end,
+                max_steps=max_steps,
+            )
+        finally:
+            # Make sure all step results are on disk before post-processing
+            await self.step_writer.close()
+            await self.save_session()
+            await self.close_browser()
+            await asyncio.to_thread(self.profiler.save_chrome_trace)
+            if self.decision_cache is not None:
+                await asyncio.to_thread(self.save_decision_cache, output_dir)
+
+        # Post-processing blocks, other agents on the event loop keep running
+        await asyncio.to_thread(
+            self.save_results, history, output_dir, sensitive_data, create_zip
         )
 
+    def save_results(
+        self,
+        history,
+        output_dir: str,
+        sensitive_data: Dict[str, str],
+        create_zip: bool,
+    ) -> None:
+        """Write history.json and the animations, record the login and zip the run."""
         history_path = os.path.join(output_dir, "history.json")
-        history.save_to_file(str(history_path))
+        record_login = self.login_flow_store is not None and not (
+            self.session_restored or self.login_replayed
+        )
+        # Entries without screenshots, for the login recording
+        login_history: List[Dict] = []
+
+        def history_entries():
+            for entry in save_history(history, history_path):
+                if record_login:
+                    state = {
+                        k: v for k, v in entry["state"].items() if k != "screenshot"
+                    }
+                    login_history.append({**entry, "state": state})
+                yield entry
+
+        # history.json is written while the frames are created instead of read back
+        entries = history_entries()
+        self.create_gif_from_history(entries, self.output_name)
+        # Finish history.json if the animation stopped early
+        deque(entries, maxlen=0)
+
+        if record_login:
+            self.record_login(login_history, sensitive_data)
+
+        if create_zip:
+            self.create_zip_archive(self.output_name)
+
+    async def replay_login(self, sensitive_data: Dict[str, str]) -> bool:
+        """Replay the recorded login flow of the site, if there is one."""
+        flow = self.login_flow_store.get(self.initial_url)
+        if flow is None:
+            return False
+
+        try:
+            page = await self.browser_context.get_current_page()
+            replayer = LoginReplayer(page, sensitive_data)
+            if not await replayer.replay(flow, self.initial_url):
+                print("Falling back to the agent for the login")
+                return False
+        except Exception as e:
+            print(f"Failed to replay login: {e}")
+            return False
+
+        self.login_replayed = True
+        self.post_login_url = page.url
+        self.login_cookies = flow.login_cookies
+        return True
+
+    def record_login(self, history: List[Dict], sensitive_data: Dict[str, str]) -> None:
+        """Store the login action sequence of this run for replays in later runs."""
+        try:
+            if not self.login_cookies:
+                # No login was detected, see track_login
+                return
+            flow = extract_login_flow(
+                history, self.initial_url, sensitive_data, self.login_cookies
+            )
+            if flow is not None:
+                self.login_flow_store.put(self.initial_url, flow)
+                print(f"Recorded login flow with {len(flow.actions)} actions")
+        except Exception as e:
+            print(f"Failed to record login flow: {e}")
 
-        with open(history_path, "r", encoding="utf-8") as f:
-            history_data = json.load(f)
-            self.create_gif_from_history(history_data["history"], self.output_name)
+    def save_decision_cache(self, output_dir: str) -> None:
+        try:
+            self.decision_cache.save()
+            self.decision_cache.save_stats(output_dir)
+            stats = self.decision_cache.stats
+            print(f"Decision cache: {stats.hits} hits, {stats.misses} misses")
+        except Exception as e:
+            print(f"Failed to save decision cache: {e}")
+
+    async def save_session(self) -> None:
+        """
+        Remember the final URL and storage_state so another context can continue the
+        session, and cache the session of a successful login.
+        """
+        try:
+            context = get_browser_context(self.browser, self.browser_context)
+            if context.pages:
+                page = context.pages[0]
+                self.final_url = page.url
+                try:
+                    self.final_session_storage = {
+                        get_origin(page.url): await page.evaluate(SESSION_STORAGE_CODE)
+                    }
+                except Exception as e:
+                    print(f"Failed to read sessionStorage: {e}")
+            self.final_storage_state = await context.storage_state()
+
+            if (
+                self.session_cache is not None
+                and not self.session_restored
+                and self.post_login_url is not None
+                and self.login_cookies
+            ):
+                self.session_cache.put(
+                    self.initial_url,
+                    self.username,
+                    self.final_storage_state,
+                    self.post_login_url,
+                    self.login_cookies,
+                    self.final_session_storage,
+                )
+        except Exception as e:
+            print(f"Failed to save session: {e}")
+
+    async def close_browser(self) -> None:
+        """Close the job's browser context and return a pooled browser to the pool."""
+        if self.pooled_browser is not None:
+            await self.browser_pool.release(self.pooled_browser, self.browser_context)
+            self.pooled_browser = None
+            return
 
-        self.create_zip_archive(self.output_name)
+        await self.browser_context.close()
+        await self.browser.close()
 
-    def create_zip_archive(self, output_name: str):
+    def create_zip_archive(
+        self, output_name: str, blob_digests: Optional[Set[str]] = None
+    ):
         """Create a zip file of the task directory."""
         output_dir = os.path.join(AGENT_OUTPUT_DIR, output_name)
 
         zip_filename = f"{output_name}.zip"
         zip_path = os.path.join(AGENT_OUTPUT_DIR, zip_filename)
 
-        create_zip_archive(str(output_dir), str(zip_path))
+        # Bundle the referenced blobs so the archive is self-contained
+        if blob_digests is None:
+            blob_digests = self.blob_digests
+        try:
+            save_blob_refs(output_dir, blob_digests)
+        except Exception as e:
+            print(f"Failed to save blob references: {e}")
+        blob_files = get_blob_files(blob_digests, self.blob_store)
+
+        create_zip_archive(str(output_dir), str(zip_path), extra_files=blob_files)
         print(f"Created zip archive at: {zip_path}")
+
+        # The shared blob store would otherwise grow with every run
+        try:
+            removed = self.blob_store.prune(
+                BLOB_STORE_MAX_BYTES, runs_dir=AGENT_OUTPUT_DIR
+            )
+            if removed:
+                print(f"Removed {removed} unused blobs from {self.blob_store.root_dir}")
+        except Exception as e:
+            print(f"Failed to prune blob store: {e}")
@@ -0,0 +1,522 @@
+import base64
+import multiprocessing
+import os
+import struct
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from typing import BinaryIO, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import imageio
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from PIL.GifImagePlugin import getdata, getheader
+from pydantic import BaseModel
+
+TEXT_AREA_HEIGHT = 150
+FONT_SIZE = 20
+TEXT_MARGIN = 10
+LINE_SPACING = 5
+DEFAULT_ANNOTATION_PROCESSES = 4
+ANIMATION_STATS_FILENAME = "animation_stats.json"
+
+# Font and text band of the current process, created once per worker
+_font: Optional[ImageFont.ImageFont] = None
+_text_band: Optional[Image.Image] = None
+
+
+class FrameJob(BaseModel):
+    screenshot_base64: str
+    text_lines: List[str]
+    # The annotated frame is also saved here as PNG
+    image_path: str
+
+
+def get_overlay_text(entry: Dict) -> List[str]:
+    """Return the goal and the truncated results of a history entry."""
+    text_lines = []
+    model_output = entry.get("model_output") or {}
+    if "current_state" in model_output:
+        text_lines.append("Goal: " + model_output["current_state"].get("next_goal", ""))
+
+    for result in entry.get("result", []):
+        extracted_content = str(result.get("extracted_content", ""))
+        # Truncate long text
+        if len(extracted_content) > 100:
+            extracted_content = extracted_content[:97] + "..."
+        text_lines.append(extracted_content)
+    return text_lines
+
+
+def _get_font() -> ImageFont.ImageFont:
+    global _font
+    if _font is None:
+        _font = ImageFont.load_default(size=FONT_SIZE)
+    return _font
+
+
+@lru_cache(maxsize=4096)
+def _text_width(text: str) -> float:
+    return _get_font().getlength(text)
+
+
+@lru_cache(maxsize=1024)
+def _text_height(text: str) -> int:
+    bbox = _get_font().getbbox(text)
+    return int(bbox[3] - bbox[1])
+
+
+@lru_cache(maxsize=1024)
+def _wrap_line(line: str, max_width: int) -> Tuple[str, ...]:
+    """Greedy word wrap with the cached widths of the words."""
+    space_width = _text_width(" ")
+    wrapped: List[str] = []
+    words: List[str] = []
+    width = 0.0
+    for word in line.split():
+        word_width = _text_width(word)
+        new_width = width + space_width + word_width if words else word_width
+        if words and new_width >= max_width:
+            wrapped.append(" ".join(words))
+            words, new_width = [], word_width
+        words.append(word)
+        width = new_width
+    if words:
+        wrapped.append(" ".join(words))
+    return tuple(wrapped)
+
+
+def _render_text_band(
+    text_lines: List[str], width: int, text_area_height: int
+) -> np.ndarray:
+    """Draw the text into the reused text band of this process."""
+    global _text_band
+    if _text_band is None or _text_band.size != (width, text_area_height):
+        _text_band = Image.new("RGB", (width, text_area_height), (255, 255, 255))
+    else:
+        _text_band.paste((255, 255, 255), (0, 0, width, text_area_height))
+
+    draw = ImageDraw.Draw(_text_band)
+    # Separator line
+    draw.line([(0, 0), (width, 0)], fill=(200, 200, 200), width=2)
+
+    font = _get_font()
+    y = TEXT_MARGIN
+    for line in text_lines:
+        for line_text in _wrap_line(line, width - TEXT_MARGIN * 2):
+            draw.text((TEXT_MARGIN, y), line_text, font=font, fill=(0, 0, 0))
+            y += _text_height(line_text) + LINE_SPACING
+    return np.asarray(_text_band)
+
+
+def annotate_screenshot(
+    screenshot_base64: str,
+    text_lines: List[str],
+    text_area_height: int = TEXT_AREA_HEIGHT,
+) -> np.ndarray:
+    """Return the screenshot with the text in a dedicated area at the bottom."""
+    screenshot = Image.open(BytesIO(base64.b64decode(screenshot_base64)))
+    screenshot = screenshot.convert("RGB")
+    width, height = screenshot.size
+
+    # The screenshot and the text band are written into the frame directly
+    frame = np.empty((height + text_area_height, width, 3), dtype=np.uint8)
+    frame[:height] = np.asarray(screenshot)
+    frame[height:] = _render_text_band(text_lines, width, text_area_height)
+    return frame
+
+
+def _annotate_job(job: FrameJob) -> np.ndarray:
+    frame = annotate_screenshot(job.screenshot_base64, job.text_lines)
+    imageio.imwrite(job.image_path, frame)
+    return frame
+
+
+class FrameAnnotator:
+    """
+    Annotates screenshots and saves them as PNG in a pool of worker processes.
+
+    Frames are returned in job order. At most two jobs per worker are in flight,
+    so the frames of a long run are not all held in memory at once. With zero
+    processes the frames are annotated in the calling process.
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        if processes is None:
+            processes = min(DEFAULT_ANNOTATION_PROCESSES, os.cpu_count() or 1)
+        self.processes = processes
+        self.executor: Optional[ProcessPoolExecutor] = None
+        if processes > 0:
+            # Forking would copy the browser and event loop threads of the agent
+            self.executor = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def __enter__(self) -> "FrameAnnotator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def annotate(self, jobs: Iterable[FrameJob]) -> Iterator[Optional[np.ndarray]]:
+        """Yield the annotated frame of every job, None if it failed."""
+        if self.executor is None:
+            for job in jobs:
+                yield self._result(lambda: _annotate_job(job))
+            return
+
+        pending: Deque[Future] = deque()
+        for job in jobs:
+            pending.append(self.executor.submit(_annotate_job, job))
+            if len(pending) >= self.processes * 2:
+                yield self._result(pending.popleft().result)
+        while pending:
+            yield self._result(pending.popleft().result)
+
+    @staticmethod
+    def _result(get_frame) -> Optional[np.ndarray]:
+        try:
+            return get_frame()
+        except Exception as e:
+            print(f"Failed to process screenshot: {e}")
+            return None
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+class AnimationStats(BaseModel):
+    format: str
+    path: str
+    frame_count: int
+    dropped_frame_count: int
+    size_bytes: int
+    encode_seconds: float
+
+
+class AnimationWriter(ABC):
+    """
+    Base class of the replay outputs, written frame by frame.
+
+    A frame that is identical to the previous one extends the previous frame's
+    duration instead of being written again, so only the last frame is kept in
+    memory. With a scale below 1 the frames are downsampled before encoding.
+    """
+
+    format = ""
+    filename = ""
+
+    def __init__(self, path: str, duration: float, scale: float = 1.0):
+        if not 0 < scale <= 1:
+            raise ValueError("scale must be in (0, 1]")
+        self.path = path
+        # Milliseconds per frame
+        self.duration = duration
+        self.scale = scale
+        self.frame_count = 0
+        self.dropped_frame_count = 0
+        self.encode_seconds = 0.0
+        # Last appended frame, written once the next different frame arrives
+        self._pending: Optional[np.ndarray] = None
+        self._pending_duration = 0.0
+        self._closed = False
+
+    def __enter__(self) -> "AnimationWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def append(self, frame: np.ndarray) -> None:
+        if self._pending is not None and np.array_equal(frame, self._pending):
+            self._pending_duration += self.duration
+            self.dropped_frame_count += 1
+            return
+
+        self._flush()
+        self._pending = frame
+        self._pending_duration = self.duration
+
+    def _flush(self) -> None:
+        if self._pending is None:
+            return
+
+        started_at = time.perf_counter()
+        image = Image.fromarray(self._pending)
+        if self.scale < 1:
+            size = (
+                max(1, round(image.width * self.scale)),
+                max(1, round(image.height * self.scale)),
+            )
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        self._write_frame(image, self._pending_duration)
+        self.encode_seconds += time.perf_counter() - started_at
+
+        self.frame_count += 1
+        self._pending = None
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._flush()
+        finally:
+            started_at = time.perf_counter()
+            self._finish()
+            self.encode_seconds += time.perf_counter() - started_at
+
+    def get_stats(self) -> AnimationStats:
+        return AnimationStats(
+            format=self.format,
+            path=self.path,
+            frame_count=self.frame_count,
+            dropped_frame_count=self.dropped_frame_count,
+            size_bytes=os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            encode_seconds=round(self.encode_seconds, 3),
+        )
+
+    @abstractmethod
+    def _write_frame(self, image: Image.Image, duration: float) -> None:
+        """Encode a frame shown for duration milliseconds."""
+
+    @abstractmethod
+    def _finish(self) -> None:
+        """Complete the output after the last frame."""
+
+
+class GifWriter(AnimationWriter):
+    """Animated GIF, every frame is quantized to its own 256 color table."""
+
+    format = "gif"
+    filename = "animation.gif"
+
+    def __init__(self, path: str, duration: float, scale: float = 1.0):
+        super().__init__(path, duration, scale)
+        self._file: Optional[BinaryIO] = None
+
+    def _write_frame(self, image: Image.Image, duration: float) -> None:
+        image = image.quantize(colors=256)
+        if self._file is None:
+            self._file = open(self.path, "wb")
+            # Loop forever, every frame brings its own color table
+            header, _ = getheader(image, info={"loop": 0, "duration": self.duration})
+            self._file.write(b"".join(header))
+        for chunk in getdata(image, duration=duration, include_color_table=True):
+            self._file.write(chunk)
+
+    def _finish(self) -> None:
+        if self._file is not None:
+            self._file.write(b";")
+            self._file.close()
+            self._file = None
+
+
+class WebPWriter(AnimationWriter):
+    """
+    Animated WebP, lossy and in full color.
+
+    Image.save needs all frames at once, so every frame is encoded on its own as
+    a still WebP with the public Pillow API, and its image data is appended to
+    the file as a frame of the WebP container (RIFF chunks VP8X, ANIM and ANMF,
+    see https://developers.google.com/speed/webp/docs/riff_container). Only the
+    current frame is kept in memory.
+    """
+
+    format = "webp"
+    filename = "animation.webp"
+
+    # Blending off, every frame covers the whole canvas
+    NO_BLEND = 0x02
+    ANIMATION_FLAG = 0x02
+    # Chunks of a still WebP that belong into a frame
+    FRAME_CHUNKS = {b"ALPH", b"VP8 ", b"VP8L"}
+
+    def __init__(
+        self, path: str, duration: float, scale: float = 1.0, quality: int = 80
+    ):
+        super().__init__(path, duration, scale)
+        self.quality = quality
+        self._file: Optional[BinaryIO] = None
+        self._size: Optional[Tuple[int, int]] = None
+
+    @staticmethod
+    def _chunk(fourcc: bytes, data: bytes) -> bytes:
+        padding = b"\0" if len(data) % 2 else b""
+        return fourcc + struct.pack("<I", len(data)) + data + padding
+
+    @staticmethod
+    def _uint24(value: int) -> bytes:
+        return struct.pack("<I", value)[:3]
+
+    def _frame_data(self, image: Image.Image) -> bytes:
+        """The image chunks of the frame encoded as still WebP."""
+        buffer = BytesIO()
+        image.convert("RGB").save(buffer, format="WEBP", quality=self.quality)
+        data = buffer.getvalue()
+        chunks = []
+        offset = 12  # RIFF header
+        while offset + 8 <= len(data):
+            fourcc = data[offset : offset + 4]
+            (size,) = struct.unpack("<I", data[offset + 4 : offset + 8])
+            if fourcc in self.FRAME_CHUNKS:
+                chunks.append(self._chunk(fourcc, data[offset + 8 : offset + 8 + size]))
+            offset += 8 + size + size % 2
+        return b"".join(chunks)
+
+    def _write_frame(self, image: Image.Image, duration: float) -> None:
+        if self._file is None:
+            self._size = image.size
+            self._file = open(self.path, "wb")
+            # The RIFF size is written by _finish
+            self._file.write(b"RIFF\0\0\0\0WEBP")
+            width, height = image.size
+            self._file.write(
+                self._chunk(
+                    b"VP8X",
+                    bytes([self.ANIMATION_FLAG, 0, 0, 0])
+                    + self._uint24(width - 1)
+                    + self._uint24(height - 1),
+                )
+            )
+            # White background, loop forever
+            self._file.write(self._chunk(b"ANIM", b"\xff\xff\xff\xff\0\0"))
+        elif image.size != self._size:
+            image = image.resize(self._size, Image.Resampling.LANCZOS)
+
+        width, height = self._size
+        header = (
+            self._uint24(0)
+            + self._uint24(0)
+            + self._uint24(width - 1)
+            + self._uint24(height - 1)
+            + self._uint24(min(round(duration), 0xFFFFFF))
+            + bytes([self.NO_BLEND])
+        )
+        self._file.write(self._chunk(b"ANMF", header + self._frame_data(image)))
+
+    def _finish(self) -> None:
+        if self._file is None:
+            return
+        size = self._file.tell() - 8
+        self._file.seek(4)
+        self._file.write(struct.pack("<I", size))
+        self._file.close()
+        self._file = None
+
+
+class Mp4Writer(AnimationWriter):
+    """
+    H.264 MP4 with the ffmpeg binary bundled by imageio-ffmpeg.
+
+    A merged frame is repeated for its duration, the video has a constant frame
+    rate of one frame per duration.
+    """
+
+    format = "mp4"
+    filename = "animation.mp4"
+
+    def __init__(self, path: str, duration: float, scale: float = 1.0, crf: int = 28):
+        super().__init__(path, duration, scale)
+        self.crf = crf
+        self._writer = None
+
+    def _write_frame(self, image: Image.Image, duration: float) -> None:
+        if self._writer is None:
+            try:
+                import imageio_ffmpeg  # type: ignore
+            except ImportError as e:
+                raise ImportError(
+                    "MP4 output needs imageio-ffmpeg, install the dependencies with `uv sync`"
+                ) from e
+
+            self._writer = imageio_ffmpeg.write_frames(
+                self.path,
+                image.size,
+                fps=1000 / self.duration,
+                codec="libx264",
+                quality=None,
+                output_params=["-crf", str(self.crf), "-preset", "veryfast"],
+                # yuv420p needs even dimensions
+                macro_block_size=2,
+            )
+            self._writer.send(None)
+
+        data = np.asarray(image.convert("RGB")).tobytes()
+        for _ in range(max(1, round(duration / self.duration))):
+            self._writer.send(data)
+
+    def _finish(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ContactSheetWriter(AnimationWriter):
+    """JPEG with a thumbnail of every frame in rows of `columns`, left to right."""
+
+    format = "contact_sheet"
+    filename = "contact_sheet.jpg"
+
+    def __init__(
+        self,
+        path: str,
+        duration: float,
+        scale: float = 1.0,
+        thumbnail_width: int = 240,
+        columns: int = 6,
+    ):
+        super().__init__(path, duration, scale)
+        self.thumbnail_width = thumbnail_width
+        self.columns = columns
+        self._thumbnails: List[Image.Image] = []
+
+    def _write_frame(self, image: Image.Image, duration: float) -> None:
+        height = max(1, round(image.height * self.thumbnail_width / image.width))
+        self._thumbnails.append(
+            image.resize((self.thumbnail_width, height), Image.Resampling.BILINEAR)
+        )
+
+    def _finish(self) -> None:
+        if not self._thumbnails:
+            return
+        padding = 4
+        cell_width = self.thumbnail_width + padding
+        cell_height = max(thumbnail.height for thumbnail in self._thumbnails) + padding
+        rows = (len(self._thumbnails) + self.columns - 1) // self.columns
+        columns = min(self.columns, len(self._thumbnails))
+        sheet = Image.new(
+            "RGB",
+            (columns * cell_width + padding, rows * cell_height + padding),
+            (255, 255, 255),
+        )
+        for i, thumbnail in enumerate(self._thumbnails):
+            row, column = divmod(i, self.columns)
+            sheet.paste(
+                thumbnail,
+                (column * cell_width + padding, row * cell_height + padding),
+            )
+        sheet.save(self.path, "JPEG", quality=85)
+        self._thumbnails = []
+
+
+ANIMATION_WRITERS: Dict[str, type] = {
+    writer.format: writer
+    for writer in [GifWriter, WebPWriter, Mp4Writer, ContactSheetWriter]
+}
+ANIMATION_FORMATS = list(ANIMATION_WRITERS)
+
+
+def create_animation_writer(
+    animation_format: str, output_dir: str, duration: float, scale: float = 1.0
+) -> AnimationWriter:
+    writer_class = ANIMATION_WRITERS[animation_format]
+    return writer_class(
+        os.path.join(output_dir, writer_class.filename), duration, scale
+    )
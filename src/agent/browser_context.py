@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from browser_use.browser.browser import Browser, BrowserContextConfig  # type: ignore
+from browser_use.browser.context import BrowserContext  # type: ignore
+from browser_use.browser.views import URLNotAllowedError  # type: ignore
+
+from .page_wait import AdaptivePageWaiter, VidisBrowserContextConfig
+from .profiling import StepProfiler
+
+
+class _StorageStateBrowser:
+    """Playwright browser whose new contexts start from a storage_state."""
+
+    def __init__(self, browser, storage_state: Dict[str, Any]):
+        self._browser = browser
+        self._storage_state = storage_state
+
+    def __getattr__(self, name: str):
+        return getattr(self._browser, name)
+
+    async def new_context(self, **kwargs):
+        return await self._browser.new_context(
+            storage_state=self._storage_state, **kwargs
+        )
+
+
+class VidisBrowserContext(BrowserContext):
+    """
+    BrowserContext that can be seeded with the cookies and localStorage of another
+    context (a Playwright storage_state), e.g. to reuse a login.
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        config: Optional[BrowserContextConfig] = None,
+        storage_state: Optional[Dict[str, Any]] = None,
+    ):
+        super().__init__(browser=browser, config=config)
+        self.storage_state = storage_state
+        self.page_waiter: Optional[AdaptivePageWaiter] = None
+        if (
+            isinstance(self.config, VidisBrowserContextConfig)
+            and self.config.adaptive_wait
+        ):
+            self.page_waiter = AdaptivePageWaiter(self.config)
+        # Times page loads and browser state reads when set, e.g. by VidisAgent
+        self.profiler: Optional[StepProfiler] = None
+
+    async def _create_context(self, browser):
+        if self.storage_state is None:
+            return await super()._create_context(browser)
+        return await super()._create_context(
+            _StorageStateBrowser(browser, self.storage_state)
+        )
+
+    @contextmanager
+    def _span(self, name: str) -> Iterator[None]:
+        if self.profiler is None:
+            yield
+        else:
+            with self.profiler.span(name):
+                yield
+
+    async def get_state(self, *args, **kwargs):
+        with self._span("browser_state"):
+            return await super().get_state(*args, **kwargs)
+
+    async def _wait_for_page_and_frames_load(
+        self, timeout_overwrite: Optional[float] = None
+    ):
+        with self._span("page_load"):
+            if self.page_waiter is None:
+                return await super()._wait_for_page_and_frames_load(timeout_overwrite)
+
+            try:
+                page = await self.get_current_page()
+                await self.page_waiter.wait(page, minimum_seconds=timeout_overwrite)
+                await self._check_and_handle_navigation(page)
+            except URLNotAllowedError:
+                raise
+            except Exception as e:
+                print(f"Page load failed, continuing: {e}")
+
+    async def get_storage_state(self) -> Optional[Dict[str, Any]]:
+        """Cookies and localStorage of the open session, None before the first page."""
+        if self.session is None:
+            return None
+        return await self.session.context.storage_state()
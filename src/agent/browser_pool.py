@@ -0,0 +1,167 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+from browser_use.browser.browser import (  # type: ignore
+    Browser,
+    BrowserConfig,
+    BrowserContextConfig,
+)
+from browser_use.browser.context import BrowserContext  # type: ignore
+
+from .browser_context import VidisBrowserContext
+
+
+class PooledBrowser:
+    """A warm Chromium instance and its usage counters."""
+
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.jobs = 0
+        self.active_contexts = 0
+        self.retired = False
+
+    def is_connected(self) -> bool:
+        playwright_browser = self.browser.playwright_browser
+        return playwright_browser is not None and playwright_browser.is_connected()
+
+    async def get_memory_mb(self) -> float:
+        """Resident memory of all Chromium processes of this browser."""
+        cdp_session = await self.browser.playwright_browser.new_browser_cdp_session()
+        try:
+            info = await cdp_session.send("SystemInfo.getProcessInfo")
+        finally:
+            await cdp_session.detach()
+
+        rss = 0
+        for process in info.get("processInfo", []):
+            try:
+                rss += psutil.Process(process["id"]).memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return rss / (1024 * 1024)
+
+
+class BrowserPool:
+    """
+    Process-wide pool of warm Chromium instances.
+
+    Every job gets a fresh, isolated BrowserContext on one of the pooled browsers
+    instead of launching its own browser. A browser is recycled after
+    max_jobs_per_browser jobs or when its memory exceeds max_memory_mb, as soon as
+    its last context has been released.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_jobs_per_browser: int = 20,
+        max_memory_mb: Optional[float] = 2048,
+        headless: bool = True,
+        disable_security: bool = True,
+    ):
+        self.size = size
+        self.max_jobs_per_browser = max_jobs_per_browser
+        self.max_memory_mb = max_memory_mb
+        self.browser_config = BrowserConfig(
+            headless=headless, disable_security=disable_security
+        )
+        self.browsers: List[PooledBrowser] = []
+        self.lock = asyncio.Lock()
+
+    async def _launch(self) -> PooledBrowser:
+        browser = Browser(config=self.browser_config)
+        await browser.get_playwright_browser()
+        return PooledBrowser(browser)
+
+    async def start(self) -> None:
+        """Launch the browsers up front so the first jobs don't pay the cold start."""
+        async with self.lock:
+            while len(self.browsers) < self.size:
+                self.browsers.append(await self._launch())
+
+    async def acquire(
+        self,
+        context_config: BrowserContextConfig,
+        storage_state: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[PooledBrowser, VidisBrowserContext]:
+        """Create an isolated context on the least busy browser."""
+        async with self.lock:
+            # Replace browsers that crashed
+            for pooled in list(self.browsers):
+                if not pooled.retired and not pooled.is_connected():
+                    print("Pooled browser disconnected, replacing it")
+                    pooled.retired = True
+                    await self._close_if_idle(pooled)
+
+            candidates = [pooled for pooled in self.browsers if not pooled.retired]
+            if len(candidates) < self.size:
+                pooled = await self._launch()
+                self.browsers.append(pooled)
+                candidates.append(pooled)
+
+            pooled = min(candidates, key=lambda candidate: candidate.active_contexts)
+            pooled.jobs += 1
+            pooled.active_contexts += 1
+
+        browser_context = VidisBrowserContext(
+            browser=pooled.browser, config=context_config, storage_state=storage_state
+        )
+        return pooled, browser_context
+
+    async def release(
+        self, pooled: PooledBrowser, browser_context: BrowserContext
+    ) -> None:
+        """Close the job's context and recycle the browser if it is used up."""
+        try:
+            await browser_context.close()
+        except Exception as e:
+            print(f"Failed to close browser context: {e}")
+
+        async with self.lock:
+            pooled.active_contexts -= 1
+
+            if pooled.jobs >= self.max_jobs_per_browser:
+                pooled.retired = True
+            elif self.max_memory_mb is not None and pooled.is_connected():
+                try:
+                    memory_mb = await pooled.get_memory_mb()
+                    if memory_mb > self.max_memory_mb:
+                        print(f"Pooled browser uses {memory_mb:.0f} MB, recycling it")
+                        pooled.retired = True
+                except Exception as e:
+                    print(f"Failed to get browser memory: {e}")
+
+            await self._close_if_idle(pooled)
+
+            # Keep the pool warm
+            while len([p for p in self.browsers if not p.retired]) < self.size:
+                self.browsers.append(await self._launch())
+
+    async def _close_if_idle(self, pooled: PooledBrowser) -> None:
+        if pooled.retired and pooled.active_contexts <= 0:
+            self.browsers.remove(pooled)
+            try:
+                await pooled.browser.close()
+            except Exception as e:
+                print(f"Failed to close pooled browser: {e}")
+
+    async def close(self) -> None:
+        async with self.lock:
+            for pooled in self.browsers:
+                try:
+                    await pooled.browser.close()
+                except Exception as e:
+                    print(f"Failed to close pooled browser: {e}")
+            self.browsers = []
+
+
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool(**kwargs) -> BrowserPool:
+    """Return the process-wide browser pool, creating it on first use."""
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool(**kwargs)
+    return _browser_pool
@@ -0,0 +1,208 @@
+import os
+import re
+from typing import List, Literal, Optional, Union
+from urllib.parse import urlparse
+
+from pydantic import BaseModel
+
+from src.models.models import NetworkResponse
+
+
+class CapturePolicy(BaseModel):
+    """Decides which response bodies are read from the browser and how much of them is kept."""
+
+    # Content types (prefix match on the mime type) whose bodies are captured
+    text_content_types: List[str] = [
+        "text/",
+        "application/json",
+        "application/ld+json",
+        "application/javascript",
+        "application/x-javascript",
+        "application/ecmascript",
+        "application/xml",
+        "application/xhtml+xml",
+        "application/x-www-form-urlencoded",
+    ]
+    # Playwright resource types that are never read, only their metadata is kept
+    metadata_only_resource_types: List[str] = ["image", "media", "font"]
+    # Maximum number of bytes kept per response body, None means unlimited
+    max_body_bytes: Optional[int] = 256 * 1024
+    # Resource types whose requests are recorded and then aborted or stubbed, e.g.
+    # media and font. Documents, scripts, XHR and fetch are never blocked
+    blocked_resource_types: List[str] = []
+    # Also block photos of the page's own host. Other images can be tracking pixels
+    block_first_party_images: bool = False
+    # "abort" fails blocked requests, "stub" answers them with an empty 204 response
+    block_action: Literal["abort", "stub"] = "abort"
+
+
+# Blocking these would change which trackers load
+NEVER_BLOCKED_RESOURCE_TYPES = {"document", "script", "xhr", "fetch", "eventsource"}
+PHOTO_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".avif", ".heic"}
+# File extensions by which requests of a blockable resource type are routed, see
+# get_block_route_pattern
+BLOCKABLE_EXTENSIONS = {
+    "media": {
+        ".mp4",
+        ".m4v",
+        ".m4s",
+        ".webm",
+        ".mov",
+        ".ogg",
+        ".ogv",
+        ".oga",
+        ".opus",
+        ".mp3",
+        ".m4a",
+        ".aac",
+        ".wav",
+        ".flac",
+        ".m3u8",
+        ".mpd",
+    },
+    "font": {".woff", ".woff2", ".ttf", ".otf", ".eot"},
+}
+
+
+def get_mime_type(content_type: Optional[str]) -> str:
+    """Strip parameters like the charset from a Content-Type header value."""
+    if not content_type:
+        return ""
+    return content_type.split(";")[0].strip().lower()
+
+
+def get_charset(content_type: Optional[str]) -> str:
+    if content_type:
+        for parameter in content_type.split(";")[1:]:
+            name, _, value = parameter.partition("=")
+            if name.strip().lower() == "charset" and value.strip():
+                return value.strip().strip('"')
+    return "utf-8"
+
+
+def should_capture_body(
+    policy: CapturePolicy, resource_type: str, content_type: Optional[str]
+) -> bool:
+    """Check whether the body of a response should be read according to the policy."""
+    if resource_type in policy.metadata_only_resource_types:
+        return False
+
+    mime_type = get_mime_type(content_type)
+    return any(mime_type.startswith(allowed) for allowed in policy.text_content_types)
+
+
+def should_block_request(
+    policy: CapturePolicy, resource_type: str, url: str, frame_url: Optional[str]
+) -> bool:
+    """
+    Check whether a request is blocked according to the policy.
+
+    Images are only blocked when they are photos from the host of the page
+    without a query string, as tracking pixels usually have one or come from
+    another host.
+    """
+    if resource_type in NEVER_BLOCKED_RESOURCE_TYPES:
+        return False
+    if resource_type == "image":
+        if not policy.block_first_party_images or not frame_url:
+            return False
+        parsed = urlparse(url)
+        return (
+            parsed.netloc.lower() == urlparse(frame_url).netloc.lower()
+            and not parsed.query
+            and os.path.splitext(parsed.path)[1].lower() in PHOTO_EXTENSIONS
+        )
+    return resource_type in policy.blocked_resource_types
+
+
+def _extension_pattern(extensions) -> str:
+    return "|".join(sorted(re.escape(extension[1:]) for extension in extensions))
+
+
+def get_block_route_pattern(policy: CapturePolicy) -> Union[str, "re.Pattern[str]"]:
+    """
+    URL pattern of the requests should_block_request may block.
+
+    Playwright matches regular expressions in the driver, so only these requests
+    are sent to the route handler in Python. The resource type of a request is not
+    known there, so media and fonts are recognized by their file extension and
+    first-party photos by theirs without a query string. Media without a known
+    extension, e.g. streams of video players, is not blocked. Other resource types
+    can't be told by their URL and need all requests to be routed.
+    """
+    alternatives = []
+    extensions = set()
+    for resource_type in policy.blocked_resource_types:
+        if resource_type in NEVER_BLOCKED_RESOURCE_TYPES or resource_type == "image":
+            continue
+        if resource_type not in BLOCKABLE_EXTENSIONS:
+            return "**/*"
+        extensions |= BLOCKABLE_EXTENSIONS[resource_type]
+    if extensions:
+        alternatives.append(
+            rf"^[^?#]*\.(?:{_extension_pattern(extensions)})(?:[?#].*)?$"
+        )
+    if policy.block_first_party_images:
+        alternatives.append(rf"^[^?#]*\.(?:{_extension_pattern(PHOTO_EXTENSIONS)})$")
+    if not alternatives:
+        return "**/*"
+    return re.compile("|".join(alternatives), re.IGNORECASE)
+
+
+def get_initiator(request) -> Optional[str]:
+    """URL of the frame that sent a Playwright request, None for service workers."""
+    try:
+        return request.frame.url
+    except Exception:
+        return None
+
+
+def decode_body(body: bytes, content_type: Optional[str]) -> str:
+    try:
+        return body.decode(get_charset(content_type), errors="replace")
+    except LookupError:
+        # Unknown charset in the header
+        return body.decode("utf-8", errors="replace")
+
+
+async def capture_response(response, policy: CapturePolicy) -> NetworkResponse:
+    """
+    Build a NetworkResponse from a Playwright response according to the capture policy.
+
+    Binary and non-allowed content types are recorded with metadata only (headers,
+    status, size). Captured bodies are cut at max_body_bytes and marked as truncated.
+    """
+    headers = response.headers
+    content_type = headers.get("content-type")
+    resource_type = response.request.resource_type
+
+    body_size = None
+    content_length = headers.get("content-length")
+    if content_length and content_length.isdigit():
+        body_size = int(content_length)
+
+    network_response = NetworkResponse(
+        url=response.url,
+        headers=headers,
+        status=response.status,
+        content_type=content_type,
+        body_size=body_size,
+    )
+
+    if not should_capture_body(policy, resource_type, content_type):
+        network_response.metadata_only = True
+        return network_response
+
+    try:
+        body = await response.body()
+    except Exception as e:
+        print(f"Failed to get response body: {e}")
+        return network_response
+
+    network_response.body_size = len(body)
+    if policy.max_body_bytes is not None and len(body) > policy.max_body_bytes:
+        body = body[: policy.max_body_bytes]
+        network_response.truncated = True
+
+    network_response.text = decode_body(body, content_type)
+    return network_response
@@ -0,0 +1,239 @@
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from browser_use import Agent, ActionResult  # type: ignore
+from browser_use.dom.clickable_element_processor.service import (  # type: ignore
+    ClickableElementProcessor,
+)
+from pydantic import BaseModel, ValidationError
+
+from .util import get_host
+
+DEFAULT_DECISION_CACHE_DIR = os.path.join("./agent_results", "decision_cache")
+DECISION_CACHE_STATS_FILENAME = "decision_cache_stats.json"
+
+# Attributes that identify what an element does, as opposed to styling or ids
+KEY_ATTRIBUTES = ["href", "type", "name", "role", "aria-label", "title", "value"]
+
+
+class CachedDecision(BaseModel):
+    # Serialized AgentOutput: current_state and actions
+    model_output: Dict[str, Any]
+    created_at: float
+    hits: int = 0
+
+
+class DecisionCacheFile(BaseModel):
+    decisions: Dict[str, CachedDecision] = {}
+
+
+class DecisionCacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    # Input tokens of the LLM calls that were answered from the cache
+    saved_input_tokens: int = 0
+
+
+def get_page_state_key(task: str, state, context: str = "") -> str:
+    """
+    Hash of the task, the page and its normalized interactive elements.
+
+    Cached actions refer to elements by index, so the index is part of every
+    element. Whitespace is collapsed and the "new element" marker that depends on
+    the previous step is left out.
+    """
+    lines = [task, context, get_host(state.url), state.url.split("?")[0]]
+    for element in ClickableElementProcessor.get_clickable_elements(state.element_tree):
+        text = " ".join(element.get_all_text_till_next_clickable_element().split())
+        attributes = ",".join(
+            f"{name}={element.attributes[name]}"
+            for name in KEY_ATTRIBUTES
+            if name in element.attributes
+        )
+        lines.append(
+            f"{element.highlight_index}|{element.tag_name}|{attributes}|{text}"
+        )
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+class DecisionCache:
+    """
+    Agent decisions of earlier runs of a site, keyed by get_page_state_key.
+
+    Stored as JSON at <root_dir>/<host>.json. The least recently created entries
+    are dropped beyond max_entries. Agents of the same site may run concurrently,
+    so save() merges this run's changes into the file under a lock instead of
+    replacing it.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        root_dir: str = DEFAULT_DECISION_CACHE_DIR,
+        max_entries: int = 1000,
+    ):
+        host = re.sub(r"[^a-z0-9.-]", "_", get_host(url))
+        self.path = os.path.join(root_dir, f"{host}.json")
+        self.max_entries = max_entries
+        self.stats = DecisionCacheStats()
+        self.decisions = self._load()
+        # Changes of this run, merged into the file on save
+        self.stored_keys: Set[str] = set()
+        self.evicted_keys: Set[str] = set()
+
+    def _load(self) -> Dict[str, CachedDecision]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return DecisionCacheFile.model_validate_json(f.read()).decisions
+        except Exception as e:
+            print(f"Failed to read decision cache: {e}")
+            return {}
+
+    def get(self, key: str) -> Optional[CachedDecision]:
+        return self.decisions.get(key)
+
+    def put(self, key: str, model_output: Dict[str, Any]) -> None:
+        self.decisions[key] = CachedDecision(
+            model_output=model_output, created_at=time.time()
+        )
+        self.stats.stores += 1
+        self.stored_keys.add(key)
+        self.evicted_keys.discard(key)
+        self._trim(self.decisions)
+
+    def _trim(self, decisions: Dict[str, CachedDecision]) -> None:
+        if len(decisions) > self.max_entries:
+            oldest = sorted(decisions, key=lambda k: decisions[k].created_at)
+            for old_key in oldest[: len(decisions) - self.max_entries]:
+                del decisions[old_key]
+
+    def evict(self, key: str) -> None:
+        if self.decisions.pop(key, None) is not None:
+            self.stats.evictions += 1
+            self.evicted_keys.add(key)
+            self.stored_keys.discard(key)
+
+    def _merge(self, decisions: Dict[str, CachedDecision]) -> None:
+        """Apply the changes of this run to the decisions read from the file."""
+        for key in self.evicted_keys:
+            decisions.pop(key, None)
+        for key, decision in self.decisions.items():
+            on_disk = decisions.get(key)
+            if key in self.stored_keys:
+                if on_disk is None or decision.created_at >= on_disk.created_at:
+                    decisions[key] = decision
+            # Loaded decisions missing on disk were evicted by another agent
+            elif on_disk is not None:
+                on_disk.hits = max(on_disk.hits, decision.hits)
+        self._trim(decisions)
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock_file:
+            # Other agents of the site wait until this merge is written
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            decisions = self._load()
+            self._merge(decisions)
+
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(DecisionCacheFile(decisions=decisions).model_dump_json())
+                os.replace(temp_path, self.path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        self.decisions = decisions
+        self.stored_keys.clear()
+        self.evicted_keys.clear()
+
+    def save_stats(self, output_dir: str) -> None:
+        with open(
+            os.path.join(output_dir, DECISION_CACHE_STATS_FILENAME),
+            "w",
+            encoding="utf-8",
+        ) as f:
+            f.write(self.stats.model_dump_json(indent=4))
+
+
+class CachingAgent(Agent):
+    """
+    Agent that reuses the actions of earlier runs when the page state matches.
+
+    A cached decision is served at most once per run, so the agent can't loop on
+    an unchanged page, and is evicted when one of its actions fails. Decisions
+    that finish the task are not cached. cache_context returns additional key
+    material, e.g. the progress of the task.
+    """
+
+    def __init__(
+        self,
+        *args,
+        decision_cache: DecisionCache,
+        cache_context: Optional[Callable[[], str]] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.decision_cache = decision_cache
+        self.cache_context = cache_context
+        self.served_keys: Set[str] = set()
+        self.last_key: Optional[str] = None
+
+    def _get_cache_key(self) -> Optional[str]:
+        session = self.browser_context.session
+        if session is None or session.cached_state is None:
+            return None
+        context = self.cache_context() if self.cache_context is not None else ""
+        return get_page_state_key(self.task, session.cached_state, context)
+
+    async def get_next_action(self, input_messages):
+        key = self._get_cache_key()
+        self.last_key = key
+
+        if key is not None and key not in self.served_keys:
+            cached = self.decision_cache.get(key)
+            if cached is not None:
+                try:
+                    model_output = self.AgentOutput.model_validate(cached.model_output)
+                except ValidationError:
+                    # Actions of the page changed, e.g. on the last step only done is allowed
+                    model_output = None
+                if model_output is not None:
+                    cached.hits += 1
+                    self.served_keys.add(key)
+                    self.decision_cache.stats.hits += 1
+                    self.decision_cache.stats.saved_input_tokens += (
+                        self._message_manager.state.history.current_tokens
+                    )
+                    return model_output
+
+        self.decision_cache.stats.misses += 1
+        model_output = await super().get_next_action(input_messages)
+
+        actions = [
+            action.model_dump(exclude_none=True) for action in model_output.action
+        ]
+        if key is not None and not any("done" in action for action in actions):
+            self.decision_cache.put(key, model_output.model_dump(exclude_none=True))
+            self.served_keys.add(key)
+        return model_output
+
+    async def multi_act(
+        self, actions, check_for_new_elements: bool = True
+    ) -> List[ActionResult]:
+        results = await super().multi_act(actions, check_for_new_elements)
+        if self.last_key is not None and any(result.error for result in results):
+            self.decision_cache.evict(self.last_key)
+        return results
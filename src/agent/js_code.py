@@ -20,6 +20,14 @@ SESSION_STORAGE_CODE = """
 }
 """.strip()
 
+SET_SESSION_STORAGE_CODE = """
+(entries) => {
+    for (const [key, value] of Object.entries(entries)) {
+        sessionStorage.setItem(key, value);
+    }
+}
+""".strip()
+
 RESOURCES_CODE = """
 () => {
     const resources = [];
@@ -44,3 +52,248 @@ RESOURCES_CODE = """
 SCROLL_TO_BOTTOM_CODE = """
 window.scrollTo(0, document.body.scrollHeight);
 """.strip()
+
+# Installed as init script in every document. Records storage writes and embedded
+# resources as they happen, so entries that are added and removed again within a
+# step are not lost. Batches are sent to the agent through the PROBE_BINDING
+# binding shortly after they are recorded and when the document is left, so
+# navigations within a step don't lose them. FLUSH_PROBE_CODE drains the rest of
+# the main frame at the end of a step.
+PROBE_BINDING = "__vidisProbeEmit"
+CAPTURE_PROBE_CODE = """
+(() => {
+    if (window.__vidisProbe) {
+        return;
+    }
+    const MAX_EVENTS = 2000;
+    const EMIT_DELAY_MS = 200;
+    const RESOURCE_SELECTOR = 'img, iframe, script, object, embed';
+    const probe = {
+        events: [],
+        elements: new Set(),
+        emitTimer: null,
+    };
+    window.__vidisProbe = probe;
+
+    // Hands the recorded events to the agent through the exposed binding, so they
+    // survive navigations. Without the binding they wait for FLUSH_PROBE_CODE.
+    probe.emit = () => {
+        clearTimeout(probe.emitTimer);
+        probe.emitTimer = null;
+        if (typeof window.__vidisProbeEmit !== 'function') {
+            return;
+        }
+        if (!probe.events.length && !probe.elements.size) {
+            return;
+        }
+        const batch = {
+            events: probe.events,
+            resources: Array.from(probe.elements).map(probe.describe).filter(resource => resource.url)
+        };
+        probe.events = [];
+        probe.elements = new Set();
+        window.__vidisProbeEmit(batch).catch(() => {});
+    };
+    probe.scheduleEmit = () => {
+        if (probe.emitTimer === null) {
+            probe.emitTimer = setTimeout(probe.emit, EMIT_DELAY_MS);
+        }
+    };
+    window.addEventListener('pagehide', () => probe.emit());
+
+    probe.push = (event) => {
+        if (probe.events.length < MAX_EVENTS) {
+            event.timestamp = Date.now() / 1000;
+            probe.events.push(event);
+            probe.scheduleEmit();
+        }
+    };
+
+    probe.storageName = (storage) => {
+        try {
+            return storage === window.localStorage ? 'local_storage' : 'session_storage';
+        } catch (e) {
+            return 'session_storage';
+        }
+    };
+
+    probe.describe = (el) => ({
+        type: el.tagName.toLowerCase(),
+        url: el.src || el.data,
+        width: el.width || null,
+        height: el.height || null,
+        id: el.id || null,
+        className: typeof el.className === 'string' ? (el.className || null) : null
+    });
+
+    probe.record = (el) => {
+        if (el.src || el.data) {
+            probe.elements.add(el);
+            probe.scheduleEmit();
+        }
+    };
+
+    // Storage hooks
+    const originalSetItem = Storage.prototype.setItem;
+    Storage.prototype.setItem = function (key, value) {
+        probe.push({ kind: 'storage_set', storage: probe.storageName(this), key: String(key), value: String(value) });
+        return originalSetItem.apply(this, arguments);
+    };
+    const originalRemoveItem = Storage.prototype.removeItem;
+    Storage.prototype.removeItem = function (key) {
+        probe.push({ kind: 'storage_remove', storage: probe.storageName(this), key: String(key) });
+        return originalRemoveItem.apply(this, arguments);
+    };
+    const originalClear = Storage.prototype.clear;
+    Storage.prototype.clear = function () {
+        probe.push({ kind: 'storage_clear', storage: probe.storageName(this) });
+        return originalClear.apply(this, arguments);
+    };
+
+    // Embedded resources, also the ones that are removed again before the step ends
+    new MutationObserver((mutations) => {
+        for (const mutation of mutations) {
+            if (mutation.type === 'attributes') {
+                if (mutation.target.matches(RESOURCE_SELECTOR)) {
+                    probe.record(mutation.target);
+                }
+                continue;
+            }
+            for (const node of mutation.addedNodes) {
+                if (node.nodeType !== Node.ELEMENT_NODE) {
+                    continue;
+                }
+                if (node.matches(RESOURCE_SELECTOR)) {
+                    probe.record(node);
+                }
+                node.querySelectorAll(RESOURCE_SELECTOR).forEach(probe.record);
+            }
+        }
+    }).observe(document, { childList: true, subtree: true, attributes: true, attributeFilter: ['src', 'data'] });
+
+    // Resources loaded without a DOM element, e.g. `new Image()` tracking pixels
+    try {
+        new PerformanceObserver((list) => {
+            for (const entry of list.getEntries()) {
+                probe.push({
+                    kind: 'resource_loaded',
+                    url: entry.name,
+                    initiator_type: entry.initiatorType,
+                    transfer_size: entry.transferSize,
+                    duration: entry.duration
+                });
+            }
+        }).observe({ type: 'resource', buffered: true });
+    } catch (e) {
+        // PerformanceObserver not available
+    }
+})();
+""".strip()
+
+FLUSH_PROBE_CODE = """
+() => {
+    const probe = window.__vidisProbe;
+    if (!probe) {
+        return null;
+    }
+    const readStorage = (getStorage) => {
+        const items = {};
+        try {
+            const storage = getStorage();
+            for (let i = 0; i < storage.length; i++) {
+                const key = storage.key(i);
+                items[key] = storage.getItem(key);
+            }
+        } catch (e) {
+            // Storage is not accessible on opaque origins
+        }
+        return items;
+    };
+
+    document.querySelectorAll('img, iframe, script, object, embed').forEach(probe.record);
+    clearTimeout(probe.emitTimer);
+    probe.emitTimer = null;
+    const result = {
+        local_storage: readStorage(() => window.localStorage),
+        session_storage: readStorage(() => window.sessionStorage),
+        resources: Array.from(probe.elements).map(probe.describe).filter(resource => resource.url),
+        events: probe.events
+    };
+    probe.events = [];
+    probe.elements = new Set();
+    return result;
+}
+""".strip()
+
+LEGAL_LINKS_CODE = """
+() => {
+    const footerSelector = 'footer, [role="contentinfo"], [id*="footer" i], [class*="footer" i]';
+    return Array.from(document.querySelectorAll('a[href]')).map(a => ({
+        href: a.href,
+        text: (a.innerText || a.textContent || a.getAttribute('aria-label') || a.title || '').trim(),
+        in_footer: a.closest(footerSelector) !== null,
+    }));
+}
+""".strip()
+
+LEGAL_PAGE_CONTENT_CODE = """
+() => {
+    const clone = document.documentElement.cloneNode(true);
+    clone.querySelectorAll(
+        'script, style, noscript, iframe, object, embed, svg, canvas, template, link, meta'
+    ).forEach(el => el.remove());
+    clone.querySelectorAll('*').forEach(el => {
+        for (const attr of Array.from(el.attributes)) {
+            const name = attr.name.toLowerCase();
+            const value = attr.value.trim().toLowerCase();
+            if (name.startsWith('on') || name === 'style' || value.startsWith('javascript:')) {
+                el.removeAttribute(attr.name);
+            }
+        }
+    });
+    const walker = document.createTreeWalker(clone, NodeFilter.SHOW_COMMENT);
+    const comments = [];
+    while (walker.nextNode()) {
+        comments.push(walker.currentNode);
+    }
+    comments.forEach(comment => comment.remove());
+    const head = clone.querySelector('head');
+    if (head) {
+        const meta = document.createElement('meta');
+        meta.setAttribute('charset', 'utf-8');
+        head.prepend(meta);
+    }
+    return {
+        text: document.body ? document.body.innerText : '',
+        html: '<!DOCTYPE html>\\n' + clone.outerHTML,
+    };
+}
+""".strip()
+
+# Milliseconds since the last structural DOM change in the viewport. Installs the
+# observer on first call.
+DOM_QUIET_CODE = """
+() => {
+    if (window.__vidisLastMutation === undefined) {
+        window.__vidisLastMutation = performance.now();
+        // Text changes (clocks, tickers) and elements outside the viewport
+        // (carousel slides) don't count, they never stop on some pages
+        const isVisible = (node) => {
+            const element = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement;
+            if (!element || !element.isConnected) {
+                return false;
+            }
+            const rect = element.getBoundingClientRect();
+            return rect.width > 0 && rect.height > 0
+                && rect.bottom > 0 && rect.right > 0
+                && rect.top < window.innerHeight && rect.left < window.innerWidth;
+        };
+        new MutationObserver((records) => {
+            if (records.some((record) => isVisible(record.target))) {
+                window.__vidisLastMutation = performance.now();
+            }
+        }).observe(document, { childList: true, subtree: true });
+    }
+    return performance.now() - window.__vidisLastMutation;
+}
+""".strip()
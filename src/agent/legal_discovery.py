@@ -0,0 +1,159 @@
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlparse
+
+from playwright.async_api import Page
+
+from .js_code import LEGAL_LINKS_CODE
+
+# German and English link texts and URL slugs of the legal pages, after normalize()
+LEGAL_PAGE_PATTERNS: Dict[str, List[str]] = {
+    "privacy_policy": [r"datenschutz", r"privacy", r"data protection"],
+    "imprint": [r"impressum", r"imprint", r"legal notice", r"anbieterkennzeichnung"],
+    "terms_of_use": [
+        r"\bagb\b",
+        r"nutzungsbedingungen",
+        r"nutzungsvereinbarung",
+        r"geschaeftsbedingungen",
+        r"\bterms\b",
+        r"\btos\b",
+    ],
+}
+
+# Cookie consent settings are often labeled like the privacy policy
+EXCLUDE_PATTERN = re.compile(r"einstellung|setting|preference|consent|verwalten|manage")
+
+MAX_SITEMAPS = 5
+MAX_LINK_TEXT_LENGTH = 60
+
+
+def normalize(text: str) -> str:
+    text = text.casefold()
+    for umlaut, replacement in (("ä", "ae"), ("ö", "oe"), ("ü", "ue"), ("ß", "ss")):
+        text = text.replace(umlaut, replacement)
+    return " ".join(re.split(r"[\s_\-/.]+", text))
+
+
+def match_legal_page_type(text: str) -> Optional[str]:
+    """Return the legal page type a link text or URL path refers to, if any."""
+    text = normalize(text)
+    if not text or EXCLUDE_PATTERN.search(text):
+        return None
+    for page_type, patterns in LEGAL_PAGE_PATTERNS.items():
+        if any(re.search(pattern, text) for pattern in patterns):
+            return page_type
+    return None
+
+
+def _is_page_link(url: str) -> bool:
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and not parsed.path.lower().endswith(
+        (".pdf", ".zip", ".doc", ".docx")
+    )
+
+
+def rank_links(links: List[Dict]) -> Dict[str, str]:
+    """
+    Pick the most likely link per legal page type.
+
+    Link texts in the footer win over link texts elsewhere, which win over URL
+    slugs. Within the same rank the first link on the page wins.
+    """
+    best: Dict[str, Tuple[int, str]] = {}
+    for link in links:
+        url = link["href"].split("#")[0]
+        if not _is_page_link(url):
+            continue
+
+        text = link["text"][:MAX_LINK_TEXT_LENGTH]
+        page_type = match_legal_page_type(text)
+        if page_type is not None:
+            score = 3 if link["in_footer"] else 2
+        else:
+            page_type = match_legal_page_type(unquote(urlparse(url).path))
+            score = 1
+        if page_type is None:
+            continue
+
+        if page_type not in best or best[page_type][0] < score:
+            best[page_type] = (score, url)
+    return {page_type: url for page_type, (_, url) in best.items()}
+
+
+async def _fetch_text(page: Page, url: str) -> Optional[str]:
+    try:
+        response = await page.context.request.get(url, timeout=10000)
+        if not response.ok:
+            return None
+        return await response.text()
+    except Exception as e:
+        print(f"Failed to fetch {url}: {e}")
+        return None
+
+
+def _parse_sitemap(text: str) -> Tuple[List[str], List[str]]:
+    """Return the page URLs and the nested sitemap URLs of a sitemap."""
+    try:
+        root = ET.fromstring(text.strip())
+    except ET.ParseError:
+        return [], []
+
+    locations = [
+        element.text.strip()
+        for element in root.iter()
+        if element.tag.endswith("loc") and element.text
+    ]
+    if root.tag.endswith("sitemapindex"):
+        return [], locations
+    return locations, []
+
+
+async def find_sitemap_links(page: Page, start_url: str) -> Dict[str, str]:
+    """Match the URLs of the site's sitemaps, listed in robots.txt or at /sitemap.xml."""
+    parsed = urlparse(start_url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+
+    pending = [urljoin(origin, "/sitemap.xml")]
+    robots = await _fetch_text(page, urljoin(origin, "/robots.txt"))
+    if robots:
+        for line in robots.splitlines():
+            if line.lower().startswith("sitemap:"):
+                pending.insert(0, line.split(":", 1)[1].strip())
+
+    links: List[Dict] = []
+    fetched = set()
+    while pending and len(fetched) < MAX_SITEMAPS:
+        sitemap_url = pending.pop(0)
+        if sitemap_url in fetched:
+            continue
+        fetched.add(sitemap_url)
+
+        text = await _fetch_text(page, sitemap_url)
+        if not text:
+            continue
+        urls, sitemaps = _parse_sitemap(text)
+        pending.extend(sitemaps)
+        links.extend({"href": url, "text": "", "in_footer": False} for url in urls)
+
+    # Shorter paths are more likely the legal page itself than a subpage of it
+    links.sort(key=lambda link: len(urlparse(link["href"]).path))
+    return rank_links(links)
+
+
+async def discover_legal_pages(page: Page, start_url: str) -> Dict[str, str]:
+    """
+    Find the legal pages of a site without the LLM.
+
+    The anchors of the start page are matched first, the sitemap is only fetched
+    for page types that are still missing.
+    """
+    await page.goto(start_url, wait_until="domcontentloaded")
+    links = await page.evaluate(LEGAL_LINKS_CODE)
+    found = rank_links(links)
+
+    if len(found) < len(LEGAL_PAGE_PATTERNS):
+        sitemap_links = await find_sitemap_links(page, page.url)
+        for page_type, url in sitemap_links.items():
+            found.setdefault(page_type, url)
+    return found
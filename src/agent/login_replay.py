@@ -0,0 +1,274 @@
+import asyncio
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, List, Literal, Optional
+from urllib.parse import urlparse
+
+from pydantic import BaseModel
+
+from .session_cache import (
+    get_site_cookie_names,
+    is_login_url,
+    is_password_input,
+    is_site_url,
+)
+from .util import get_host
+
+DEFAULT_LOGIN_FLOW_DIR = os.path.join("./agent_results", "login_flows")
+
+SECRET_PATTERN = re.compile(r"<secret>(.*?)</secret>")
+
+
+class LoginFlowAction(BaseModel):
+    name: Literal["go_to_url", "click", "input_text", "select_option", "send_keys"]
+    # Page the action was recorded on
+    page_url: str
+    css_selector: Optional[str] = None
+    xpath: Optional[str] = None
+    # Credentials are kept as <secret>PLACEHOLDER</secret>
+    text: Optional[str] = None
+    url: Optional[str] = None
+
+
+class LoginFlow(BaseModel):
+    host: str
+    initial_url: str
+    post_login_url: str
+    actions: List[LoginFlowAction]
+    # Cookies of the site set by the login, a replay succeeded once they are there
+    login_cookies: List[str] = []
+    recorded_at: float
+
+
+def is_same_page(url: str, other_url: str) -> bool:
+    """Compare host and path, query and fragment usually hold per-login state."""
+    parsed, other = urlparse(url), urlparse(other_url)
+    same_host = parsed.netloc.lower() == other.netloc.lower()
+    return same_host and parsed.path.rstrip("/") == other.path.rstrip("/")
+
+
+def _to_placeholders(text: str, sensitive_data: Dict[str, str]) -> str:
+    """Replace credentials the LLM typed in plain text with their placeholders."""
+    for placeholder, value in sensitive_data.items():
+        if value:
+            text = text.replace(value, f"<secret>{placeholder}</secret>")
+    return text
+
+
+def _from_placeholders(text: str, sensitive_data: Dict[str, str]) -> str:
+    return SECRET_PATTERN.sub(
+        lambda match: sensitive_data.get(match.group(1), match.group(0)), text
+    )
+
+
+def extract_login_flow(
+    history_data: List[Dict[str, Any]],
+    initial_url: str,
+    sensitive_data: Dict[str, str],
+    login_cookies: List[str],
+) -> Optional[LoginFlow]:
+    """
+    Extract the login action sequence from the history of an agent run.
+
+    The login ends at the first page of the site that is not a login page after the
+    password was typed. Only actions that succeeded are recorded. Returns None if
+    the password was never typed or the run never got back to the site.
+    """
+    site_host = get_host(initial_url)
+    password_submitted = False
+    actions: List[LoginFlowAction] = []
+
+    for entry in history_data:
+        state = entry.get("state") or {}
+        page_url = state.get("url") or ""
+        if not page_url:
+            continue
+
+        if (
+            password_submitted
+            and is_site_url(page_url, site_host)
+            and not is_login_url(page_url)
+        ):
+            return LoginFlow(
+                host=site_host,
+                initial_url=initial_url,
+                post_login_url=page_url,
+                actions=actions,
+                login_cookies=login_cookies,
+                recorded_at=time.time(),
+            )
+
+        model_output = entry.get("model_output") or {}
+        results = entry.get("result") or []
+        elements = state.get("interacted_element") or []
+        for i, action in enumerate(model_output.get("action") or []):
+            # Actions after a page change are not executed and have no result
+            if i >= len(results) or results[i].get("error"):
+                break
+
+            element = elements[i] if i < len(elements) else None
+            recorded = _record_action(action, element, page_url, sensitive_data)
+            if recorded is not None:
+                actions.append(recorded)
+                if is_password_input(action, sensitive_data):
+                    password_submitted = True
+
+    return None
+
+
+def _record_action(
+    action: Dict[str, Any],
+    element: Optional[Dict[str, Any]],
+    page_url: str,
+    sensitive_data: Dict[str, str],
+) -> Optional[LoginFlowAction]:
+    name, params = next(iter(action.items()))
+    params = params or {}
+    selectors = {}
+    if element is not None:
+        selectors = {
+            "css_selector": element.get("css_selector"),
+            "xpath": element.get("xpath"),
+        }
+
+    if name == "go_to_url":
+        return LoginFlowAction(name="go_to_url", page_url=page_url, url=params["url"])
+    elif name == "send_keys":
+        return LoginFlowAction(name="send_keys", page_url=page_url, text=params["keys"])
+    elif element is None:
+        # Scrolling, waiting, custom actions and done don't change the login state
+        return None
+    elif name == "click_element_by_index":
+        return LoginFlowAction(name="click", page_url=page_url, **selectors)
+    elif name == "input_text":
+        return LoginFlowAction(
+            name="input_text",
+            page_url=page_url,
+            text=_to_placeholders(params["text"], sensitive_data),
+            **selectors,
+        )
+    elif name == "select_dropdown_option":
+        return LoginFlowAction(
+            name="select_option", page_url=page_url, text=params["text"], **selectors
+        )
+    return None
+
+
+class LoginFlowStore:
+    """Recorded login flows per site, stored as JSON at <root_dir>/<host>.json."""
+
+    def __init__(self, root_dir: str = DEFAULT_LOGIN_FLOW_DIR):
+        self.root_dir = root_dir
+
+    def path(self, url: str) -> str:
+        host = re.sub(r"[^a-z0-9.-]", "_", get_host(url))
+        return os.path.join(self.root_dir, f"{host}.json")
+
+    def get(self, url: str) -> Optional[LoginFlow]:
+        path = self.path(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return LoginFlow.model_validate_json(f.read())
+        except Exception as e:
+            print(f"Failed to read login flow: {e}")
+            return None
+
+    def put(self, url: str, flow: LoginFlow) -> None:
+        os.makedirs(self.root_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.root_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(flow.model_dump_json(indent=2))
+            os.replace(temp_path, self.path(url))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class LoginReplayer:
+    """
+    Replays a recorded login flow with Playwright, without the LLM.
+
+    The replay diverges when a page is not the one the action was recorded on, or
+    an element cannot be found within timeout_ms.
+    """
+
+    def __init__(self, page, sensitive_data: Dict[str, str], timeout_ms: float = 10000):
+        self.page = page
+        self.sensitive_data = sensitive_data
+        self.timeout_ms = timeout_ms
+
+    def _locator(self, action: LoginFlowAction):
+        if action.css_selector:
+            return self.page.locator(action.css_selector).first
+        return self.page.locator(f"xpath=/{action.xpath.lstrip('/')}").first
+
+    async def _run_action(self, action: LoginFlowAction) -> None:
+        await self.page.wait_for_url(
+            lambda url: is_same_page(url, action.page_url), timeout=self.timeout_ms
+        )
+
+        if action.name == "go_to_url":
+            await self.page.goto(action.url, wait_until="domcontentloaded")
+        elif action.name == "send_keys":
+            await self.page.keyboard.press(action.text)
+        elif action.name == "click":
+            await self._locator(action).click(timeout=self.timeout_ms)
+        elif action.name == "input_text":
+            await self._locator(action).fill(
+                _from_placeholders(action.text, self.sensitive_data),
+                timeout=self.timeout_ms,
+            )
+        elif action.name == "select_option":
+            await self._locator(action).select_option(
+                label=action.text, timeout=self.timeout_ms
+            )
+
+    async def replay(self, flow: LoginFlow, initial_url: str) -> bool:
+        """
+        Run the flow from initial_url. Returns whether the login succeeded.
+
+        Getting back to the site is not enough, a failed login may redirect back with
+        an error. The cookies the recorded login set must be there as well.
+        """
+        if not flow.login_cookies:
+            print("Login flow has no login cookies to check the replay with")
+            return False
+
+        started_at = time.time()
+        try:
+            await self.page.goto(initial_url, wait_until="domcontentloaded")
+            for i, action in enumerate(flow.actions):
+                try:
+                    await self._run_action(action)
+                except Exception as e:
+                    print(f"Login replay diverged at action {i} ({action.name}): {e}")
+                    return False
+
+            await self.page.wait_for_url(
+                lambda url: is_site_url(url, flow.host) and not is_login_url(url),
+                timeout=self.timeout_ms,
+            )
+        except Exception as e:
+            print(f"Login replay did not reach the site: {e}")
+            return False
+
+        # Let the site settle its session before the agent takes over
+        await asyncio.sleep(1)
+        cookie_names = get_site_cookie_names(
+            await self.page.context.cookies(), flow.host
+        )
+        missing = set(flow.login_cookies) - cookie_names
+        if missing:
+            print(f"Login replay did not log in, missing cookies: {sorted(missing)}")
+            return False
+        print(
+            f"Replayed login of {flow.host} with {len(flow.actions)} actions "
+            f"in {time.time() - started_at:.1f}s"
+        )
+        return True
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import re
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from browser_use.browser.context import BrowserContextConfig  # type: ignore
+from pydantic import BaseModel
+
+from .js_code import DOM_QUIET_CODE
+from .util import get_host
+
+DEFAULT_PAGE_WAIT_STATS_DIR = os.path.join("./agent_results", "page_wait_stats")
+PAGE_WAITS_FILENAME = "page_waits.jsonl"
+
+# Settle times kept per host
+MAX_SAMPLES = 50
+# Requests that take longer are long polling, streams or beacons, not page load
+LONG_REQUEST_SECONDS = 5.0
+IGNORED_RESOURCE_TYPES = {"websocket", "eventsource", "media", "manifest", "ping"}
+
+
+class VidisBrowserContextConfig(BrowserContextConfig):
+    """
+    BrowserContextConfig with an adaptive page wait.
+
+    With adaptive_wait the fixed minimum and maximum page load times are replaced:
+    a page is settled once there was no network activity for network_quiet_time
+    and no DOM change for dom_quiet_time, or the network was quiet for
+    dom_quiet_max_wait while the DOM kept changing (carousels, tickers, spinners).
+    The deadline is learned per host from
+    earlier settle times, between adaptive_min_deadline and
+    maximum_wait_page_load_time, which is also the deadline for unknown hosts.
+    """
+
+    adaptive_wait: bool = False
+    network_quiet_time: float = 0.5
+    dom_quiet_time: float = 0.5
+    dom_quiet_max_wait: float = 2.0
+    adaptive_min_deadline: float = 3.0
+    page_wait_stats_dir: str = DEFAULT_PAGE_WAIT_STATS_DIR
+
+
+class PageWait(BaseModel):
+    url: str
+    seconds: float
+    deadline: float
+    network_quiet: bool
+    dom_quiet: bool
+    # Quiet network and DOM, or a DOM that didn't settle within dom_quiet_max_wait
+    settled: bool = False
+    pending_requests: int
+    # Number of steps the agent had taken, set when the wait is logged
+    step: Optional[int] = None
+
+
+class HostLatencyStats(BaseModel):
+    host: str
+    # Most recent settle times in seconds
+    samples: List[float] = []
+
+    def add(self, seconds: float) -> None:
+        self.samples = (self.samples + [round(seconds, 3)])[-MAX_SAMPLES:]
+
+    def get_deadline(self, min_deadline: float, max_deadline: float) -> float:
+        """Three times the 90th percentile settle time, the maximum for new hosts."""
+        if not self.samples:
+            return max_deadline
+        samples = sorted(self.samples)
+        p90 = samples[int(0.9 * (len(samples) - 1))]
+        return min(max_deadline, max(min_deadline, 3 * p90))
+
+
+class LatencyStore:
+    """Settle times per host across runs, stored as JSON at <root_dir>/<host>.json."""
+
+    def __init__(self, root_dir: str = DEFAULT_PAGE_WAIT_STATS_DIR):
+        self.root_dir = root_dir
+        self.stats: Dict[str, HostLatencyStats] = {}
+
+    def path(self, host: str) -> str:
+        return os.path.join(self.root_dir, f"{re.sub(r'[^a-z0-9.-]', '_', host)}.json")
+
+    def get(self, host: str) -> HostLatencyStats:
+        if host not in self.stats:
+            stats = HostLatencyStats(host=host)
+            path = self.path(host)
+            if os.path.exists(path):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        stats = HostLatencyStats.model_validate_json(f.read())
+                except Exception as e:
+                    print(f"Failed to read page wait stats: {e}")
+            self.stats[host] = stats
+        return self.stats[host]
+
+    def put(self, stats: HostLatencyStats) -> None:
+        os.makedirs(self.root_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.root_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(stats.model_dump_json())
+            os.replace(temp_path, self.path(stats.host))
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+async def wait_for_quiet_page(
+    page,
+    deadline: float,
+    network_quiet_time: float,
+    dom_quiet_time: float,
+    dom_quiet_max_wait: float,
+) -> PageWait:
+    """
+    Wait until network and DOM of the page are quiet, at most deadline seconds.
+
+    Some pages change their DOM all the time, once the network is quiet the DOM
+    gets dom_quiet_max_wait seconds to settle.
+    """
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    last_activity = started_at
+    # Request -> start time
+    pending: Dict[object, float] = {}
+
+    def on_request(request) -> None:
+        nonlocal last_activity
+        if request.resource_type in IGNORED_RESOURCE_TYPES:
+            return
+        if request.url.startswith(("data:", "blob:")):
+            return
+        pending[request] = last_activity = loop.time()
+
+    def on_request_done(request) -> None:
+        nonlocal last_activity
+        if pending.pop(request, None) is not None:
+            last_activity = loop.time()
+
+    page.on("request", on_request)
+    page.on("requestfinished", on_request_done)
+    page.on("requestfailed", on_request_done)
+
+    network_quiet = dom_quiet = settled = False
+    network_quiet_since: Optional[float] = None
+    active_requests = 0
+    try:
+        while True:
+            await asyncio.sleep(0.1)
+            now = loop.time()
+            active_requests = sum(
+                1 for start in pending.values() if now - start < LONG_REQUEST_SECONDS
+            )
+            network_quiet = (
+                active_requests == 0 and now - last_activity >= network_quiet_time
+            )
+            if not network_quiet:
+                network_quiet_since = None
+            else:
+                if network_quiet_since is None:
+                    network_quiet_since = now
+                try:
+                    since_mutation = await page.evaluate(DOM_QUIET_CODE) / 1000
+                except Exception:
+                    # The document is being replaced
+                    since_mutation = 0.0
+                dom_quiet = since_mutation >= dom_quiet_time
+                if dom_quiet or now - network_quiet_since >= dom_quiet_max_wait:
+                    settled = True
+                    break
+            if now - started_at >= deadline:
+                break
+    finally:
+        page.remove_listener("request", on_request)
+        page.remove_listener("requestfinished", on_request_done)
+        page.remove_listener("requestfailed", on_request_done)
+
+    return PageWait(
+        url=page.url,
+        seconds=round(loop.time() - started_at, 3),
+        deadline=round(deadline, 3),
+        network_quiet=network_quiet,
+        dom_quiet=dom_quiet,
+        settled=settled,
+        pending_requests=active_requests,
+    )
+
+
+class AdaptivePageWaiter:
+    """Adaptive page waits of one browser context, see VidisBrowserContextConfig."""
+
+    def __init__(self, config: VidisBrowserContextConfig):
+        self.config = config
+        self.latency_store = LatencyStore(config.page_wait_stats_dir)
+        # Waits since the last drain
+        self.page_waits: List[PageWait] = []
+
+    async def wait(self, page, minimum_seconds: Optional[float] = None) -> PageWait:
+        started_at = time.time()
+        stats = self.latency_store.get(get_host(page.url))
+        deadline = stats.get_deadline(
+            self.config.adaptive_min_deadline,
+            self.config.maximum_wait_page_load_time,
+        )
+        page_wait = await wait_for_quiet_page(
+            page,
+            deadline,
+            self.config.network_quiet_time,
+            self.config.dom_quiet_time,
+            self.config.dom_quiet_max_wait,
+        )
+
+        remaining = (minimum_seconds or 0) - (time.time() - started_at)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+        # Learned for the host the page ended up on. A wait that hit the deadline
+        # only says the page takes at least that long and would raise the deadline
+        # of hosts that never settle with every wait
+        if page_wait.settled:
+            stats = self.latency_store.get(get_host(page_wait.url))
+            stats.add(page_wait.seconds)
+            try:
+                self.latency_store.put(stats)
+            except Exception as e:
+                print(f"Failed to save page wait stats: {e}")
+        self.page_waits.append(page_wait)
+        return page_wait
+
+    def drain(self) -> List[PageWait]:
+        page_waits, self.page_waits = self.page_waits, []
+        return page_waits
@@ -0,0 +1,222 @@
+import asyncio
+import os
+import shutil
+from typing import List, Optional
+
+from browser_use.browser.browser import BrowserContextConfig  # type: ignore
+
+from src.classification.util import find_step_result_file, read_step_result_file
+from src.files.snapshot_delta import merge_step_results
+from src.files.step_writer import StepResultWriter
+from src.models.models import StepResult
+
+from .agent import (
+    AGENT_OUTPUT_DIR,
+    COOKIE_BANNER_JPG_FILENAME,
+    COOKIE_BANNER_JSON_FILENAME,
+    VidisAgent,
+)
+from .browser_pool import BrowserPool
+from .login_replay import LoginFlowStore
+from .session_cache import CachedSession, SessionCache, restore_session
+from .tasks import PERSONAS, get_persona_task_prompt, get_task_prompt, login_task_prompt
+
+LOGIN_PERSONA = "login"
+# Persona of the last step of the merged step log, see merge_persona_results
+MERGED_PERSONA = "merged"
+
+# Files the classification expects at the top level of the run directory
+SHARED_FILENAMES = [
+    f"{page_type}.{extension}"
+    for page_type in ["privacy_policy", "imprint", "terms_of_use"]
+    for extension in ["pdf", "txt", "html"]
+] + [
+    COOKIE_BANNER_JPG_FILENAME,
+    COOKIE_BANNER_JSON_FILENAME,
+]
+
+
+async def run_personas(
+    initial_url: str,
+    output_name: str,
+    username: str,
+    password: str,
+    personas: List[str] = PERSONAS,
+    max_steps: int = 25,
+    login_max_steps: int = 15,
+    headless: bool = True,
+    browser_pool: Optional[BrowserPool] = None,
+    session_cache: Optional[SessionCache] = None,
+    login_flow_store: Optional[LoginFlowStore] = None,
+    legal_prepass: bool = False,
+    **agent_kwargs,
+) -> None:
+    """
+    Log in once, then let the personas explore the website concurrently.
+
+    Every persona runs in its own browser context, seeded with the storage_state and
+    the sessionStorage of the login tab (storage_state has none), and writes to agent_results/<output_name>/<persona>. Afterwards the
+    results are merged into agent_results/<output_name> and zipped. With a session
+    cache, a still valid session of an earlier run replaces the login, with a login
+    flow store the login is replayed without the LLM if possible. Remaining
+    keyword arguments are passed to every VidisAgent.
+    """
+    # Without a pool all contexts share one browser
+    own_pool = browser_pool is None
+    if own_pool:
+        browser_pool = BrowserPool(size=1, headless=headless)
+        await browser_pool.start()
+
+    login_agent: Optional[VidisAgent] = None
+    persona_agents: List[VidisAgent] = []
+    try:
+        session: Optional[CachedSession] = None
+        if session_cache is not None:
+            pooled, browser_context = await browser_pool.acquire(BrowserContextConfig())
+            try:
+                session = await restore_session(
+                    session_cache, pooled.browser, initial_url, username
+                )
+            finally:
+                await browser_pool.release(pooled, browser_context)
+
+        if session is not None:
+            storage_state = session.storage_state
+            session_storage = session.session_storage
+            start_url = session.post_login_url
+        else:
+            login_agent = VidisAgent(
+                task_prompt=login_task_prompt,
+                initial_url=initial_url,
+                output_name=os.path.join(output_name, LOGIN_PERSONA),
+                username=username,
+                password=password,
+                headless=headless,
+                browser_pool=browser_pool,
+                persona=LOGIN_PERSONA,
+                session_cache=session_cache,
+                login_flow_store=login_flow_store,
+                logged_in_task_prompt=get_task_prompt("login", logged_in=True),
+                **agent_kwargs,
+            )
+            await login_agent.run_task(max_steps=login_max_steps, create_zip=False)
+            if login_agent.final_storage_state is None:
+                print("Login session could not be saved, personas start logged out")
+            storage_state = login_agent.final_storage_state
+            session_storage = login_agent.final_session_storage
+            start_url = (
+                login_agent.post_login_url or login_agent.final_url or initial_url
+            )
+
+        persona_agents = [
+            VidisAgent(
+                task_prompt=get_persona_task_prompt(persona),
+                initial_url=start_url,
+                output_name=os.path.join(output_name, persona),
+                username=username,
+                password=password,
+                headless=headless,
+                browser_pool=browser_pool,
+                storage_state=storage_state,
+                session_storage=session_storage,
+                persona=persona,
+                legal_prepass=legal_prepass and persona == "legal",
+                **agent_kwargs,
+            )
+            for persona in personas
+        ]
+        results = await asyncio.gather(
+            *(
+                agent.run_task(max_steps=max_steps, create_zip=False)
+                for agent in persona_agents
+            ),
+            return_exceptions=True,
+        )
+        for persona, result in zip(personas, results):
+            if isinstance(result, Exception):
+                print(f"Persona {persona} failed: {result}")
+    finally:
+        if own_pool:
+            await browser_pool.close()
+
+    await merge_persona_results(
+        output_name,
+        [LOGIN_PERSONA] + personas,
+        agent_kwargs.get("step_log_format", "jsonl"),
+    )
+
+    agents = persona_agents if login_agent is None else [login_agent] + persona_agents
+    blob_digests = set()
+    for agent in agents:
+        blob_digests |= agent.blob_digests
+    await asyncio.to_thread(
+        agents[0].create_zip_archive, output_name, blob_digests=blob_digests
+    )
+
+
+def copy_persona_files(persona_dir: str, persona: str) -> None:
+    """Copy the shared files (first persona wins) and the prefixed screenshots."""
+    output_dir = os.path.dirname(persona_dir)
+    for filename in SHARED_FILENAMES:
+        source = os.path.join(persona_dir, filename)
+        target = os.path.join(output_dir, filename)
+        if os.path.exists(source) and not os.path.exists(target):
+            shutil.copy2(source, target)
+
+    persona_images_dir = os.path.join(persona_dir, "images")
+    if os.path.isdir(persona_images_dir):
+        for image_name in sorted(os.listdir(persona_images_dir)):
+            shutil.copy2(
+                os.path.join(persona_images_dir, image_name),
+                os.path.join(output_dir, "images", f"{persona}_{image_name}"),
+            )
+
+
+async def merge_persona_results(
+    output_name: str, personas: List[str], step_log_format: str = "jsonl"
+) -> None:
+    """
+    Merge the persona subdirectories into the run directory.
+
+    The run directory gets one step log with the steps of all personas in order,
+    tagged with their persona, the saved legal pages and cookie banner (first
+    persona wins) and the screenshots prefixed with the persona.
+
+    Every persona has its own cookie jar and storage, so the step log ends with a
+    step tagged "merged" that unions the last step of every persona. The
+    classification, which reads the last step, sees what all contexts collected.
+    """
+    output_dir = os.path.join(AGENT_OUTPUT_DIR, output_name)
+    images_dir = os.path.join(output_dir, "images")
+    os.makedirs(images_dir, exist_ok=True)
+
+    # Deltas only chain within one persona, so the merged log holds full snapshots
+    step_writer = StepResultWriter(output_dir, step_log_format)
+    step_writer.start()
+    last_steps: List[StepResult] = []
+    try:
+        for persona in personas:
+            persona_dir = os.path.join(output_dir, persona)
+            if not os.path.isdir(persona_dir):
+                continue
+
+            try:
+                # Reading and copying block, run them off the event loop
+                step_results = await asyncio.to_thread(
+                    read_step_result_file, find_step_result_file(persona_dir)
+                )
+            except Exception as e:
+                print(f"Failed to read step results of persona {persona}: {e}")
+                step_results = []
+            for step_result in step_results:
+                step_result.persona = persona
+                step_writer.write(step_result)
+            if step_results:
+                last_steps.append(step_results[-1])
+
+            await asyncio.to_thread(copy_persona_files, persona_dir, persona)
+
+        if last_steps:
+            step_writer.write(merge_step_results(last_steps, persona=MERGED_PERSONA))
+    finally:
+        await step_writer.close()
@@ -0,0 +1,271 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from pydantic import BaseModel
+
+from src.models.models import NetworkRequestResponsePair
+
+TIMINGS_FILENAME = "timings.jsonl"
+TRACE_FILENAME = "trace.json"
+
+
+class Span(BaseModel):
+    """A timed part of a step, start is a Unix timestamp."""
+
+    name: str
+    start: float
+    seconds: float
+    args: Dict[str, Any] = {}
+
+
+class StepTiming(BaseModel):
+    """
+    Where the time of one agent step went.
+
+    The step starts with on_step_start and ends after on_step_end. Page loads
+    happen while the browser state is read and while actions run, so
+    page_load_seconds overlaps with those.
+    """
+
+    step: int
+    persona: Optional[str] = None
+    url: Optional[str] = None
+    start: float
+    seconds: float
+    llm_calls: int = 0
+    llm_seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # Tokens of the messages as estimated by browser_use, if the LLM reported none
+    estimated_input_tokens: Optional[int] = None
+    action_seconds: float = 0.0
+    browser_state_seconds: float = 0.0
+    page_loads: int = 0
+    page_load_seconds: float = 0.0
+    on_step_end_seconds: float = 0.0
+    # on_step_end phase -> seconds, e.g. cookies, evaluate, serialize, write
+    on_step_end_phases: Dict[str, float] = {}
+    # Serialization and writing of step results in the background since the last step
+    background_write_seconds: float = 0.0
+    captured_responses: int = 0
+    captured_bytes: int = 0
+    spans: List[Span] = []
+
+
+class StepProfiler:
+    """
+    Collects the spans of every agent step and writes them to timings.jsonl.
+
+    The timings of a run can also be exported in the Chrome trace event format
+    to trace.json, which chrome://tracing and ui.perfetto.dev open.
+    """
+
+    def __init__(self, output_dir: str, persona: Optional[str] = None):
+        self.output_dir = output_dir
+        self.persona = persona
+        self.started_at = time.time()
+        self.step_started_at: Optional[float] = None
+        self.spans: List[Span] = []
+        self.captured_responses = 0
+        self.captured_bytes = 0
+        self.timings: List[StepTiming] = []
+
+    def start_step(self) -> None:
+        # Spans since the end of the last step, e.g. the output validation, are
+        # counted towards this step
+        self.step_started_at = min([time.time()] + [span.start for span in self.spans])
+
+    def add_span(self, name: str, start: float, seconds: float, **args) -> None:
+        self.spans.append(Span(name=name, start=start, seconds=seconds, args=args))
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[None]:
+        started_at = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, started_at, time.time() - started_at, **args)
+
+    def add_captured(self, pairs: List[NetworkRequestResponsePair]) -> None:
+        self.captured_responses += len(pairs)
+        self.captured_bytes += sum(pair.response.body_size or 0 for pair in pairs)
+
+    def instrument(self, agent) -> None:
+        """Time the actions of a browser_use agent."""
+        multi_act = agent.multi_act
+
+        async def timed_multi_act(actions, *args, **kwargs):
+            with self.span("actions", count=len(actions)):
+                return await multi_act(actions, *args, **kwargs)
+
+        agent.multi_act = timed_multi_act
+
+    def finish_step(
+        self,
+        step: int,
+        url: Optional[str] = None,
+        estimated_input_tokens: Optional[int] = None,
+        background_write_seconds: float = 0.0,
+    ) -> Optional[StepTiming]:
+        """Sum up the spans of the step and append it to timings.jsonl."""
+        if self.step_started_at is None:
+            return None
+
+        def total(name: str) -> float:
+            return round(sum(s.seconds for s in self.spans if s.name == name), 3)
+
+        llm_spans = [s for s in self.spans if s.name == "llm"]
+        input_tokens = sum(s.args.get("input_tokens", 0) for s in llm_spans)
+        on_step_end_phases: Dict[str, float] = {}
+        for s in self.spans:
+            if s.name.startswith("on_step_end."):
+                phase = s.name.split(".", 1)[1]
+                on_step_end_phases[phase] = round(
+                    on_step_end_phases.get(phase, 0.0) + s.seconds, 3
+                )
+
+        timing = StepTiming(
+            step=step,
+            persona=self.persona,
+            url=url,
+            start=self.step_started_at,
+            seconds=round(time.time() - self.step_started_at, 3),
+            llm_calls=len(llm_spans),
+            llm_seconds=total("llm"),
+            input_tokens=input_tokens,
+            output_tokens=sum(s.args.get("output_tokens", 0) for s in llm_spans),
+            estimated_input_tokens=None if input_tokens else estimated_input_tokens,
+            action_seconds=total("actions"),
+            browser_state_seconds=total("browser_state"),
+            page_loads=sum(1 for s in self.spans if s.name == "page_load"),
+            page_load_seconds=total("page_load"),
+            on_step_end_seconds=total("on_step_end"),
+            on_step_end_phases=on_step_end_phases,
+            background_write_seconds=round(background_write_seconds, 3),
+            captured_responses=self.captured_responses,
+            captured_bytes=self.captured_bytes,
+            spans=self.spans,
+        )
+        self.timings.append(timing)
+        self.step_started_at = None
+        self.spans = []
+        self.captured_responses = 0
+        self.captured_bytes = 0
+
+        try:
+            with open(
+                os.path.join(self.output_dir, TIMINGS_FILENAME), "a", encoding="utf-8"
+            ) as f:
+                f.write(timing.model_dump_json() + "\n")
+        except Exception as e:
+            print(f"Failed to save step timings: {e}")
+        return timing
+
+    def get_chrome_trace(self) -> Dict[str, Any]:
+        """The steps and their spans as complete events of the Chrome trace format."""
+
+        def microseconds(seconds: float) -> int:
+            return int(seconds * 1_000_000)
+
+        events: List[Dict[str, Any]] = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 1,
+                "tid": 1,
+                "args": {"name": self.persona or "agent"},
+            }
+        ]
+        for timing in self.timings:
+            step_args = timing.model_dump(exclude={"spans", "start", "seconds"})
+            events.append(
+                {
+                    "name": f"step {timing.step}",
+                    "cat": "step",
+                    "ph": "X",
+                    "ts": microseconds(timing.start - self.started_at),
+                    "dur": microseconds(timing.seconds),
+                    "pid": 1,
+                    "tid": 1,
+                    "args": step_args,
+                }
+            )
+            for span in timing.spans:
+                events.append(
+                    {
+                        "name": span.name,
+                        "cat": span.name.split(".")[0],
+                        "ph": "X",
+                        "ts": microseconds(span.start - self.started_at),
+                        "dur": microseconds(span.seconds),
+                        "pid": 1,
+                        "tid": 1,
+                        "args": span.args,
+                    }
+                )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self) -> None:
+        try:
+            with open(
+                os.path.join(self.output_dir, TRACE_FILENAME), "w", encoding="utf-8"
+            ) as f:
+                json.dump(self.get_chrome_trace(), f)
+        except Exception as e:
+            print(f"Failed to save trace: {e}")
+
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """Records every LLM call with its latency and token usage as a span."""
+
+    # Called in the event loop instead of an executor, the handler only takes times
+    run_inline = True
+
+    def __init__(self, profiler: StepProfiler):
+        self.profiler = profiler
+        self.started_at: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self.started_at[run_id] = time.time()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs):
+        self.started_at[run_id] = time.time()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        started_at = self.started_at.pop(run_id, None)
+        if started_at is None:
+            return
+
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+        if not input_tokens and response.llm_output:
+            token_usage = response.llm_output.get("token_usage") or {}
+            input_tokens = token_usage.get("prompt_tokens", 0)
+            output_tokens = token_usage.get("completion_tokens", 0)
+
+        self.profiler.add_span(
+            "llm",
+            started_at,
+            time.time() - started_at,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+        )
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        started_at = self.started_at.pop(run_id, None)
+        if started_at is not None:
+            self.profiler.add_span(
+                "llm", started_at, time.time() - started_at, error=str(error)
+            )
@@ -0,0 +1,53 @@
+import asyncio
+import time
+from typing import Optional
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+
+class RateLimiter:
+    """Spaces out LLM requests so that all agents sharing it stay below requests_per_minute."""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self.next_slot = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(self.next_slot, now) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class LLMRateLimitCallback(AsyncCallbackHandler):
+    """
+    Takes a slot of the rate limiter right before every LLM call.
+
+    Covers all calls of the agent, including browser_use's own output validation
+    and memory calls, and none for steps the decision cache answers. LangChain
+    awaits async handlers before it sends the request.
+    """
+
+    # Inline handlers run in order before the others, so listed before
+    # LLMTimingCallback the wait is not counted as LLM latency
+    run_inline = True
+
+    def __init__(self, rate_limiter: RateLimiter, profiler: Optional[object] = None):
+        self.rate_limiter = rate_limiter
+        # StepProfiler the waits are recorded in as rate_limit spans
+        self.profiler = profiler
+
+    async def acquire(self) -> None:
+        started_at = time.time()
+        await self.rate_limiter.acquire()
+        if self.profiler is not None:
+            self.profiler.add_span("rate_limit", started_at, time.time() - started_at)
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        await self.acquire()
+
+    async def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        await self.acquire()
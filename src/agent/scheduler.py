@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel
+
+from src.classification.util import generate_dirname
+
+from .agent import AGENT_OUTPUT_DIR, VidisAgent
+from .browser_pool import BrowserPool
+from .login_replay import LoginFlowStore
+from .rate_limit import RateLimiter
+from .session_cache import SessionCache
+from .tasks import get_task_prompt
+from .util import get_host
+
+
+class CrawlJob(BaseModel):
+    url: str
+    task_type: str = "legal"
+    username: str
+    password: str
+    max_steps: int = 25
+
+
+class CrawlOutcome(BaseModel):
+    url: str
+    task_type: str
+    output_name: str
+    status: Literal["pending", "running", "finished", "error"]
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+
+class CrawlManifest(BaseModel):
+    created_at: str
+    outcomes: List[CrawlOutcome]
+
+
+class CrawlScheduler:
+    """
+    Runs many agent jobs concurrently on one event loop.
+
+    Concurrency is bounded globally and per host, so a single offering is never
+    crawled by more than max_jobs_per_host agents at once, and the LLM request
+    rate of all agents together is limited by a shared RateLimiter. The outcome of
+    every job is written to a manifest file as soon as it changes.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_jobs: int = 4,
+        max_jobs_per_host: int = 1,
+        llm_requests_per_minute: Optional[float] = 60,
+        browser_pool: Optional[BrowserPool] = None,
+        headless: bool = True,
+        session_cache: Optional[SessionCache] = None,
+        login_flow_store: Optional[LoginFlowStore] = None,
+        use_decision_cache: bool = False,
+    ):
+        self.global_semaphore = asyncio.Semaphore(max_concurrent_jobs)
+        self.max_jobs_per_host = max_jobs_per_host
+        self.host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.llm_rate_limiter = (
+            RateLimiter(llm_requests_per_minute) if llm_requests_per_minute else None
+        )
+        self.browser_pool = browser_pool
+        self.headless = headless
+        self.session_cache = session_cache
+        self.login_flow_store = login_flow_store
+        self.use_decision_cache = use_decision_cache
+        self.manifest_path = os.path.join(
+            AGENT_OUTPUT_DIR,
+            f"crawl_manifest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+        )
+        self.manifest = CrawlManifest(
+            created_at=datetime.now().isoformat(), outcomes=[]
+        )
+
+    def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = get_host(url)
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.max_jobs_per_host)
+        return self.host_semaphores[host]
+
+    def save_manifest(self) -> None:
+        os.makedirs(AGENT_OUTPUT_DIR, exist_ok=True)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            f.write(self.manifest.model_dump_json(indent=2))
+
+    async def _run_job(self, job: CrawlJob, outcome: CrawlOutcome) -> None:
+        # Take the host slot first, so jobs for a busy host don't block global slots
+        async with self._get_host_semaphore(job.url):
+            async with self.global_semaphore:
+                outcome.status = "running"
+                outcome.started_at = time.time()
+                self.save_manifest()
+                try:
+                    vidis_agent = VidisAgent(
+                        task_prompt=get_task_prompt(job.task_type),
+                        initial_url=job.url,
+                        output_name=outcome.output_name,
+                        username=job.username,
+                        password=job.password,
+                        headless=self.headless,
+                        browser_pool=self.browser_pool,
+                        llm_rate_limiter=self.llm_rate_limiter,
+                        session_cache=self.session_cache,
+                        login_flow_store=self.login_flow_store,
+                        use_decision_cache=self.use_decision_cache,
+                        logged_in_task_prompt=get_task_prompt(
+                            job.task_type, logged_in=True
+                        ),
+                    )
+                    await vidis_agent.run_task(max_steps=job.max_steps)
+                    outcome.status = "finished"
+                except Exception as e:
+                    print(f"Job for {job.url} ({job.task_type}) failed: {e}")
+                    outcome.status = "error"
+                    outcome.error = str(e)
+                finally:
+                    outcome.finished_at = time.time()
+                    self.save_manifest()
+
+    async def run(self, jobs: List[CrawlJob]) -> CrawlManifest:
+        """Run all jobs and return the manifest with their run directories and outcomes."""
+        outcomes = [
+            CrawlOutcome(
+                url=job.url,
+                task_type=job.task_type,
+                output_name=generate_dirname(job.url),
+                status="pending",
+            )
+            for job in jobs
+        ]
+        self.manifest.outcomes = outcomes
+        self.save_manifest()
+
+        await asyncio.gather(
+            *(self._run_job(job, outcome) for job, outcome in zip(jobs, outcomes))
+        )
+
+        print(f"Crawl manifest saved to {self.manifest_path}")
+        return self.manifest
+
+
+def load_jobs_file(
+    path: str, username: str, password: str, task_types: List[str]
+) -> List[CrawlJob]:
+    """
+    Load crawl jobs from a file.
+
+    The file is either a JSON list of job objects or a plain text file with one URL
+    per line. Missing credentials are taken from the given username and password,
+    and entries without a task type are run once for each of the given task types.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    if content.lstrip().startswith("["):
+        entries = json.loads(content)
+    else:
+        entries = [
+            {"url": line.strip()}
+            for line in content.splitlines()
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
+    jobs: List[CrawlJob] = []
+    for entry in entries:
+        entry = {"username": username, "password": password, **entry}
+        if "task_type" in entry:
+            jobs.append(CrawlJob.model_validate(entry))
+        else:
+            for task_type in task_types:
+                jobs.append(CrawlJob.model_validate({**entry, "task_type": task_type}))
+    return jobs
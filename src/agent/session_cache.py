@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+from urllib.parse import urlparse
+
+from browser_use.browser.browser import Browser  # type: ignore
+from pydantic import BaseModel
+
+from .util import get_host
+
+DEFAULT_SESSION_CACHE_DIR = os.path.join("./agent_results", "sessions")
+DEFAULT_SESSION_TTL_SECONDS = 8 * 60 * 60
+
+# Paths of login pages and SSO callbacks
+LOGIN_PATH_PATTERN = re.compile(
+    r"/(login|log-in|signin|sign-in|anmelden|anmeldung|auth|oauth2?|sso|saml|callback)\b",
+    re.IGNORECASE,
+)
+
+
+# Key of the password in the sensitive_data of the agent
+PASSWORD_SECRET = "VIDIS_PASSWORD"
+
+
+def is_login_url(url: str) -> bool:
+    return LOGIN_PATH_PATTERN.search(urlparse(url).path) is not None
+
+
+def is_site_url(url: str, site_host: str) -> bool:
+    """Whether the URL is on the site, with or without www."""
+
+    def strip_www(host: str) -> str:
+        return host[4:] if host.startswith("www.") else host
+
+    return strip_www(get_host(url)) == strip_www(site_host)
+
+
+def is_password_input(action: Dict[str, Any], sensitive_data: Dict[str, str]) -> bool:
+    """
+    Whether a browser_use action, e.g. {"input_text": {...}}, types the password.
+
+    The LLM usually types the <secret> placeholder, but sometimes the password itself.
+    """
+    params = action.get("input_text")
+    if not params:
+        return False
+    text = params.get("text") or ""
+    password = sensitive_data.get(PASSWORD_SECRET)
+    return f"<secret>{PASSWORD_SECRET}</secret>" in text or bool(
+        password and password in text
+    )
+
+
+def get_site_cookie_names(
+    cookies: Iterable[Dict[str, Any]], site_host: str
+) -> Set[str]:
+    """Names of the cookies the site's host receives, e.g. its session cookie."""
+    hostname = urlparse(f"https://{site_host}").hostname or site_host
+    names = set()
+    for cookie in cookies:
+        domain = (cookie.get("domain") or "").lstrip(".").lower()
+        if domain and (hostname == domain or hostname.endswith(f".{domain}")):
+            names.add(cookie["name"])
+    return names
+
+
+class CachedSession(BaseModel):
+    host: str
+    # Playwright storage_state: cookies and localStorage per origin
+    storage_state: Dict[str, Any]
+    # sessionStorage per origin, which storage_state does not contain
+    session_storage: Dict[str, Dict[str, str]] = {}
+    # First page of the site after the login
+    post_login_url: str
+    # Cookies of the site that were set by the login, they must be there while the
+    # session is valid
+    login_cookies: List[str] = []
+    created_at: float
+    expires_at: float
+
+
+class SessionCache:
+    """
+    Logged in sessions per site and account, so repeat runs can skip the SSO login.
+
+    Sessions are stored as JSON at <cache_dir>/<sha256(host|username)>.json. The
+    files contain session cookies and are only readable by the owner.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_SESSION_CACHE_DIR,
+        ttl_seconds: float = DEFAULT_SESSION_TTL_SECONDS,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+
+    def path(self, url: str, username: str) -> str:
+        key = hashlib.sha256(f"{get_host(url)}|{username}".encode("utf-8"))
+        return os.path.join(self.cache_dir, f"{key.hexdigest()}.json")
+
+    def get(self, url: str, username: str) -> Optional[CachedSession]:
+        """Return the cached session, None if there is none or it has expired."""
+        path = self.path(url, username)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                session = CachedSession.model_validate(json.load(f))
+        except Exception as e:
+            print(f"Failed to read cached session: {e}")
+            self.invalidate(url, username)
+            return None
+
+        if session.expires_at <= time.time():
+            self.invalidate(url, username)
+            return None
+        return session
+
+    def put(
+        self,
+        url: str,
+        username: str,
+        storage_state: Dict[str, Any],
+        post_login_url: str,
+        login_cookies: List[str],
+        session_storage: Optional[Dict[str, Dict[str, str]]] = None,
+    ) -> CachedSession:
+        now = time.time()
+        session = CachedSession(
+            host=get_host(post_login_url),
+            storage_state=storage_state,
+            post_login_url=post_login_url,
+            login_cookies=login_cookies,
+            session_storage=session_storage or {},
+            created_at=now,
+            expires_at=now + self.ttl_seconds,
+        )
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(url, username)
+
+        # mkstemp creates the file with mode 0600
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(session.model_dump_json())
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return session
+
+    def invalidate(self, url: str, username: str) -> None:
+        path = self.path(url, username)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def is_session_valid(
+    browser: Browser, session: CachedSession, timeout_ms: float = 15000
+) -> bool:
+    """
+    Open the post-login page in a throwaway context with the cached session.
+
+    The session is valid if the page is not redirected to another host (the SSO
+    provider) or a login page, and the cookies the login set are still there. Sessions
+    without login cookies can't be told from a logged out visit and are never valid.
+    """
+    if not session.login_cookies:
+        return False
+
+    playwright_browser = await browser.get_playwright_browser()
+    context = await playwright_browser.new_context(storage_state=session.storage_state)
+    try:
+        page = await context.new_page()
+        await page.goto(
+            session.post_login_url, wait_until="domcontentloaded", timeout=timeout_ms
+        )
+        if not is_site_url(page.url, session.host) or is_login_url(page.url):
+            return False
+        cookie_names = get_site_cookie_names(await context.cookies(), session.host)
+        return set(session.login_cookies) <= cookie_names
+    except Exception as e:
+        print(f"Failed to check cached session: {e}")
+        return False
+    finally:
+        await context.close()
+
+
+async def restore_session(
+    session_cache: SessionCache, browser: Browser, url: str, username: str
+) -> Optional[CachedSession]:
+    """Return the cached session of the site and account if it is still logged in."""
+    session = session_cache.get(url, username)
+    if session is None:
+        return None
+
+    if not await is_session_valid(browser, session):
+        print(f"Cached session for {session.host} is no longer valid")
+        session_cache.invalidate(url, username)
+        return None
+
+    print(f"Restored cached session for {session.host}")
+    return session
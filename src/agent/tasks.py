@@ -157,14 +157,20 @@ def get_teacher_task_prompt() -> str:
     return login_task_prompt + teacher_task_prompt
 
 
-def get_all_tasks_prompt() -> str:
+def get_all_tasks_prompt(logged_in: bool = False) -> str:
     """
     Generate a combined prompt that executes all tasks in sequence.
 
+    Args:
+        logged_in: Whether the session is already logged in, e.g. from the session cache
+
     Returns:
         The complete task prompt combining all tasks
     """
-    combined_prompt = login_task_prompt + "\n\n"
+    if logged_in:
+        combined_prompt = logged_in_task_prompt + "\n\n"
+    else:
+        combined_prompt = login_task_prompt + "\n\n"
     combined_prompt += "=== TASK 1: LEGAL CONTENT EXPLORATION ===\n"
     combined_prompt += legal_task_prompt + "\n\n"
     combined_prompt += "=== TASK 2: STUDENT EXPLORATION ===\n"
@@ -184,7 +190,41 @@ Execute all tasks in the order listed above.
     return combined_prompt
 
 
-def get_task_prompt(task_type: str) -> str:
+logged_in_task_prompt = """
+You are already logged in to the website. Do not log out and do not log in again.
+"""
+
+PERSONAS = ["legal", "student", "teacher"]
+
+
+def get_persona_task_prompt(persona: str) -> str:
+    """
+    Generate the task prompt of a persona that starts in an already logged in session.
+
+    Args:
+        persona: One of PERSONAS
+
+    Returns:
+        The complete task prompt
+    """
+    if persona == "legal":
+        return logged_in_task_prompt + legal_task_prompt
+    elif persona == "student":
+        return logged_in_task_prompt + student_task_prompt
+    elif persona == "teacher":
+        return logged_in_task_prompt + teacher_task_prompt
+    else:
+        raise ValueError(f"Invalid persona: {persona}")
+
+
+def get_task_prompt(task_type: str, logged_in: bool = False) -> str:
+    if logged_in:
+        if task_type == "login":
+            return logged_in_task_prompt + "Check that you are logged in and finish."
+        elif task_type == "all":
+            return get_all_tasks_prompt(logged_in=True)
+        return get_persona_task_prompt(task_type)
+
     if task_type == "login":
         return login_task_prompt
     elif task_type == "legal":
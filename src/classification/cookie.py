@@ -1,7 +1,8 @@
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 
 from pydantic import BaseModel
 
+from ..files.snapshot_delta import cookie_key
 from ..models.models import Cookie
 
 from .util import generate_structured_completion
@@ -14,6 +15,8 @@ class CookieDbCheckResult(BaseModel):
     cookie: Cookie
     cookie_info: CookieInfo
     is_essential: bool | None
+    # Step of the run at which the cookie was set first, if known
+    first_seen_step: Optional[int] = None
 
 
 class CookieLLMResult(BaseModel):
@@ -26,6 +29,8 @@ class CookieLLMCheckResult(BaseModel):
     cookie_details: Cookie
     is_essential: bool
     explanation: str
+    # Step of the run at which the cookie was set first, if known
+    first_seen_step: Optional[int] = None
 
 
 SingleCookieCheckResult = Union[CookieDbCheckResult, CookieLLMCheckResult]
@@ -49,10 +54,25 @@ class CookieCheckResult(BaseModel):
     results: List[SingleCookieCheckResult]
 
 
-def get_cookie_check_results(cookies: List[Cookie]) -> CookieCheckResult:
+def get_cookie_check_results(
+    cookies: List[Cookie], first_seen_steps: Optional[Dict[str, int]] = None
+) -> CookieCheckResult:
+    """
+    Check whether the cookies are essential, in the cookie database or with the LLM.
+
+    Args:
+        cookies: Cookies to check
+        first_seen_steps: Step at which each cookie appeared first, keyed by
+            cookie_key (see read_first_seen_steps)
+
+    Returns:
+        CookieCheckResult with one result per cookie
+    """
     results: List[SingleCookieCheckResult] = []
+    first_seen_steps = first_seen_steps or {}
 
     for cookie in cookies:
+        first_seen_step = first_seen_steps.get(cookie_key(cookie))
         check_result = COOKIE_DATABASE.is_cookie_essential(cookie.name)
         if check_result is None:
             prompt = (
@@ -67,6 +87,7 @@ def get_cookie_check_results(cookies: List[Cookie]) -> CookieCheckResult:
                 cookie_details=cookie,
                 is_essential=check_result.is_essential,
                 explanation=check_result.explanation,
+                first_seen_step=first_seen_step,
             )
             results.append(cookie_llm_check_result)
         else:
@@ -77,6 +98,7 @@ def get_cookie_check_results(cookies: List[Cookie]) -> CookieCheckResult:
                 cookie=cookie,
                 cookie_info=cookie_info,
                 is_essential=is_essential,
+                first_seen_step=first_seen_step,
             )
             results.append(cookie_db_check_result)
 
@@ -1,6 +1,6 @@
 import os
 from .util import (
-    read_text_from_pdf,
+    read_legal_page_text,
     generate_structured_completion,
 )
 from pydantic import BaseModel
@@ -88,7 +88,7 @@ def check_imprint(file_path: str) -> ImprintCheckResult:
             legal_reference_current=False,
         )
 
-    imprint_text = read_text_from_pdf(file_path)
+    imprint_text = read_legal_page_text(file_path)
     return check_imprint_from_text(imprint_text)
 
 
@@ -1,7 +1,7 @@
 import os
 from .util import (
     generate_structured_completion,
-    read_text_from_pdf,
+    read_legal_page_text,
 )
 from pydantic import BaseModel
 
@@ -110,7 +110,7 @@ def check_privacy_policy(file_path: str) -> PrivacyPolicyCheckResult:
             automated_decision_making_info_present=False,
         )
 
-    privacy_policy_text = read_text_from_pdf(file_path)
+    privacy_policy_text = read_legal_page_text(file_path)
     return check_privacy_policy_from_text(privacy_policy_text)
 
 
@@ -1,6 +1,6 @@
 import os
 from .util import (
-    read_text_from_pdf,
+    read_legal_page_text,
     generate_structured_completion,
 )
 from pydantic import BaseModel
@@ -177,7 +177,7 @@ def check_terms_of_use(file_path: str, processor_only: bool = False):
                 is_valid=False,
             )
 
-    terms_of_use_text = read_text_from_pdf(file_path)
+    terms_of_use_text = read_legal_page_text(file_path)
     return check_terms_of_use_from_text(terms_of_use_text, processor_only)
 
 
@@ -1,4 +1,5 @@
 import base64
+import os
 from datetime import datetime
 from typing import List, Type, TypeVar
 import uuid
@@ -7,12 +8,81 @@ import PyPDF2
 from urllib.parse import urlparse, unquote
 import re
 
+from ..files.canonical_url import canonicalize_url
+from ..files.snapshot_delta import (
+    FirstSeenSteps,
+    SnapshotReconstructor,
+    parse_step_record,
+    reconstruct_steps,
+)
+from ..files.step_log import StepLogReader, is_step_log
+from ..files.step_writer import STEP_LOG_FILENAME, STEP_RESULT_JSONL_FILENAME
 from ..models.models import StepResult
 
 
+def find_step_result_file(directory: str) -> str:
+    """Return the step log of an agent run, preferring the binary format over JSONL."""
+    step_log_path = os.path.join(directory, STEP_LOG_FILENAME)
+    if os.path.exists(step_log_path):
+        return step_log_path
+    return os.path.join(directory, STEP_RESULT_JSONL_FILENAME)
+
+
 def read_step_result_file(path: str) -> List[StepResult]:
+    """
+    Read all step results from a binary step log or a JSONL file.
+
+    Steps stored as deltas to the previous step are materialized to full step results.
+    """
+    if is_step_log(path):
+        return list(StepLogReader(path))
+
     with open(path, "r") as file:
-        return [StepResult.model_validate_json(line) for line in file]
+        return list(reconstruct_steps(parse_step_record(line) for line in file))
+
+
+def read_first_seen_steps(path: str) -> FirstSeenSteps:
+    """
+    Get the step at which each cookie, storage key and resource URL appeared first.
+
+    Args:
+        path: Path to the step log
+
+    Returns:
+        FirstSeenSteps with step numbers starting at 0
+    """
+    reconstructor = SnapshotReconstructor()
+    if is_step_log(path):
+        for record in StepLogReader(path).iter_records():
+            reconstructor.apply(record)
+    else:
+        with open(path, "r") as file:
+            for line in file:
+                reconstructor.apply(parse_step_record(line))
+    return reconstructor.first_seen
+
+
+def read_step_result(path: str, step: int) -> StepResult:
+    """
+    Read a single step result, negative numbers count from the end.
+
+    Binary step logs seek directly to the step (or its closest full snapshot)
+    using their index, JSONL files have to be parsed completely.
+
+    Args:
+        path: Path to the step log
+        step: Index of the step
+
+    Returns:
+        The StepResult of the step
+    """
+    if is_step_log(path):
+        return StepLogReader(path).read_step(step)
+
+    step_results = read_step_result_file(path)
+    if not -len(step_results) <= step < len(step_results):
+        raise IndexError(f"Step {step} not found in {path}")
+    return step_results[step]
 
 
 def extract_domain(url: str) -> str:
@@ -119,23 +189,44 @@ def read_text_from_pdf(path: str) -> str:
         return text
 
 
+def read_legal_page_text(pdf_path: str) -> str:
+    """
+    Read the text of a saved legal page.
+
+    Prefers the text sidecar (e.g. privacy_policy.txt) that the agent stores next to
+    the PDF and only falls back to extracting the text from the PDF.
+    """
+    text_path = os.path.splitext(pdf_path)[0] + ".txt"
+    if os.path.exists(text_path):
+        with open(text_path, "r", encoding="utf-8") as file:
+            text = file.read()
+        # Pages that only embed their content, e.g. in a PDF viewer, have no text
+        if text.strip():
+            return text
+    return read_text_from_pdf(pdf_path)
+
+
 def url_to_dirname(url: str) -> str:
     """
     Convert a URL into a filesystem-safe directory name.
 
-    - Parses the URL into scheme, netloc, path, and query.
+    - Canonicalizes the URL, so that e.g. anchors and tracking parameters
+      don't change the name.
+    - Parses the URL into scheme, netloc, path, query, and the hash route of
+      single page apps.
     - URL-decodes percent-escapes.
     - Joins components with underscores.
     - Replaces illegal filesystem characters with underscores.
     - Optionally truncates the result to max_length characters.
     """
     # 1) Parse and decode
-    parsed = urlparse(url)
+    parsed = urlparse(canonicalize_url(url))
     components = [
         parsed.scheme,
         parsed.netloc,
         unquote(parsed.path),
         unquote(parsed.query),
+        unquote(parsed.fragment),
     ]
     # 2) Join non-empty components with underscore
     joined = "_".join(filter(None, components))
@@ -2,6 +2,12 @@ import json
 import os
 from typing import List, Dict, Any, Optional, Tuple, Union
 
+from ..files.canonical_url import (
+    DEFAULT_URL_POLICY,
+    UrlNormalizationPolicy,
+    VisitedIndex,
+    canonicalize_url,
+)
 from .types_models import (
     CookieIssue,
     CookieDetails,
@@ -226,8 +232,10 @@ class TrackingChecker(BaseChecker):
 class TrackingAnalyzer(BaseChecker):
     """Analyzes tracking results to identify patterns and cross-page tracking"""
 
-    def __init__(self) -> None:
+    def __init__(self, url_policy: UrlNormalizationPolicy = DEFAULT_URL_POLICY) -> None:
         super().__init__()
+        # Pages and trackers are compared by their canonical URLs
+        self.url_policy = url_policy
 
     def analyze_tracking(
         self, tracking_results: List[Union[TrackingIssue, RequestIssue]]
@@ -256,7 +264,7 @@ class TrackingAnalyzer(BaseChecker):
         ]
 
         # Map tracking pixel URLs to the pages they appear on
-        tracker_to_pages: Dict[str, List[str]] = {}
+        tracker_to_pages: Dict[str, VisitedIndex] = {}
         for pixel in tracking_pixels:
             pixel_url = pixel.resource.url
             page_url = pixel.url
@@ -264,11 +272,11 @@ class TrackingAnalyzer(BaseChecker):
             if not pixel_url or not page_url:
                 continue
 
+            pixel_url = canonicalize_url(pixel_url, self.url_policy)
             if pixel_url not in tracker_to_pages:
-                tracker_to_pages[pixel_url] = []
+                tracker_to_pages[pixel_url] = VisitedIndex(self.url_policy)
 
-            if page_url not in tracker_to_pages[pixel_url]:
-                tracker_to_pages[pixel_url].append(page_url)
+            tracker_to_pages[pixel_url].add(page_url)
 
         # Find trackers that appear on multiple pages
         cross_page_trackers: List[CrossPageTracker] = []
@@ -278,7 +286,7 @@ class TrackingAnalyzer(BaseChecker):
                     CrossPageTracker(
                         tracker_url=tracker_url,
                         page_count=len(pages),
-                        pages=pages,
+                        pages=pages.urls,
                     )
                 )
 
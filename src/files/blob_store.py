@@ -0,0 +1,170 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Iterable, List, Optional, Set
+
+BLOB_REF_PREFIX = "blob:sha256:"
+DEFAULT_BLOB_STORE_DIR = os.path.join("./agent_results", "blobs")
+# Blobs not used for the longest time are removed beyond this size, see prune()
+DEFAULT_BLOB_STORE_MAX_BYTES = 5 * 1024 * 1024 * 1024
+# Digests of the blobs a run references, written to the run directory
+BLOB_REFS_FILENAME = "blob_refs.json"
+
+
+def make_blob_ref(digest: str) -> str:
+    return f"{BLOB_REF_PREFIX}{digest}"
+
+
+def is_blob_ref(value: Optional[str]) -> bool:
+    return value is not None and value.startswith(BLOB_REF_PREFIX)
+
+
+def parse_blob_ref(value: str) -> str:
+    """Return the digest of a blob reference."""
+    if not is_blob_ref(value):
+        raise ValueError(f"Not a blob reference: {value[:50]}")
+    return value[len(BLOB_REF_PREFIX) :]
+
+
+def save_blob_refs(directory: str, digests: Iterable[str]) -> None:
+    with open(os.path.join(directory, BLOB_REFS_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(sorted(digests), f)
+
+
+def load_blob_refs(directory: str) -> List[str]:
+    """The digests saved by save_blob_refs, empty if there are none."""
+    path = os.path.join(directory, BLOB_REFS_FILENAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_run_blob_refs(runs_dir: str) -> Set[str]:
+    """The digests referenced by any run directory directly below runs_dir."""
+    digests: Set[str] = set()
+    if not os.path.isdir(runs_dir):
+        return digests
+    for entry in os.scandir(runs_dir):
+        if not entry.is_dir():
+            continue
+        try:
+            digests.update(load_blob_refs(entry.path))
+        except (OSError, ValueError) as e:
+            print(f"Failed to read blob references of {entry.path}: {e}")
+    return digests
+
+
+class BlobStore:
+    """
+    Content-addressed store for response bodies and other artifacts.
+
+    Every blob is stored gzip-compressed at <root_dir>/<digest[:2]>/<digest>.gz, so
+    identical content is written only once, no matter how many steps or runs
+    reference it. The modification time of a blob is refreshed whenever a run
+    stores it again, so prune() removes the blobs no recent run used.
+    """
+
+    def __init__(self, root_dir: str = DEFAULT_BLOB_STORE_DIR):
+        self.root_dir = root_dir
+        self.known_digests: Set[str] = set()
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root_dir, digest[:2], f"{digest}.gz")
+
+    def contains(self, digest: str) -> bool:
+        return digest in self.known_digests or os.path.exists(self.path(digest))
+
+    def put(self, data: bytes) -> str:
+        """Store data and return its sha256 digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.known_digests:
+            return digest
+        if os.path.exists(self.path(digest)):
+            try:
+                os.utime(self.path(digest))
+            except OSError:
+                pass
+            self.known_digests.add(digest)
+            return digest
+
+        blob_path = self.path(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+
+        # Write to a temporary file first so concurrent runs never see partial blobs
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            os.replace(temp_path, blob_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.known_digests.add(digest)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with open(self.path(digest), "rb") as f:
+            return gzip.decompress(f.read())
+
+    def put_text(self, text: str) -> str:
+        """Store text and return a blob reference for it."""
+        return make_blob_ref(self.put(text.encode("utf-8")))
+
+    def get_text(self, ref: str) -> str:
+        return self.get(parse_blob_ref(ref)).decode("utf-8")
+
+    def prune(
+        self,
+        max_bytes: int = DEFAULT_BLOB_STORE_MAX_BYTES,
+        runs_dir: Optional[str] = None,
+    ) -> int:
+        """
+        Remove the least recently stored blobs until the store is at most max_bytes.
+
+        Blobs stored by this instance are kept, and so are the blobs listed in the
+        blob_refs.json of a run directory below runs_dir: the step logs of these
+        runs still reference them, and app.py zips a run directory with its blobs
+        when the archive is missing. Removing a run directory releases its blobs.
+
+        Returns:
+            Number of removed blobs
+        """
+        keep = set(self.known_digests)
+        if runs_dir is not None:
+            keep |= load_run_blob_refs(runs_dir)
+
+        blobs = []
+        total_bytes = 0
+        for root, _, filenames in os.walk(self.root_dir):
+            for filename in filenames:
+                if not filename.endswith(".gz"):
+                    continue
+                blob_path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(blob_path)
+                except FileNotFoundError:
+                    continue
+                total_bytes += stat.st_size
+                blobs.append((stat.st_mtime, stat.st_size, filename[:-3], blob_path))
+
+        removed = 0
+        # A blob of a concurrent run may be older than its run, keep the last hour
+        min_age = time.time() - 3600
+        for mtime, size, digest, blob_path in sorted(blobs):
+            if total_bytes <= max_bytes:
+                break
+            if digest in keep or mtime > min_age:
+                continue
+            try:
+                os.remove(blob_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            removed += 1
+        return removed
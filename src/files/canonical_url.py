@@ -0,0 +1,184 @@
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Iterator, List, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from pydantic import BaseModel, ConfigDict
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that identify the visitor or the campaign, not the page.
+# Entries ending in "*" match prefixes.
+TRACKING_PARAMS = (
+    "utm_*",
+    "fbclid",
+    "gclid",
+    "dclid",
+    "gbraid",
+    "wbraid",
+    "msclkid",
+    "yclid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_gl",
+    "igshid",
+    "jsessionid",
+    "phpsessid",
+)
+
+# Session ids some servers put into the path, e.g. /page;jsessionid=1A2B
+PATH_SESSION_PATTERN = re.compile(r";(jsessionid|phpsessid)=[^/]*", re.IGNORECASE)
+
+# Fragments of single page apps with hash routing, e.g. #/kurse or #!/kurse
+HASH_ROUTE_PREFIXES = ("/", "!")
+
+
+class UrlNormalizationPolicy(BaseModel):
+    """
+    Which differences between two URLs don't make them different pages.
+
+    Frozen, so that it can be part of the cache key of canonicalize_url.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    drop_fragment: bool = True
+    # Keep fragments that are routes of single page apps even with drop_fragment
+    keep_hash_routes: bool = True
+    drop_tracking_params: bool = True
+    tracking_params: Tuple[str, ...] = TRACKING_PARAMS
+    strip_trailing_slash: bool = True
+    drop_default_port: bool = True
+    sort_query: bool = True
+    drop_www: bool = False
+
+    def is_tracking_param(self, name: str) -> bool:
+        name = name.lower()
+        return any(
+            name.startswith(param[:-1]) if param.endswith("*") else name == param
+            for param in self.tracking_params
+        )
+
+
+DEFAULT_URL_POLICY = UrlNormalizationPolicy()
+
+
+@lru_cache(maxsize=4096)
+def canonicalize_url(
+    url: str, policy: UrlNormalizationPolicy = DEFAULT_URL_POLICY
+) -> str:
+    """
+    Return the canonical form of a URL under the policy.
+
+    URLs without a host, e.g. about:blank or data: URLs, are returned unchanged.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower()
+    # Host names are case insensitive, hostname is lowercase
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"
+    if policy.drop_www and host.startswith("www."):
+        host = host[4:]
+    netloc = host
+    if parts.username:
+        credentials = parts.username
+        if parts.password:
+            credentials += f":{parts.password}"
+        netloc = f"{credentials}@{netloc}"
+    if port is not None and not (
+        policy.drop_default_port and DEFAULT_PORTS.get(scheme) == port
+    ):
+        netloc = f"{netloc}:{port}"
+
+    path = parts.path
+    if policy.drop_tracking_params:
+        path = PATH_SESSION_PATTERN.sub("", path)
+    if policy.strip_trailing_slash:
+        # Also makes the root path the same page as no path at all
+        path = path.rstrip("/")
+
+    query = parts.query
+    if policy.drop_tracking_params or policy.sort_query:
+        params = parse_qsl(query, keep_blank_values=True)
+        if policy.drop_tracking_params:
+            params = [
+                (name, value)
+                for name, value in params
+                if not policy.is_tracking_param(name)
+            ]
+        if policy.sort_query:
+            params.sort()
+        query = urlencode(params)
+
+    fragment = parts.fragment
+    if fragment.startswith(HASH_ROUTE_PREFIXES) and policy.keep_hash_routes:
+        if policy.strip_trailing_slash:
+            fragment = fragment.rstrip("/")
+        # The root route is the page itself
+        if fragment in ("", "!"):
+            fragment = ""
+    elif policy.drop_fragment:
+        fragment = ""
+    return urlunsplit((scheme, netloc, path, query, fragment))
+
+
+def get_path_prefix(url: str) -> str:
+    """Host and first path segment of a URL, e.g. example.de/kurse."""
+    parts = urlsplit(url)
+    return f"{parts.netloc}/{parts.path.strip('/').split('/')[0]}"
+
+
+class VisitedIndex:
+    """
+    Visited pages in the order they were first visited.
+
+    Pages are told apart by their canonical URL, but urls keeps the URL of the
+    first visit, as it was, for display. Membership is checked against a set of
+    canonical URLs, so that the URLs a page links to can be checked cheaply
+    however many pages were visited.
+    """
+
+    def __init__(self, policy: UrlNormalizationPolicy = DEFAULT_URL_POLICY):
+        self.policy = policy
+        # First URL visited per canonical URL
+        self.urls: List[str] = []
+        self._seen: Set[str] = set()
+        # Visited pages per path prefix, see get_path_prefix
+        self.prefix_counts: Counter = Counter()
+
+    def add(self, url: str) -> bool:
+        """Add a URL, return whether its canonical form was new."""
+        canonical_url = canonicalize_url(url, self.policy)
+        if canonical_url in self._seen:
+            return False
+        self._seen.add(canonical_url)
+        self.urls.append(url)
+        self.prefix_counts[get_path_prefix(canonical_url)] += 1
+        return True
+
+    def get_recent(self, count: int) -> List[str]:
+        """The last count URLs that were visited for the first time."""
+        return self.urls[-count:] if count > 0 else []
+
+    def get_path_prefixes(self, count: int) -> List[Tuple[str, int]]:
+        """The count path prefixes with the most visited pages."""
+        return self.prefix_counts.most_common(count)
+
+    def __contains__(self, url: object) -> bool:
+        return isinstance(url, str) and canonicalize_url(url, self.policy) in self._seen
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.urls)
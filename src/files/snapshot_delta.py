@@ -0,0 +1,255 @@
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from pydantic import BaseModel, TypeAdapter
+
+from ..models.models import (
+    Cookie,
+    CookieDelta,
+    LocalStorage,
+    Resource,
+    ResourceDelta,
+    SessionStorage,
+    StepRecord,
+    StepResult,
+    StepResultDelta,
+    StorageDelta,
+)
+
+STEP_RECORD_ADAPTER: TypeAdapter[StepRecord] = TypeAdapter(StepRecord)
+
+
+def parse_step_record(data: str | bytes) -> StepRecord:
+    """Parse a JSON encoded full snapshot or delta."""
+    return STEP_RECORD_ADAPTER.validate_json(data)
+
+
+def cookie_key(cookie: Cookie) -> str:
+    return f"{cookie.name}|{cookie.domain}|{cookie.path}"
+
+
+def resource_key(resource: Resource) -> str:
+    return resource.model_dump_json()
+
+
+def merge_step_results(
+    step_results: List[StepResult], persona: Optional[str] = None
+) -> StepResult:
+    """
+    Union of several snapshots, e.g. the last steps of parallel browser contexts.
+
+    Cookies are identified by name, domain and path and storage entries by key,
+    later snapshots win. Resources are concatenated without duplicates. The
+    request/response pairs are left out, the steps the snapshots come from
+    already hold them. The URL is the one of the last snapshot.
+    """
+    cookies: Dict[str, Cookie] = {}
+    local_storage: Dict[str, str] = {}
+    session_storage: Dict[str, str] = {}
+    resources: Dict[str, Resource] = {}
+    for step_result in step_results:
+        for cookie in step_result.cookies:
+            cookies[cookie_key(cookie)] = cookie
+        local_storage.update(step_result.local_storage.entries)
+        session_storage.update(step_result.session_storage.entries)
+        for resource in step_result.resources:
+            resources.setdefault(resource_key(resource), resource)
+
+    return StepResult(
+        url=step_results[-1].url if step_results else "",
+        cookies=list(cookies.values()),
+        local_storage=LocalStorage(entries=local_storage),
+        session_storage=SessionStorage(entries=session_storage),
+        resources=list(resources.values()),
+        persona=persona,
+    )
+
+
+def compute_cookie_delta(previous: List[Cookie], current: List[Cookie]) -> CookieDelta:
+    previous_by_key = {cookie_key(cookie): cookie for cookie in previous}
+    current_by_key = {cookie_key(cookie): cookie for cookie in current}
+
+    delta = CookieDelta()
+    for key, cookie in current_by_key.items():
+        if key not in previous_by_key:
+            delta.added.append(cookie)
+        elif previous_by_key[key] != cookie:
+            delta.modified.append(cookie)
+    for key, cookie in previous_by_key.items():
+        if key not in current_by_key:
+            delta.removed.append(cookie)
+    return delta
+
+
+def apply_cookie_delta(previous: List[Cookie], delta: CookieDelta) -> List[Cookie]:
+    cookies = {cookie_key(cookie): cookie for cookie in previous}
+    for cookie in delta.removed:
+        cookies.pop(cookie_key(cookie), None)
+    for cookie in delta.modified + delta.added:
+        cookies[cookie_key(cookie)] = cookie
+    return list(cookies.values())
+
+
+def compute_storage_delta(
+    previous: Dict[str, str], current: Dict[str, str]
+) -> StorageDelta:
+    delta = StorageDelta()
+    for key, value in current.items():
+        if key not in previous:
+            delta.added[key] = value
+        elif previous[key] != value:
+            delta.modified[key] = value
+    delta.removed = [key for key in previous if key not in current]
+    return delta
+
+
+def apply_storage_delta(
+    previous: Dict[str, str], delta: StorageDelta
+) -> Dict[str, str]:
+    entries = dict(previous)
+    for key in delta.removed:
+        entries.pop(key, None)
+    entries.update(delta.modified)
+    entries.update(delta.added)
+    return entries
+
+
+def compute_resource_delta(
+    previous: List[Resource], current: List[Resource]
+) -> ResourceDelta:
+    # The same resource can be embedded several times, so compare as multisets
+    previous_counts = Counter(resource_key(resource) for resource in previous)
+    current_counts = Counter(resource_key(resource) for resource in current)
+
+    delta = ResourceDelta()
+    for resource in current:
+        key = resource_key(resource)
+        if current_counts[key] > previous_counts[key]:
+            delta.added.append(resource)
+            current_counts[key] -= 1
+    for resource in previous:
+        key = resource_key(resource)
+        if previous_counts[key] > current_counts[key]:
+            delta.removed.append(resource)
+            previous_counts[key] -= 1
+    return delta
+
+
+def apply_resource_delta(
+    previous: List[Resource], delta: ResourceDelta
+) -> List[Resource]:
+    removed = Counter(resource_key(resource) for resource in delta.removed)
+    resources = []
+    for resource in previous:
+        key = resource_key(resource)
+        if removed[key] > 0:
+            removed[key] -= 1
+        else:
+            resources.append(resource)
+    return resources + delta.added
+
+
+def compute_step_delta(previous: StepResult, current: StepResult) -> StepResultDelta:
+    return StepResultDelta(
+        url=current.url,
+        cookies=compute_cookie_delta(previous.cookies, current.cookies),
+        local_storage=compute_storage_delta(
+            previous.local_storage.entries, current.local_storage.entries
+        ),
+        session_storage=compute_storage_delta(
+            previous.session_storage.entries, current.session_storage.entries
+        ),
+        resources=compute_resource_delta(previous.resources, current.resources),
+        request_response_pairs=current.request_response_pairs,
+        probe_events=current.probe_events,
+        persona=current.persona,
+    )
+
+
+def apply_step_delta(previous: StepResult, delta: StepResultDelta) -> StepResult:
+    return StepResult(
+        url=delta.url,
+        cookies=apply_cookie_delta(previous.cookies, delta.cookies),
+        local_storage=LocalStorage(
+            entries=apply_storage_delta(
+                previous.local_storage.entries, delta.local_storage
+            )
+        ),
+        session_storage=SessionStorage(
+            entries=apply_storage_delta(
+                previous.session_storage.entries, delta.session_storage
+            )
+        ),
+        resources=apply_resource_delta(previous.resources, delta.resources),
+        request_response_pairs=delta.request_response_pairs,
+        probe_events=delta.probe_events,
+        persona=delta.persona,
+    )
+
+
+class SnapshotEncoder:
+    """
+    Encodes the step results of a run as deltas to the previous step.
+
+    Every keyframe_interval steps a full snapshot is written, so a single step can
+    be materialized without replaying the whole run.
+    """
+
+    def __init__(self, keyframe_interval: int = 10):
+        self.keyframe_interval = keyframe_interval
+        self.previous: Optional[StepResult] = None
+        self.step = 0
+
+    def encode(self, step_result: StepResult) -> StepRecord:
+        record: StepRecord = step_result
+        if self.previous is not None and self.step % self.keyframe_interval != 0:
+            record = compute_step_delta(self.previous, step_result)
+
+        self.previous = step_result
+        self.step += 1
+        return record
+
+
+class FirstSeenSteps(BaseModel):
+    """Step number at which each cookie, storage key and resource URL appeared first."""
+
+    cookies: Dict[str, int] = {}
+    local_storage: Dict[str, int] = {}
+    session_storage: Dict[str, int] = {}
+    resources: Dict[str, int] = {}
+
+
+class SnapshotReconstructor:
+    """Materializes full step results from a sequence of full snapshots and deltas."""
+
+    def __init__(self, previous: Optional[StepResult] = None, step: int = 0):
+        self.previous = previous
+        self.step = step
+        self.first_seen = FirstSeenSteps()
+
+    def apply(self, record: StepRecord) -> StepResult:
+        if isinstance(record, StepResultDelta):
+            if self.previous is None:
+                raise ValueError(f"Delta at step {self.step} has no previous snapshot")
+            step_result = apply_step_delta(self.previous, record)
+        else:
+            step_result = record
+
+        for cookie in step_result.cookies:
+            self.first_seen.cookies.setdefault(cookie_key(cookie), self.step)
+        for key in step_result.local_storage.entries:
+            self.first_seen.local_storage.setdefault(key, self.step)
+        for key in step_result.session_storage.entries:
+            self.first_seen.session_storage.setdefault(key, self.step)
+        for resource in step_result.resources:
+            self.first_seen.resources.setdefault(resource.url, self.step)
+
+        self.previous = step_result
+        self.step += 1
+        return step_result
+
+
+def reconstruct_steps(records: Iterable[StepRecord]) -> Iterator[StepResult]:
+    reconstructor = SnapshotReconstructor()
+    for record in records:
+        yield reconstructor.apply(record)
@@ -0,0 +1,215 @@
+import os
+import struct
+from typing import Iterator, List, Optional
+
+import zstandard
+from pydantic import BaseModel
+
+from ..models.models import StepRecord, StepResult
+from .snapshot_delta import SnapshotReconstructor, parse_step_record
+
+# File layout:
+#   MAGIC
+#   frame*          <u32 length><zstd compressed StepResult/StepResultDelta JSON>
+#   index frame     <u32 length><zstd compressed StepLogIndex JSON>
+#   footer          <u64 index frame offset><FOOTER_MAGIC>
+MAGIC = b"VIDISLOG\x01\n"
+FOOTER_MAGIC = b"VIDISIDX"
+FRAME_HEADER = struct.Struct("<I")
+FOOTER = struct.Struct("<Q8s")
+COMPRESSION_LEVEL = 3
+
+
+class StepLogIndexEntry(BaseModel):
+    offset: int
+    length: int
+    url: str
+    snapshot_mode: str = "full"
+    # Counts of the materialized step, also for deltas
+    cookie_count: int
+    resource_count: int
+    request_count: int
+
+
+class StepLogIndex(BaseModel):
+    steps: List[StepLogIndexEntry]
+
+
+def is_step_log(path: str) -> bool:
+    """Check whether a file is a binary step log (as opposed to legacy JSONL)."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _read_frame(f, offset: int) -> bytes:
+    f.seek(offset)
+    header = f.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        raise EOFError(f"Incomplete frame header at offset {offset}")
+    (length,) = FRAME_HEADER.unpack(header)
+    data = f.read(length)
+    if len(data) < length:
+        raise EOFError(f"Incomplete frame at offset {offset}")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _read_footer(f) -> Optional[StepLogIndex]:
+    """Read the index from the footer, None if the file has no (valid) footer."""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size < len(MAGIC) + FOOTER.size:
+        return None
+
+    f.seek(size - FOOTER.size)
+    index_offset, footer_magic = FOOTER.unpack(f.read(FOOTER.size))
+    if footer_magic != FOOTER_MAGIC or index_offset >= size:
+        return None
+
+    try:
+        return StepLogIndex.model_validate_json(_read_frame(f, index_offset))
+    except Exception as e:
+        print(f"Failed to read step log index: {e}")
+        return None
+
+
+def _scan_frames(f) -> StepLogIndex:
+    """Rebuild the index by walking all frames, e.g. after a run crashed before the footer was written."""
+    entries: List[StepLogIndexEntry] = []
+    reconstructor = SnapshotReconstructor()
+    offset = len(MAGIC)
+    while True:
+        try:
+            data = _read_frame(f, offset)
+            record = parse_step_record(data)
+        except Exception:
+            # Reached the footer or a partially written frame
+            break
+
+        length = f.tell() - offset
+        step_result = reconstructor.apply(record)
+        entries.append(_make_index_entry(record, step_result, offset, length))
+        offset += length
+
+    return StepLogIndex(steps=entries)
+
+
+def _make_index_entry(
+    record: StepRecord, step_result: StepResult, offset: int, length: int
+) -> StepLogIndexEntry:
+    return StepLogIndexEntry(
+        offset=offset,
+        length=length,
+        url=step_result.url,
+        snapshot_mode=record.snapshot_mode,
+        cookie_count=len(step_result.cookies),
+        resource_count=len(step_result.resources),
+        request_count=len(step_result.request_response_pairs),
+    )
+
+
+class StepLogWriter:
+    """
+    Appends step results to a binary step log.
+
+    Every step is its own zstd frame, so single steps can be decompressed without
+    reading the rest of the file. The index footer is rewritten after every append,
+    so the file is readable at any time. Records can be full snapshots or deltas
+    to the previous step.
+    """
+
+    def __init__(self, path: str, compression_level: int = COMPRESSION_LEVEL):
+        self.path = path
+        self.compressor = zstandard.ZstdCompressor(level=compression_level)
+        self.index = StepLogIndex(steps=[])
+        self.data_end = len(MAGIC)
+        # Materializes deltas for the counts in the index
+        self.reconstructor = SnapshotReconstructor()
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is not a step log")
+                self.index = _read_footer(f) or _scan_frames(f)
+            if self.index.steps:
+                last = self.index.steps[-1]
+                self.data_end = last.offset + last.length
+                self.reconstructor = SnapshotReconstructor(
+                    StepLogReader(path).read_step(-1), len(self.index.steps)
+                )
+        else:
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+
+    def _frame(self, data: bytes) -> bytes:
+        compressed = self.compressor.compress(data)
+        return FRAME_HEADER.pack(len(compressed)) + compressed
+
+    def append(self, records: List[StepRecord]) -> None:
+        with open(self.path, "r+b") as f:
+            # Overwrite the old index and footer
+            f.seek(self.data_end)
+            for record in records:
+                frame = self._frame(record.model_dump_json().encode("utf-8"))
+                f.write(frame)
+                step_result = self.reconstructor.apply(record)
+                self.index.steps.append(
+                    _make_index_entry(record, step_result, self.data_end, len(frame))
+                )
+                self.data_end += len(frame)
+
+            f.write(self._frame(self.index.model_dump_json().encode("utf-8")))
+            f.write(FOOTER.pack(self.data_end, FOOTER_MAGIC))
+            f.truncate()
+
+
+class StepLogReader:
+    """Random access to the steps of a binary step log."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a step log")
+            self.index = _read_footer(f) or _scan_frames(f)
+
+    def __len__(self) -> int:
+        return len(self.index.steps)
+
+    def read_record(self, step: int) -> StepRecord:
+        """Read the stored record (full snapshot or delta) of a step."""
+        entry = self.index.steps[step]
+        with open(self.path, "rb") as f:
+            return parse_step_record(_read_frame(f, entry.offset))
+
+    def read_step(self, step: int) -> StepResult:
+        """
+        Read and materialize a single step, negative numbers count from the end.
+
+        Deltas are replayed from the closest full snapshot before the step.
+        """
+        if step < 0:
+            step += len(self)
+        if not 0 <= step < len(self):
+            raise IndexError(f"Step {step} not found in {self.path}")
+
+        keyframe = step
+        while keyframe > 0 and self.index.steps[keyframe].snapshot_mode != "full":
+            keyframe -= 1
+
+        reconstructor = SnapshotReconstructor(step=keyframe)
+        with open(self.path, "rb") as f:
+            for entry in self.index.steps[keyframe : step + 1]:
+                step_result = reconstructor.apply(
+                    parse_step_record(_read_frame(f, entry.offset))
+                )
+        return step_result
+
+    def iter_records(self) -> Iterator[StepRecord]:
+        with open(self.path, "rb") as f:
+            for entry in self.index.steps:
+                yield parse_step_record(_read_frame(f, entry.offset))
+
+    def __iter__(self) -> Iterator[StepResult]:
+        reconstructor = SnapshotReconstructor()
+        for record in self.iter_records():
+            yield reconstructor.apply(record)
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+from typing import List, Optional
+
+from ..models.models import StepRecord
+from .step_log import StepLogWriter
+
+STEP_RESULT_JSONL_FILENAME = "step_result.jsonl"
+STEP_LOG_FILENAME = "step_result.steplog"
+
+
+def get_step_result_filename(step_log_format: str) -> str:
+    if step_log_format == "jsonl":
+        return STEP_RESULT_JSONL_FILENAME
+    elif step_log_format == "zstd":
+        return STEP_LOG_FILENAME
+    else:
+        raise ValueError(f"Invalid step log format: {step_log_format}")
+
+
+class StepResultWriter:
+    """
+    Appends step results to the step log from a background task.
+
+    The agent only enqueues the step record (full StepResult or delta). Serialization (pydantic's Rust based
+    model_dump_json) and the file write run batched in a worker thread, so the agent
+    loop does not wait for them. close() must be awaited to flush pending results.
+
+    The step log is either JSONL ("jsonl") or the compressed, indexed binary
+    format from step_log.py ("zstd").
+    """
+
+    def __init__(
+        self, output_dir: str, step_log_format: str = "jsonl", max_batch_size: int = 16
+    ):
+        self.path = os.path.join(output_dir, get_step_result_filename(step_log_format))
+        self.step_log_format = step_log_format
+        self.max_batch_size = max_batch_size
+        self.step_log_writer: Optional[StepLogWriter] = None
+        self.queue: asyncio.Queue[Optional[StepRecord]] = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        # Time spent serializing and writing in the worker thread so far
+        self.write_seconds = 0.0
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def write(self, record: StepRecord) -> None:
+        """Enqueue a step record without blocking."""
+        self.queue.put_nowait(record)
+
+    async def close(self) -> None:
+        """Write all pending step results and stop the background task."""
+        if self.task is None:
+            return
+        self.queue.put_nowait(None)
+        await self.task
+        self.task = None
+
+    async def _run(self) -> None:
+        while True:
+            batch: List[StepRecord] = []
+            stop = False
+
+            item = await self.queue.get()
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch_size or self.queue.empty():
+                    break
+                item = self.queue.get_nowait()
+
+            if batch:
+                started_at = time.perf_counter()
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                except Exception as e:
+                    print(f"Failed to write step results: {e}")
+                self.write_seconds += time.perf_counter() - started_at
+
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[StepRecord]) -> None:
+        if self.step_log_format == "zstd":
+            if self.step_log_writer is None:
+                self.step_log_writer = StepLogWriter(self.path)
+            self.step_log_writer.append(batch)
+            return
+
+        lines = "".join(record.model_dump_json() + "\n" for record in batch)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
@@ -1,19 +1,299 @@
-import zipfile
 import os
+import queue
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Already compressed formats, deflating them costs time without saving space
+STORED_EXTENSIONS = {
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".webp",
+    ".mp4",
+    ".pdf",
+    ".zip",
+    ".gz",
+    ".zst",
+    ".steplog",
+}
+
+# With max_workers > 0, files to deflate from this size on are compressed in
+# parallel. Off by default, the serial path only uses public zipfile API.
+PARALLEL_MIN_BYTES = 1024 * 1024
+ZIP_MAX_WORKERS = int(os.getenv("ZIP_MAX_WORKERS", "0"))
+COMPRESS_LEVEL = 6
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveStats:
+    """Input and output bytes and time per file extension."""
+
+    def __init__(self):
+        # extension -> [files, input bytes, output bytes, seconds]
+        self.by_extension: Dict[str, List[float]] = {}
+
+    def add(self, path: str, input_bytes: int, output_bytes: int, seconds: float):
+        extension = os.path.splitext(path)[1].lower() or "(none)"
+        stats = self.by_extension.setdefault(extension, [0, 0, 0, 0.0])
+        stats[0] += 1
+        stats[1] += input_bytes
+        stats[2] += output_bytes
+        stats[3] += seconds
+
+    def print(self) -> None:
+        for extension, (files, input_bytes, output_bytes, seconds) in sorted(
+            self.by_extension.items(), key=lambda item: -item[1][1]
+        ):
+            method = "stored" if extension in STORED_EXTENSIONS else "deflated"
+            ratio = output_bytes / input_bytes if input_bytes else 1.0
+            print(
+                f"  {extension}: {int(files)} files {method}, "
+                f"{input_bytes / 1024 / 1024:.1f} MB -> "
+                f"{output_bytes / 1024 / 1024:.1f} MB ({ratio:.0%}) in {seconds:.2f}s"
+            )
+
+
+def _deflate_file(file_path: str) -> Tuple[bytes, int, int, float]:
+    """Raw deflate a file as zip entries expect it, return data, CRC, size and time."""
+    started_at = time.perf_counter()
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    chunks = []
+    crc = 0
+    size = 0
+    with open(file_path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            chunks.append(compressor.compress(chunk))
+    chunks.append(compressor.flush())
+    return b"".join(chunks), crc, size, time.perf_counter() - started_at
+
+
+def _write_deflated(
+    zipf: zipfile.ZipFile,
+    file_path: str,
+    arcname: str,
+    data: bytes,
+    crc: int,
+    size: int,
+) -> None:
+    """
+    Add an entry that was already deflated.
+
+    zipfile can only compress while writing, one entry at a time, so this mirrors
+    what ZipFile.writestr does after compressing. It uses private attributes of
+    ZipFile (checked by _can_write_deflated), tests/test_zip.py verifies the
+    archives with testzip().
+    """
+    zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.file_size = size
+    zinfo.compress_size = len(data)
+    zinfo.CRC = crc
+    zip64 = size > zipfile.ZIP64_LIMIT or len(data) > zipfile.ZIP64_LIMIT
+
+    with zipf._lock:
+        if zipf._seekable:
+            zipf.fp.seek(zipf.start_dir)
+        zinfo.header_offset = zipf.fp.tell()
+        zipf._writecheck(zinfo)
+        zipf._didModify = True
+        zipf.fp.write(zinfo.FileHeader(zip64))
+        zipf.fp.write(data)
+        zipf.start_dir = zipf.fp.tell()
+        zipf.filelist.append(zinfo)
+        zipf.NameToInfo[zinfo.filename] = zinfo
+
+
+def _can_write_deflated(zipf: zipfile.ZipFile) -> bool:
+    """Whether the zipfile internals _write_deflated relies on are there."""
+    return all(
+        hasattr(zipf, name)
+        for name in ("_lock", "_seekable", "_writecheck", "_didModify", "start_dir")
+    )
+
+
+def _list_files(
+    directory: str, exclude: Optional[str], extra_files: Optional[Dict[str, str]]
+) -> List[Tuple[str, str]]:
+    files = []
+    for root, _, filenames in os.walk(str(directory)):
+        for filename in filenames:
+            file_path = os.path.join(root, filename)
+            if file_path != exclude:
+                files.append((file_path, os.path.relpath(file_path, str(directory))))
+
+    for arcname, file_path in (extra_files or {}).items():
+        if os.path.exists(file_path):
+            files.append((file_path, arcname))
+    return files
+
+
+def write_zip_archive(
+    directory: str,
+    output: Union[str, BinaryIO],
+    extra_files: Optional[Dict[str, str]] = None,
+    max_workers: int = ZIP_MAX_WORKERS,
+) -> ArchiveStats:
+    """
+    Write a zip archive of the directory to a path or a writable file object.
 
+    Already compressed files are stored, the others deflated. With max_workers > 0,
+    files to deflate of at least PARALLEL_MIN_BYTES are compressed in that many
+    threads and written as they complete, between the small files. At most
+    max_workers deflated files are held in memory. File objects don't need to be
+    seekable.
+    """
+    exclude = output if isinstance(output, str) else None
+    stats = ArchiveStats()
 
-def create_zip_archive(directory: str, zip_path: str):
-    """Create a zip file of the task directory."""
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zipf:
+        # Without them large files are deflated one by one like the small ones
+        parallel = max_workers > 0 and _can_write_deflated(zipf)
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            pending: Dict[Future, Tuple[str, str]] = {}
+
+            def write_completed(futures: Iterable[Future]) -> None:
+                for future in futures:
+                    file_path, arcname = pending.pop(future)
+                    data, crc, size, seconds = future.result()
+                    _write_deflated(zipf, file_path, arcname, data, crc, size)
+                    stats.add(file_path, size, len(data), seconds)
+
+            try:
+                for file_path, arcname in _list_files(directory, exclude, extra_files):
+                    write_completed([future for future in pending if future.done()])
+
+                    extension = os.path.splitext(file_path)[1].lower()
+                    if extension in STORED_EXTENSIONS:
+                        compress_type = zipfile.ZIP_STORED
+                    elif parallel and os.path.getsize(file_path) >= PARALLEL_MIN_BYTES:
+                        if len(pending) >= max_workers:
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            write_completed(done)
+                        future = executor.submit(_deflate_file, file_path)
+                        pending[future] = (file_path, arcname)
+                        continue
+                    else:
+                        compress_type = zipfile.ZIP_DEFLATED
+
+                    started_at = time.perf_counter()
+                    zipf.write(file_path, arcname, compress_type=compress_type)
+                    zinfo = zipf.getinfo(arcname)
+                    stats.add(
+                        file_path,
+                        zinfo.file_size,
+                        zinfo.compress_size,
+                        time.perf_counter() - started_at,
+                    )
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    write_completed(done)
+            finally:
+                # Don't compress the remaining files if writing failed
+                executor.shutdown(cancel_futures=True)
+    return stats
+
+
+def create_zip_archive(
+    directory: str,
+    zip_path: Union[str, BinaryIO],
+    extra_files: Optional[Dict[str, str]] = None,
+):
+    """
+    Create a zip file of the task directory.
+
+    extra_files maps archive names to paths of files outside the directory that
+    should be added as well (e.g. blobs from the shared blob store). zip_path can
+    also be a writable file object, e.g. an HTTP response body.
+    """
 
     try:
-        with zipfile.ZipFile(str(zip_path), "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(str(directory)):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if file_path != str(zip_path):
-                        arcname = os.path.relpath(file_path, str(directory))
-                        zipf.write(file_path, arcname)
-
-        print(f"Created zip archive: {zip_path}")
+        started_at = time.perf_counter()
+        stats = write_zip_archive(directory, zip_path, extra_files)
+        print(
+            f"Created zip archive: {zip_path} in {time.perf_counter() - started_at:.2f}s"
+        )
+        stats.print()
     except Exception as e:
         print(f"Failed to create zip archive: {str(e)}")
+
+
+class ArchiveStreamClosed(Exception):
+    """The consumer of stream_zip_archive stopped reading."""
+
+
+class _QueueWriter:
+    """Unseekable file object that hands the written chunks to a queue."""
+
+    def __init__(
+        self, chunks: "queue.Queue[Optional[bytes]]", cancelled: threading.Event
+    ):
+        self.chunks = chunks
+        self.cancelled = cancelled
+
+    def write(self, data: bytes) -> int:
+        if data:
+            chunk = bytes(data)
+            # A full queue blocks until the consumer reads or goes away
+            while True:
+                if self.cancelled.is_set():
+                    raise ArchiveStreamClosed()
+                try:
+                    self.chunks.put(chunk, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def stream_zip_archive(
+    directory: str, extra_files: Optional[Dict[str, str]] = None
+) -> Iterator[bytes]:
+    """
+    Yield a zip archive of the directory in chunks, without staging it on disk.
+
+    Suitable as the body of a streaming HTTP response. The archive is written in
+    a background thread, at most 16 chunks ahead of the consumer. If the consumer
+    stops early, e.g. because the client disconnected, closing the generator stops
+    the writer thread and its compression workers.
+    """
+    chunks: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=16)
+    cancelled = threading.Event()
+    errors: List[Exception] = []
+
+    def write():
+        try:
+            write_zip_archive(directory, _QueueWriter(chunks, cancelled), extra_files)
+        except ArchiveStreamClosed:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # The end marker must not block a writer whose consumer is gone
+            while not cancelled.is_set():
+                try:
+                    chunks.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    try:
+        while (chunk := chunks.get()) is not None:
+            yield chunk
+    finally:
+        cancelled.set()
+        thread.join()
+    if errors:
+        raise errors[0]
@@ -1,7 +1,7 @@
-from typing import Dict, List, Optional
-from pydantic import BaseModel
+from typing import Any, Dict, List, Optional, Union
+from pydantic import BaseModel, Discriminator, Tag
 
-from typing import Literal
+from typing import Annotated, Literal
 
 
 class PageTypes(BaseModel):
@@ -47,6 +47,10 @@ class NetworkRequest(BaseModel):
     resource_type: str
     timestamp: float
     post_data: Optional[str] = None
+    # URL of the frame that sent the request
+    initiator: Optional[str] = None
+    # Aborted or stubbed by the capture policy, the response is a placeholder
+    blocked: bool = False
 
 
 class NetworkResponse(BaseModel):
@@ -54,6 +58,13 @@ class NetworkResponse(BaseModel):
     headers: Dict[str, str]
     status: int
     text: Optional[str] = None
+    content_type: Optional[str] = None
+    # Size of the full body in bytes, if known
+    body_size: Optional[int] = None
+    # The body was cut at the capture policy's byte limit
+    truncated: bool = False
+    # Only headers, status and size were recorded, the body was not read
+    metadata_only: bool = False
 
 
 class NetworkRequestResponsePair(BaseModel):
@@ -61,6 +72,20 @@ class NetworkRequestResponsePair(BaseModel):
     response: NetworkResponse
 
 
+class ProbeEvent(BaseModel):
+    """Event recorded by the in-page capture probe during a step."""
+
+    kind: Literal["storage_set", "storage_remove", "storage_clear", "resource_loaded"]
+    timestamp: float
+    storage: Optional[Literal["local_storage", "session_storage"]] = None
+    key: Optional[str] = None
+    value: Optional[str] = None
+    url: Optional[str] = None
+    initiator_type: Optional[str] = None
+    transfer_size: Optional[int] = None
+    duration: Optional[float] = None
+
+
 class StepResult(BaseModel):
     url: str
     cookies: List[Cookie]
@@ -68,3 +93,55 @@ class StepResult(BaseModel):
     session_storage: SessionStorage
     resources: List[Resource]
     request_response_pairs: List[NetworkRequestResponsePair]
+    probe_events: List[ProbeEvent] = []
+    # Exploration persona (login, legal, student, teacher) of runs with parallel personas
+    persona: Optional[str] = None
+    snapshot_mode: Literal["full"] = "full"
+
+
+class CookieDelta(BaseModel):
+    added: List[Cookie] = []
+    modified: List[Cookie] = []
+    removed: List[Cookie] = []
+
+
+class StorageDelta(BaseModel):
+    added: Dict[str, str] = {}
+    modified: Dict[str, str] = {}
+    removed: List[str] = []
+
+
+class ResourceDelta(BaseModel):
+    # Resources have no identity besides their attributes, so they are only added or removed
+    added: List[Resource] = []
+    removed: List[Resource] = []
+
+
+class StepResultDelta(BaseModel):
+    """Changes of cookies, storage and resources relative to the previous step."""
+
+    url: str
+    cookies: CookieDelta
+    local_storage: StorageDelta
+    session_storage: StorageDelta
+    resources: ResourceDelta
+    request_response_pairs: List[NetworkRequestResponsePair]
+    probe_events: List[ProbeEvent] = []
+    persona: Optional[str] = None
+    snapshot_mode: Literal["delta"] = "delta"
+
+
+def _get_snapshot_mode(value: Any) -> str:
+    if isinstance(value, dict):
+        return value.get("snapshot_mode", "full")
+    return getattr(value, "snapshot_mode", "full")
+
+
+# A line/frame of the step log, either a full snapshot or a delta to the previous step
+StepRecord = Annotated[
+    Union[
+        Annotated[StepResult, Tag("full")],
+        Annotated[StepResultDelta, Tag("delta")],
+    ],
+    Discriminator(_get_snapshot_mode),
+]
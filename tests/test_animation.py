@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.agent.animation import GifWriter, Mp4Writer, WebPWriter
+
+
+def make_frame(color):
+    return np.full((40, 60, 3), color, dtype=np.uint8)
+
+
+def test_webp_round_trip(tmp_path):
+    path = str(tmp_path / "animation.webp")
+    with WebPWriter(path, duration=500.0) as writer:
+        writer.append(make_frame(0))
+        # Identical frames extend the previous frame
+        writer.append(make_frame(0))
+        writer.append(make_frame(255))
+
+    assert writer.frame_count == 2
+    assert writer.dropped_frame_count == 1
+    with Image.open(path) as image:
+        assert image.format == "WEBP"
+        assert image.size == (60, 40)
+        assert image.n_frames == 2
+        image.load()
+        assert image.info["duration"] == 1000
+        assert image.convert("RGB").getpixel((30, 20))[0] < 50
+        image.seek(1)
+        image.load()
+        assert image.info["timestamp"] == 1000
+        assert image.info["duration"] == 500
+        assert image.convert("RGB").getpixel((30, 20))[0] > 200
+
+
+def test_webp_odd_size(tmp_path):
+    path = str(tmp_path / "animation.webp")
+    rng = np.random.default_rng(0)
+    with WebPWriter(path, duration=500.0) as writer:
+        for _ in range(3):
+            writer.append(rng.integers(0, 256, (41, 61, 3), dtype=np.uint8))
+
+    with Image.open(path) as image:
+        assert image.size == (61, 41)
+        assert image.n_frames == 3
+        image.seek(2)
+        image.load()
+        assert image.info["timestamp"] == 1000
+
+
+def test_webp_scale(tmp_path):
+    path = str(tmp_path / "animation.webp")
+    with WebPWriter(path, duration=500.0, scale=0.5) as writer:
+        writer.append(make_frame(0))
+
+    with Image.open(path) as image:
+        assert image.size == (30, 20)
+
+
+def test_gif_round_trip(tmp_path):
+    path = str(tmp_path / "animation.gif")
+    with GifWriter(path, duration=500.0) as writer:
+        writer.append(make_frame(0))
+        writer.append(make_frame(0))
+        writer.append(make_frame(255))
+
+    with Image.open(path) as image:
+        assert image.n_frames == 2
+        assert image.info["duration"] == 1000
+
+
+def test_mp4_repeats_merged_frames(tmp_path):
+    imageio_ffmpeg = pytest.importorskip("imageio_ffmpeg")
+    path = str(tmp_path / "animation.mp4")
+    with Mp4Writer(path, duration=500.0) as writer:
+        writer.append(make_frame(0))
+        writer.append(make_frame(0))
+        writer.append(make_frame(255))
+
+    frame_count, _ = imageio_ffmpeg.count_frames_and_secs(path)
+    assert frame_count == 3
@@ -0,0 +1,80 @@
+import os
+import time
+
+import pytest
+
+from src.files.blob_store import (
+    BlobStore,
+    is_blob_ref,
+    parse_blob_ref,
+    save_blob_refs,
+)
+
+
+def age(store, digest, hours):
+    mtime = time.time() - hours * 3600
+    os.utime(store.path(digest), (mtime, mtime))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"))
+
+
+def test_put_and_get(store):
+    digest = store.put(b"body")
+    assert store.get(digest) == b"body"
+    assert os.path.exists(store.path(digest))
+
+    ref = store.put_text("text body")
+    assert is_blob_ref(ref)
+    assert store.get_text(ref) == "text body"
+    assert store.contains(parse_blob_ref(ref))
+
+
+def test_put_dedupes(store):
+    digest = store.put(b"body")
+    assert store.put(b"body") == digest
+    assert os.listdir(os.path.dirname(store.path(digest))) == [f"{digest}.gz"]
+
+    # Another run storing the same blob refreshes its modification time
+    age(store, digest, 2)
+    other_run = BlobStore(store.root_dir)
+    assert other_run.put(b"body") == digest
+    assert os.path.getmtime(store.path(digest)) > time.time() - 60
+
+
+def test_prune_removes_oldest(store):
+    digests = [store.put(os.urandom(1024)) for _ in range(3)]
+    for hours, digest in zip([4, 3, 2], digests):
+        age(store, digest, hours)
+    blob_bytes = os.path.getsize(store.path(digests[0]))
+
+    pruning_run = BlobStore(store.root_dir)
+    assert pruning_run.prune(max_bytes=2 * blob_bytes) == 1
+    assert not os.path.exists(store.path(digests[0]))
+    assert all(os.path.exists(store.path(digest)) for digest in digests[1:])
+
+
+def test_prune_keeps_own_and_recent_blobs(store):
+    own = store.put(os.urandom(1024))
+    age(store, own, 4)
+    recent = BlobStore(store.root_dir).put(os.urandom(1024))
+
+    assert store.prune(max_bytes=0) == 0
+    assert os.path.exists(store.path(own))
+    assert os.path.exists(store.path(recent))
+
+
+def test_prune_keeps_blobs_of_runs_on_disk(store, tmp_path):
+    referenced, unreferenced = store.put(b"referenced"), store.put(b"unreferenced")
+    age(store, referenced, 4)
+    age(store, unreferenced, 4)
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    save_blob_refs(str(run_dir), [referenced])
+
+    pruning_run = BlobStore(store.root_dir)
+    assert pruning_run.prune(max_bytes=0, runs_dir=str(tmp_path)) == 1
+    assert os.path.exists(store.path(referenced))
+    assert not os.path.exists(store.path(unreferenced))
@@ -0,0 +1,130 @@
+import io
+import os
+import threading
+import zipfile
+
+import pytest
+
+from src.files import zip as zip_module
+from src.files.zip import stream_zip_archive, write_zip_archive
+
+
+class UnseekableWriter:
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    directory = tmp_path / "run"
+    (directory / "step_1").mkdir(parents=True)
+    (directory / "step_1" / "screenshot.png").write_bytes(os.urandom(2048))
+    (directory / "history.json").write_text('{"steps": []}' * 100)
+    # Deflated in the worker threads with max_workers > 0
+    (directory / "steps.jsonl").write_bytes(b'{"url": "https://example.de"}\n' * 50_000)
+    (directory / "random.bin").write_bytes(os.urandom(zip_module.PARALLEL_MIN_BYTES))
+    blob = tmp_path / "blobs" / "ab" / "abc.gz"
+    blob.parent.mkdir(parents=True)
+    blob.write_bytes(b"blob")
+    return directory, {"blobs/ab/abc.gz": str(blob)}
+
+
+def check_archive(data, directory, extra_files):
+    with zipfile.ZipFile(io.BytesIO(data)) as zipf:
+        assert zipf.testzip() is None
+        names = set(zipf.namelist())
+        assert names == {
+            "step_1/screenshot.png",
+            "history.json",
+            "steps.jsonl",
+            "random.bin",
+            *extra_files,
+        }
+        for name in names - set(extra_files):
+            assert zipf.read(name) == (directory / name).read_bytes()
+        assert zipf.getinfo("steps.jsonl").compress_type == zipfile.ZIP_DEFLATED
+        assert zipf.getinfo("step_1/screenshot.png").compress_type == (
+            zipfile.ZIP_STORED
+        )
+
+
+def test_write_to_path(run_dir, tmp_path, monkeypatch):
+    directory, extra_files = run_dir
+    # The default is the serial path
+    monkeypatch.setattr(zip_module, "_deflate_file", None)
+    zip_path = str(tmp_path / "run.zip")
+    write_zip_archive(str(directory), zip_path, extra_files)
+    with open(zip_path, "rb") as f:
+        check_archive(f.read(), directory, extra_files)
+
+
+def test_write_to_seekable_file(run_dir):
+    directory, extra_files = run_dir
+    output = io.BytesIO()
+    write_zip_archive(str(directory), output, extra_files)
+    check_archive(output.getvalue(), directory, extra_files)
+
+
+def test_write_to_unseekable_file(run_dir):
+    directory, extra_files = run_dir
+    output = UnseekableWriter()
+    write_zip_archive(str(directory), output, extra_files)
+    check_archive(output.buffer.getvalue(), directory, extra_files)
+
+
+def test_stream(run_dir):
+    directory, extra_files = run_dir
+    data = b"".join(stream_zip_archive(str(directory), extra_files))
+    check_archive(data, directory, extra_files)
+
+
+def test_stream_closed_early(run_dir):
+    directory, extra_files = run_dir
+    threads_before = set(threading.enumerate())
+
+    stream = stream_zip_archive(str(directory), extra_files)
+    next(stream)
+    stream.close()
+
+    assert set(threading.enumerate()) <= threads_before
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_write_in_parallel(run_dir, tmp_path, monkeypatch, max_workers):
+    directory, extra_files = run_dir
+    deflated = []
+    deflate_file = zip_module._deflate_file
+
+    def record_deflate(file_path):
+        deflated.append(os.path.basename(file_path))
+        return deflate_file(file_path)
+
+    monkeypatch.setattr(zip_module, "_deflate_file", record_deflate)
+    zip_path = str(tmp_path / "run.zip")
+    write_zip_archive(str(directory), zip_path, extra_files, max_workers)
+
+    assert sorted(deflated) == ["random.bin", "steps.jsonl"]
+    with open(zip_path, "rb") as f:
+        check_archive(f.read(), directory, extra_files)
+
+
+def test_write_in_parallel_to_unseekable_file(run_dir):
+    directory, extra_files = run_dir
+    output = UnseekableWriter()
+    write_zip_archive(str(directory), output, extra_files, max_workers=2)
+    check_archive(output.buffer.getvalue(), directory, extra_files)
+
+
+def test_write_without_zipfile_internals(run_dir, monkeypatch):
+    directory, extra_files = run_dir
+    monkeypatch.setattr(zip_module, "_can_write_deflated", lambda zipf: False)
+    monkeypatch.setattr(zip_module, "_deflate_file", None)
+    output = UnseekableWriter()
+    write_zip_archive(str(directory), output, extra_files, max_workers=2)
+    check_archive(output.buffer.getvalue(), directory, extra_files)